@@ -0,0 +1,183 @@
+import asyncio
+import importlib
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+# Routes each AI task to a model endpoint. A route is a model + OpenAI-compatible
+# endpoint with a latency SLO; each task has an ordered list of routes and
+# falls back to the next one when a route times out or errors.
+#
+# The default "fast" and "large" tiers both point at DeepSeek and can be
+# changed with AI_<TIER>_MODEL / AI_<TIER>_BASE_URL / AI_<TIER>_API_KEY /
+# AI_<TIER>_TIMEOUT_SECONDS. AI_TASK_ROUTES (JSON) overrides the task mapping,
+# e.g. {"recipes": ["large"], "shelf_life": ["fast", "large"]}.
+#
+# The openai SDK (and httpx with it) takes about as long to import as FastAPI,
+# so it is imported when the first client is needed rather than at startup;
+# warm_up imports it in a worker thread once the app is serving.
+
+DEFAULT_TASK_ROUTES = {
+    "shelf_life": ["fast", "large"],
+    "item_update": ["fast", "large"],
+    "batch_update": ["fast", "large"],
+    "recipes": ["large", "fast"],
+    "recipe_fanout": ["large", "fast"],
+}
+
+DEFAULT_TIMEOUTS = {"fast": 10.0, "large": 60.0}
+
+# Errors that make a route unusable for this call; anything else (e.g. a 400
+# for a bad prompt) would fail the same way on the fallback route
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+# HTTP connection pool per endpoint
+AI_MAX_CONNECTIONS = int(os.environ.get('AI_MAX_CONNECTIONS', '100'))
+AI_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('AI_MAX_KEEPALIVE_CONNECTIONS', '20'))
+AI_WARMUP_TIMEOUT_SECONDS = float(os.environ.get('AI_WARMUP_TIMEOUT_SECONDS', '5'))
+
+class ModelRoute:
+    """One model on one OpenAI-compatible endpoint, with a latency SLO."""
+
+    def __init__(self, name: str, model: str, base_url: Optional[str], api_key: Optional[str], timeout_seconds: float):
+        self.name = name
+        self.model = model
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout_seconds = timeout_seconds
+        self.stats = {"calls": 0, "timeouts": 0, "errors": 0, "fallbacks": 0, "total_latency_ms": 0.0}
+
+    @classmethod
+    def from_env(cls, name: str) -> "ModelRoute":
+        prefix = f"AI_{name.upper()}_"
+        return cls(
+            name=name,
+            model=os.environ.get(prefix + "MODEL", "deepseek-chat"),
+            base_url=os.environ.get(prefix + "BASE_URL", os.environ.get('DEEPSEEK_BASE_URL')),
+            api_key=os.environ.get(prefix + "API_KEY", os.environ.get('DEEPSEEK_API_KEY')),
+            timeout_seconds=float(os.environ.get(prefix + "TIMEOUT_SECONDS", DEFAULT_TIMEOUTS.get(name, 30.0))),
+        )
+
+    def describe(self) -> dict:
+        calls = self.stats["calls"] or 1
+        return {
+            "model": self.model,
+            "base_url": self.base_url,
+            "timeout_seconds": self.timeout_seconds,
+            **self.stats,
+            "total_latency_ms": round(self.stats["total_latency_ms"], 1),
+            "avg_latency_ms": round(self.stats["total_latency_ms"] / calls, 1),
+        }
+
+class ModelRouter:
+    """Picks the route for each AI task and falls back on timeout or endpoint errors."""
+
+    def __init__(self, routes: Dict[str, ModelRoute], task_routes: Dict[str, List[str]]):
+        unknown = {name for names in task_routes.values() for name in names} - set(routes)
+        if unknown:
+            raise ValueError(f"AI_TASK_ROUTES references unknown routes: {sorted(unknown)}")
+        self.routes = routes
+        self.task_routes = task_routes
+        self.clients = {}
+        self.client_override = None
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        task_routes = dict(DEFAULT_TASK_ROUTES)
+        task_routes.update(json.loads(os.environ.get('AI_TASK_ROUTES', '{}')))
+        route_names = {name for names in task_routes.values() for name in names}
+        return cls({name: ModelRoute.from_env(name) for name in sorted(route_names)}, task_routes)
+
+    def use_client(self, client):
+        """Send every route to the given client (used by benchmarks and stub testing)."""
+        self.client_override = client
+
+    def client_for(self, route: ModelRoute):
+        """One AsyncOpenAI client per endpoint, shared by routes on the same endpoint."""
+        if self.client_override is not None:
+            return self.client_override
+        key = (route.base_url, route.api_key)
+        if key not in self.clients:
+            import httpx
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            self.clients[key] = AsyncOpenAI(
+                api_key=route.api_key,
+                base_url=route.base_url,
+                http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(
+                    max_connections=AI_MAX_CONNECTIONS,
+                    max_keepalive_connections=AI_MAX_KEEPALIVE_CONNECTIONS
+                ))
+            )
+        return self.clients[key]
+
+    async def warm_up(self) -> Dict[str, str]:
+        """Open a connection to each endpoint with a cheap models.list call; returns status per route."""
+        statuses = {}
+        if self.client_override is None:
+            # Import the SDK without blocking the event loop for the whole import
+            await asyncio.to_thread(importlib.import_module, "openai")
+        for name, route in self.routes.items():
+            try:
+                await asyncio.wait_for(
+                    self.client_for(route).with_options(max_retries=0).models.list(),
+                    timeout=AI_WARMUP_TIMEOUT_SECONDS
+                )
+                statuses[name] = "ok"
+            except Exception as e:
+                # An unreachable AI endpoint degrades AI features but not the rest of the API
+                print(f"AI warmup failed for route {name}: {e!r}")
+                statuses[name] = f"error: {e!r}"
+        return statuses
+
+    async def close(self):
+        """Close the HTTP connection pools of all endpoint clients."""
+        for client in self.clients.values():
+            await client.close()
+        self.clients.clear()
+
+    def routes_for(self, task: str) -> List[ModelRoute]:
+        return [self.routes[name] for name in self.task_routes.get(task, ["large"])]
+
+    async def complete(self, task: str, **kwargs):
+        """Run a chat completion for a task, trying its routes in order."""
+        from openai import APIConnectionError, APIStatusError
+        candidates = self.routes_for(task)
+        if not candidates:
+            raise ValueError(f"No AI routes configured for task {task}")
+        last_error = None
+        for position, route in enumerate(candidates):
+            if position > 0:
+                route.stats["fallbacks"] += 1
+                print(f"AI route fallback for {task}: {candidates[position - 1].name} -> {route.name} ({last_error!r})")
+            route.stats["calls"] += 1
+            started = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(
+                    self.client_for(route).chat.completions.create(model=route.model, **kwargs),
+                    timeout=route.timeout_seconds
+                )
+            except asyncio.TimeoutError as e:
+                route.stats["timeouts"] += 1
+                last_error = e
+                continue
+            except APIConnectionError as e:
+                route.stats["errors"] += 1
+                last_error = e
+                continue
+            except APIStatusError as e:
+                route.stats["errors"] += 1
+                if e.status_code < 500 and e.status_code not in RETRYABLE_STATUS_CODES:
+                    raise
+                last_error = e
+                continue
+            finally:
+                route.stats["total_latency_ms"] += (time.perf_counter() - started) * 1000
+            return response
+        raise last_error
+
+    def describe(self) -> dict:
+        return {
+            "routes": {name: route.describe() for name, route in self.routes.items()},
+            "tasks": self.task_routes,
+        }
@@ -0,0 +1,68 @@
+from datetime import datetime
+from typing import Dict, List
+
+from pymongo import UpdateOne
+
+# Food events and their daily rollups. Write handlers record an event whenever
+# food is consumed (quantity goes down), expires with some left, or is deleted,
+# and a negative expired event when an expired item's expiration date is moved.
+# Each event also increments a rollup bucket keyed by day, category, event type
+# and unit, so reports read at most days x categories x types x units buckets
+# no matter how many events have been recorded.
+
+CONSUMED = "consumed"
+EXPIRED = "expired"
+DELETED = "deleted"
+EVENT_TYPES = [CONSUMED, EXPIRED, DELETED]
+
+def food_event(event_type: str, item: dict, quantity: float, at: datetime = None) -> dict:
+    """Event document for an action on a food item."""
+    return {
+        "type": event_type,
+        "item_id": item.get("id"),
+        "name": item.get("name"),
+        "category": item.get("category") or "other",
+        "unit": item.get("unit") or "each",
+        "quantity": float(quantity),
+        "at": at or datetime.utcnow(),
+    }
+
+def rollup_update(event: dict) -> UpdateOne:
+    """Upsert that adds an event to its daily bucket."""
+    day = event["at"].strftime("%Y-%m-%d")
+    return UpdateOne(
+        {"_id": f"{day}|{event['category']}|{event['type']}|{event['unit']}"},
+        {
+            "$setOnInsert": {"day": day, "month": day[:7], "category": event["category"], "type": event["type"], "unit": event["unit"]},
+            # A correction (negative quantity) takes its event back out
+            "$inc": {"events": 1 if event["quantity"] >= 0 else -1, "quantity": event["quantity"]},
+        },
+        upsert=True
+    )
+
+def monthly_rollup_pipeline(first_day: str) -> List[dict]:
+    """Sum daily buckets from first_day on into month x category x type x unit totals."""
+    return [
+        {"$match": {"day": {"$gte": first_day}}},
+        {"$group": {
+            "_id": {"month": "$month", "category": "$category", "type": "$type", "unit": "$unit"},
+            "events": {"$sum": "$events"},
+            "quantity": {"$sum": "$quantity"},
+        }},
+    ]
+
+def summarize_rollups(rows: List[dict]) -> Dict[str, dict]:
+    """Nest aggregated rollups as totals per category and per month.
+
+    Quantities are kept per unit since amounts in different units can't be added.
+    """
+    by_category: Dict[str, dict] = {}
+    by_month: Dict[str, dict] = {}
+    for row in rows:
+        key = row["_id"]
+        for totals in (by_category.setdefault(key["category"], {}),
+                       by_month.setdefault(key["month"], {}).setdefault(key["category"], {})):
+            stats = totals.setdefault(key["type"], {"events": 0, "quantity": {}})
+            stats["events"] += row["events"]
+            stats["quantity"][key["unit"]] = round(stats["quantity"].get(key["unit"], 0) + row["quantity"], 3)
+    return {"by_category": by_category, "by_month": dict(sorted(by_month.items()))}
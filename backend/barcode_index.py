@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Offline barcode index
+Converts a product dump (e.g. the Open Food Facts CSV export) into a compact
+file of fixed-size records sorted by barcode, plus a blob of product names,
+and looks barcodes up with a binary search over the memory-mapped file.
+
+Usage: python barcode_index.py en.openfoodfacts.org.products.csv[.gz] barcodes.idx
+"""
+
+import csv
+import gzip
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"FGBARC01"
+RECORD_DTYPE = np.dtype([
+    ("code", "<u8"),
+    ("name_offset", "<u4"),
+    ("name_length", "<u2"),
+    ("category", "u1"),
+    ("emoji", "u1"),
+])
+MAX_NAME_BYTES = 200
+
+CATEGORIES = ["produce", "dairy", "meat", "packaged", "frozen", "other"]
+
+# (keywords in category tags / PNNS group, category); first match wins
+CATEGORY_RULES = [
+    (("frozen",), "frozen"),
+    (("milk and dairy", "dairies", "cheeses", "milks", "yogurts", "butters", "creams"), "dairy"),
+    (("fish meat eggs", "meats", "poultry", "fishes", "seafood", "sausages", "hams"), "meat"),
+    (("fruits and vegetables", "fresh-fruits", "fresh-vegetables", "fruits", "vegetables"), "produce"),
+    (("beverages", "snacks", "cereals", "composite", "sauces", "spreads", "sweeteners",
+      "canned", "biscuits", "confectioneries", "pastas", "breads"), "packaged"),
+]
+
+# Keywords in the product name or tags, most specific first
+EMOJI_KEYWORDS = [
+    ("ice cream", "🍨"), ("cheese", "🧀"), ("yogurt", "🥛"), ("yoghurt", "🥛"), ("butter", "🧈"),
+    ("milk", "🥛"), ("egg", "🥚"), ("chicken", "🍗"), ("beef", "🥩"), ("steak", "🥩"), ("pork", "🥓"),
+    ("bacon", "🥓"), ("salmon", "🐟"), ("tuna", "🐟"), ("fish", "🐟"), ("shrimp", "🦐"),
+    ("apple", "🍎"), ("banana", "🍌"), ("orange", "🍊"), ("lemon", "🍋"), ("grape", "🍇"),
+    ("strawberr", "🍓"), ("tomato", "🍅"), ("carrot", "🥕"), ("potato", "🥔"), ("broccoli", "🥦"),
+    ("avocado", "🥑"), ("bread", "🍞"), ("rice", "🍚"), ("pasta", "🍝"), ("spaghetti", "🍝"),
+    ("pizza", "🍕"), ("cereal", "🥣"), ("chocolate", "🍫"), ("cookie", "🍪"), ("biscuit", "🍪"),
+    ("chips", "🥔"), ("crisps", "🥔"), ("juice", "🧃"), ("coffee", "☕"), ("tea", "🍵"),
+    ("water", "💧"), ("soda", "🥤"), ("cola", "🥤"), ("beer", "🍺"), ("wine", "🍷"), ("honey", "🍯"),
+]
+CATEGORY_EMOJI = {"produce": "🥬", "dairy": "🥛", "meat": "🥩", "packaged": "📦", "frozen": "🧊", "other": "🍽️"}
+EMOJIS = sorted({emoji for _, emoji in EMOJI_KEYWORDS} | set(CATEGORY_EMOJI.values()))
+
+def normalize_barcode(code: str) -> Optional[int]:
+    """Barcode as an integer (so UPC-A, EAN-13 and GTIN-14 forms of one code match), None if invalid."""
+    code = (code or "").strip()
+    if not code.isdigit() or len(code) > 14 or int(code) == 0:
+        return None
+    return int(code)
+
+def classify(name: str, tags: str) -> Tuple[str, str]:
+    """(category, emoji) for a product from its name and category tags / PNNS group."""
+    tags = tags.lower()
+    category = next((category for keywords, category in CATEGORY_RULES if any(k in tags for k in keywords)), "other")
+    text = f"{name.lower()} {tags}"
+    emoji = next((emoji for keyword, emoji in EMOJI_KEYWORDS if keyword in text), CATEGORY_EMOJI[category])
+    return category, emoji
+
+def read_products(path: str) -> Iterator[Tuple[int, str, str, str]]:
+    """Stream (code, name, category, emoji) from an Open Food Facts style export (tab or comma separated, optionally gzipped)."""
+    csv.field_size_limit(sys.maxsize)
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", errors="replace", newline="") as handle:
+        header = handle.readline()
+        delimiter = "\t" if "\t" in header else ","
+        columns = next(csv.reader([header], delimiter=delimiter))
+        reader = csv.DictReader(handle, fieldnames=columns, delimiter=delimiter, quoting=csv.QUOTE_NONE if delimiter == "\t" else csv.QUOTE_MINIMAL)
+        for row in reader:
+            code = normalize_barcode(row.get("code"))
+            name = (row.get("product_name") or row.get("generic_name") or "").strip()
+            if code is None or not name:
+                continue
+            tags = " ".join(row.get(column) or "" for column in ("categories_tags", "categories_en", "pnns_groups_1", "main_category_en"))
+            category, emoji = classify(name, tags.replace(",", " "))
+            yield code, name, category, emoji
+
+def build_index(products: Iterator[Tuple[int, str, str, str]], output_path: str) -> int:
+    """Write the sorted index file; returns the number of products indexed (first entry wins for duplicate codes)."""
+    codes: List[int] = []
+    names = bytearray()
+    offsets: List[int] = []
+    lengths: List[int] = []
+    category_codes: List[int] = []
+    emoji_codes: List[int] = []
+    category_index = {category: i for i, category in enumerate(CATEGORIES)}
+    emoji_index = {emoji: i for i, emoji in enumerate(EMOJIS)}
+    for code, name, category, emoji in products:
+        encoded = name.encode("utf-8")[:MAX_NAME_BYTES].decode("utf-8", "ignore").encode("utf-8")
+        codes.append(code)
+        offsets.append(len(names))
+        lengths.append(len(encoded))
+        category_codes.append(category_index[category])
+        emoji_codes.append(emoji_index[emoji])
+        names += encoded
+
+    records = np.empty(len(codes), dtype=RECORD_DTYPE)
+    records["code"] = np.array(codes, dtype=np.uint64)
+    records["name_offset"] = offsets
+    records["name_length"] = lengths
+    records["category"] = category_codes
+    records["emoji"] = emoji_codes
+    order = np.argsort(records["code"], kind="stable")
+    records = records[order]
+    # Keep the first occurrence of each barcode
+    keep = np.ones(len(records), dtype=bool)
+    keep[1:] = records["code"][1:] != records["code"][:-1]
+    records = records[keep]
+
+    header = json.dumps({"count": len(records), "categories": CATEGORIES, "emojis": EMOJIS}).encode("utf-8")
+    records_offset = -(-(len(MAGIC) + 4 + len(header)) // 16) * 16
+    temporary_path = output_path + ".tmp"
+    with open(temporary_path, "wb") as handle:
+        handle.write(MAGIC + struct.pack("<I", len(header)) + header)
+        handle.write(b"\0" * (records_offset - handle.tell()))
+        handle.write(records.tobytes())
+        handle.write(bytes(names))
+    os.replace(temporary_path, output_path)
+    return len(records)
+
+class BarcodeIndex:
+    """Read-only lookups in an index file built by build_index, without loading it into memory."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a barcode index")
+        header_length = struct.unpack_from("<I", self.map, len(MAGIC))[0]
+        header = json.loads(self.map[len(MAGIC) + 4:len(MAGIC) + 4 + header_length])
+        records_offset = -(-(len(MAGIC) + 4 + header_length) // 16) * 16
+        self.count = header["count"]
+        self.categories = header["categories"]
+        self.emojis = header["emojis"]
+        self.records = np.frombuffer(self.map, dtype=RECORD_DTYPE, count=self.count, offset=records_offset)
+        self.codes = self.records["code"]
+        self.names_offset = records_offset + self.count * RECORD_DTYPE.itemsize
+
+    def lookup(self, barcode: str) -> Optional[Dict[str, str]]:
+        """Product name, category and emoji for a barcode, or None if it isn't in the index."""
+        code = normalize_barcode(barcode)
+        if code is None or not self.count:
+            return None
+        position = int(np.searchsorted(self.codes, np.uint64(code)))
+        if position >= self.count or int(self.codes[position]) != code:
+            return None
+        record = self.records[position]
+        start = self.names_offset + int(record["name_offset"])
+        return {
+            "barcode": barcode.strip(),
+            "name": self.map[start:start + int(record["name_length"])].decode("utf-8"),
+            "category": self.categories[record["category"]],
+            "emoji": self.emojis[record["emoji"]],
+        }
+
+    def close(self):
+        # Drop the numpy views before closing the map they point into
+        self.records = self.codes = None
+        self.map.close()
+        self.file.close()
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    source, output = sys.argv[1], sys.argv[2]
+    started = time.perf_counter()
+    count = build_index(read_products(source), output)
+    print(f"Indexed {count} products into {output} ({os.path.getsize(output) / 1024 / 1024:.1f} MiB) in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import asyncio
+import socket
+import os
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional, Set, Tuple
+
+from pymongo import CursorType, ReturnDocument
+from pymongo.errors import CollectionInvalid, DuplicateKeyError
+
+# Coordination between worker processes sharing one MongoDB:
+# - Lease: a time-limited lock document, used to elect the single worker that
+#   runs periodic background jobs. The holder renews it; if the holder dies the
+#   lease expires and another worker takes over.
+# - InvalidationChannel: a capped collection every worker tails, used to tell
+#   the other workers to drop or update their in-process caches.
+# - SequenceCounter: a counter document handing out consecutive numbers to
+#   writes, which also lists the numbers whose writes are still in flight.
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class Lease:
+    """A named lease in a Mongo collection, held by at most one worker at a time."""
+
+    def __init__(self, collection, name: str, ttl_seconds: float, holder: str = WORKER_ID):
+        self.collection = collection
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.holder = holder
+
+    async def acquire(self) -> bool:
+        """Take or renew the lease; False if another worker holds an unexpired lease."""
+        now = datetime.utcnow()
+        try:
+            document = await self.collection.find_one_and_update(
+                {"_id": self.name, "$or": [{"holder": self.holder}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"holder": self.holder, "expires_at": now + timedelta(seconds=self.ttl_seconds), "renewed_at": now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # The lease document exists and is held by someone else
+            return False
+        return document is not None and document["holder"] == self.holder
+
+    async def release(self):
+        """Give up the lease so another worker can take over without waiting for expiry."""
+        await self.collection.delete_one({"_id": self.name, "holder": self.holder})
+
+class InvalidationChannel:
+    """Broadcasts cache invalidation events to every worker through a capped collection.
+
+    Events are numbered from a counter document when published. ObjectIds from
+    different processes aren't ordered, and a number can be inserted after a
+    higher one, so after its cursor dies a listener re-reads the resume_overlap
+    numbers below the highest it has seen and skips the events it already handled.
+    """
+
+    def __init__(self, db, name: str, size_bytes: int, origin: str = WORKER_ID, resume_overlap: int = 1000):
+        self.db = db
+        self.name = name
+        self.size_bytes = size_bytes
+        self.origin = origin
+        self.resume_overlap = resume_overlap
+        self.collection = db[name]
+
+    async def ensure_collection(self):
+        try:
+            await self.db.create_collection(self.name, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass
+
+    async def publish(self, event_type: str, **payload):
+        counter = await self.db.counters.find_one_and_update(
+            {"_id": self.name}, {"$inc": {"value": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        await self.collection.insert_one({"type": event_type, "origin": self.origin, "seq": counter["value"],
+                                          "at": datetime.utcnow(), **payload})
+
+    async def position(self) -> Tuple[int, Set[int]]:
+        """Where a listener starting now begins: everything published so far counts as handled."""
+        latest = await self.collection.find_one({"seq": {"$exists": True}}, sort=[("$natural", -1)])
+        highest = latest["seq"] if latest else 0
+        seen = {event["seq"] async for event in self.collection.find(
+            {"seq": {"$gt": highest - self.resume_overlap}}, {"seq": 1})}
+        return highest, seen
+
+    async def listen(self, handler: Callable[[dict], Awaitable[None]], retry_seconds: float = 1.0,
+                     position: Optional[Tuple[int, Set[int]]] = None):
+        """Tail the channel forever from position (default: now), passing events published by other workers to handler."""
+        highest, seen = position if position is not None else await self.position()
+        while True:
+            query = {"seq": {"$gt": highest - self.resume_overlap}} if highest else {}
+            try:
+                cursor = self.collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                async for event in cursor:
+                    seq = event.get("seq")
+                    if seq is not None:
+                        if seq in seen:
+                            continue
+                        seen.add(seq)
+                        highest = max(highest, seq)
+                        if len(seen) > 2 * self.resume_overlap:
+                            seen = {number for number in seen if number > highest - self.resume_overlap}
+                    if event.get("origin") == self.origin:
+                        continue
+                    try:
+                        await handler(event)
+                    except Exception as e:
+                        print(f"Cache invalidation handler failed for {event.get('type')}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Cache invalidation channel error: {e}")
+            # A tailable cursor dies when the collection is empty or the cursor falls behind
+            await asyncio.sleep(retry_seconds)
+
+class SequenceCounter:
+    """Consecutive numbers for writes, shared by all workers through one counter document.
+
+    Numbers are handed out before the documents carrying them are written, so a
+    later number can be stored before an earlier one. Every reservation stays
+    listed on the counter until its write is done, and horizon() returns the
+    lowest number that may still be in flight: readers paging by number must
+    stay below it or they skip the earlier write when it lands.
+    """
+
+    def __init__(self, collection, name: str, reservation_timeout_seconds: float):
+        self.collection = collection
+        self.name = name
+        self.reservation_timeout_seconds = reservation_timeout_seconds
+        # Highest value this worker has seen; the counter only grows, so it is a
+        # lower bound for the next number handed out
+        self.seen_value: Optional[int] = None
+
+    @asynccontextmanager
+    async def reserve(self, count: int = 1):
+        """Reserve count consecutive numbers for the write done inside the block; yields the first."""
+        if self.seen_value is None:
+            counter = await self.collection.find_one({"_id": self.name})
+            self.seen_value = counter.get("value", 0) if counter else 0
+        token = uuid.uuid4().hex
+        counter = await self.collection.find_one_and_update(
+            {"_id": self.name},
+            {"$inc": {"value": count},
+             "$push": {"pending": {"token": token, "floor": self.seen_value + 1, "at": datetime.utcnow()}}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self.seen_value = max(self.seen_value, counter["value"])
+        try:
+            yield counter["value"] - count + 1
+        finally:
+            await self.collection.update_one({"_id": self.name}, {"$pull": {"pending": {"token": token}}})
+
+    async def horizon(self) -> int:
+        """Every number below this one is either written or abandoned."""
+        counter = await self.collection.find_one({"_id": self.name}) or {}
+        horizon = counter.get("value", 0) + 1
+        # A reservation older than the timeout belongs to a worker that died mid-write
+        cutoff = datetime.utcnow() - timedelta(seconds=self.reservation_timeout_seconds)
+        stale = False
+        for reservation in counter.get("pending", []):
+            if reservation["at"] < cutoff:
+                stale = True
+            else:
+                horizon = min(horizon, reservation["floor"])
+        if stale:
+            await self.collection.update_one({"_id": self.name}, {"$pull": {"pending": {"at": {"$lt": cutoff}}}})
+        return horizon
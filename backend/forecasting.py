@@ -0,0 +1,118 @@
+from datetime import datetime
+from itertools import repeat
+from typing import Dict, List
+
+import numpy as np
+
+# Consumption forecasting for the whole inventory in one vectorized pass.
+#
+# The consumed food events are the history of quantity decreases. Each event is
+# weighted by exp(-age / tau), so recent consumption counts most, and an item's
+# daily rate is its weighted consumption divided by its weighted exposure (how
+# long it has been in the inventory, on the same decay). Rates are shrunk
+# towards the pooled rate of items with the same category and unit, which is
+# also what items without history of their own get.
+
+SECONDS_PER_DAY = 86400.0
+
+def days_until(timestamps: List, now: datetime) -> np.ndarray:
+    """Days from now to each ISO timestamp or datetime (negative in the past, NaN if missing or invalid)."""
+    try:
+        parsed = np.array([value or "NaT" for value in timestamps], dtype="datetime64[us]")
+    except ValueError:
+        # A malformed value somewhere: fall back to parsing one at a time
+        parsed = np.array([parse_or_nat(value) for value in timestamps], dtype="datetime64[us]")
+    deltas = (parsed - np.datetime64(now, "us")).astype("timedelta64[us]").astype(np.float64) / 1e6 / SECONDS_PER_DAY
+    deltas[np.isnat(parsed)] = np.nan
+    return deltas
+
+def parse_or_nat(value):
+    try:
+        return np.datetime64(value, "us") if value else np.datetime64("NaT")
+    except ValueError:
+        return np.datetime64("NaT")
+
+def fit_and_predict(
+    quantities: np.ndarray,
+    expires_in_days: np.ndarray,
+    exposure_days: np.ndarray,
+    item_groups: np.ndarray,
+    event_items: np.ndarray,
+    event_groups: np.ndarray,
+    event_quantities: np.ndarray,
+    event_ages: np.ndarray,
+    group_count: int,
+    half_life_days: float,
+    prior_days: float,
+) -> Dict[str, np.ndarray]:
+    """Fit consumption rates and predict run-out for every item at once.
+
+    event_items holds the inventory index of each event's item, or -1 for items
+    that are gone (those still count towards their group's pooled rate).
+    Returns per-item arrays: daily_rate, has_history, run_out_days,
+    expires_first and leftover_at_expiration.
+    """
+    tau = half_life_days / np.log(2)
+    weighted = event_quantities * np.exp(-np.maximum(event_ages, 0) / tau)
+    exposure = tau * (1 - np.exp(-np.maximum(exposure_days, 1.0) / tau))
+
+    known = event_items >= 0
+    item_consumed = np.bincount(event_items[known], weights=weighted[known], minlength=len(quantities))
+    item_events = np.bincount(event_items[known], minlength=len(quantities))
+
+    group_consumed = np.bincount(event_groups, weights=weighted, minlength=group_count)
+    group_exposure = np.bincount(item_groups, weights=exposure, minlength=group_count)
+    group_rate = np.divide(group_consumed, group_exposure, out=np.zeros(group_count), where=group_exposure > 0)
+
+    # prior_days of pseudo-exposure at the group rate
+    daily_rate = (item_consumed + prior_days * group_rate[item_groups]) / (exposure + prior_days)
+
+    with np.errstate(divide="ignore"):
+        run_out_days = np.where(daily_rate > 0, quantities / np.where(daily_rate > 0, daily_rate, 1), np.inf)
+    expires_first = ~np.isnan(expires_in_days) & (expires_in_days < run_out_days)
+    leftover = np.where(expires_first, np.maximum(quantities - daily_rate * np.maximum(expires_in_days, 0), 0), 0.0)
+    return {
+        "daily_rate": daily_rate,
+        "has_history": item_events > 0,
+        "run_out_days": run_out_days,
+        "expires_first": expires_first,
+        "leftover_at_expiration": leftover,
+    }
+
+def forecast_inventory(items: List[dict], events: List[dict], now: datetime, half_life_days: float,
+                       prior_days: float, history_days: float) -> Dict[str, np.ndarray]:
+    """Per-item forecast arrays (see fit_and_predict), in the order of items.
+
+    events are consumed events with item_id, category, unit, quantity and age_days.
+    """
+    groups: Dict[tuple, int] = {}
+    item_groups = np.fromiter(
+        (groups.setdefault((item.get("category") or "other", item.get("unit") or "each"), len(groups)) for item in items),
+        dtype=np.int64, count=len(items)
+    )
+
+    # Events of items still in the inventory take the item's group; only events
+    # of items that are gone need their own category/unit looked up
+    item_index = {item["id"]: position for position, item in enumerate(items)}
+    event_items = np.fromiter(map(item_index.get, [event.get("item_id") for event in events], repeat(-1)),
+                              dtype=np.int64, count=len(events))
+    event_groups = item_groups[np.maximum(event_items, 0)] if len(items) else np.zeros(len(events), dtype=np.int64)
+    for position in np.flatnonzero(event_items < 0).tolist():
+        event = events[position]
+        event_groups[position] = groups.setdefault((event.get("category") or "other", event.get("unit") or "each"), len(groups))
+
+    # Exposure is capped at the history window, since older events aren't loaded
+    in_inventory_days = np.nan_to_num(-days_until([item.get("created_at") for item in items], now), nan=history_days)
+    return fit_and_predict(
+        quantities=np.array([item.get("quantity") or 0 for item in items], dtype=np.float64),
+        expires_in_days=days_until([item.get("expiration_date") for item in items], now),
+        exposure_days=np.clip(in_inventory_days, 0, history_days),
+        item_groups=item_groups,
+        event_items=event_items,
+        event_groups=event_groups,
+        event_quantities=np.array([event["quantity"] for event in events], dtype=np.float64),
+        event_ages=np.array([event["age_days"] for event in events], dtype=np.float64),
+        group_count=len(groups),
+        half_life_days=half_life_days,
+        prior_days=prior_days,
+    )
@@ -0,0 +1,296 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+# Deterministic parser for the common ai-update instructions ("I ate half",
+# "move to freezer", "expires in 3 days", "add 2 days", "rename to ...").
+# Every clause of the instruction must match a rule and no two clauses may set
+# the same field; otherwise the parser returns None and the caller falls
+# through to the LLM.
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11,
+    "twelve": 12,
+}
+
+FRACTION_WORDS = {
+    "half": 0.5, "a half": 0.5, "one half": 0.5,
+    "a third": 1 / 3, "one third": 1 / 3, "two thirds": 2 / 3,
+    "a quarter": 0.25, "one quarter": 0.25, "a fourth": 0.25,
+    "three quarters": 0.75,
+}
+
+STORAGE_WORDS = {
+    "freezer": "frozen", "frozen": "frozen",
+    "fridge": "refrigerated", "refrigerator": "refrigerated", "refrigerated": "refrigerated",
+    "pantry": "pantry", "cupboard": "pantry", "cabinet": "pantry",
+    "counter": "room_temp", "countertop": "room_temp", "room temperature": "room_temp",
+    "room temp": "room_temp",
+}
+
+MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3,
+    "apr": 4, "april": 4, "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7,
+    "aug": 8, "august": 8, "sep": 9, "sept": 9, "september": 9, "oct": 10,
+    "october": 10, "nov": 11, "november": 11, "dec": 12, "december": 12,
+}
+
+NUM = r"(\d+(?:\.\d+)?|" + "|".join(sorted((re.escape(w) for w in NUMBER_WORDS), key=len, reverse=True)) + r")"
+FRACTION = r"(" + "|".join(sorted((re.escape(w) for w in FRACTION_WORDS), key=len, reverse=True)) + r"|\d+/\d+|\d+(?:\.\d+)?%)"
+PERIOD = r"(days?|weeks?)"
+STORAGE = r"(" + "|".join(sorted((re.escape(w) for w in STORAGE_WORDS), key=len, reverse=True)) + r")"
+MONTH = r"(" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")"
+ABSOLUTE_DATE = r"(\d{4}-\d{2}-\d{2}|" + MONTH + r" (\d{1,2})(?:st|nd|rd|th)?|(\d{1,2})(?:st|nd|rd|th)? (?:of )?" + MONTH + r")"
+
+SUBJECT = r"(?:(?:i|we) (?:have |just |only |already )*)?"
+OBJECT = r"(?: (?:of )?(?:it|this|that|them|these|those|the \w+))?"
+ITEM = r"(?:(?:it|this|that|they|these|those) (?:is |are |has |have )?)?"
+EATEN = r"(?:ate|eaten|eat|used|use|consumed|drank|drunk|had|finished|cooked|took)"
+EXPIRES = r"(?:expires|expire|will expire|expiring|goes bad|will go bad|is good|good|lasts|will last|keeps|will keep)"
+
+def word_forms(word: str) -> set:
+    """A word plus its naive singular forms, for unit/name matching."""
+    forms = {word}
+    if word.endswith("es"):
+        forms.add(word[:-2])
+    if word.endswith("s"):
+        forms.add(word[:-1])
+    return forms
+
+class InstructionContext:
+    """Current item values the rules compute relative updates from."""
+
+    def __init__(self, quantity: float, unit: str, name: str, expiration_date: Optional[date], today: date):
+        self.quantity = quantity
+        self.item_words = word_forms(unit.lower()) | {form for word in re.findall(r"[a-z]+", name.lower()) for form in word_forms(word)}
+        self.expiration_date = expiration_date
+        self.today = today
+
+    def refers_to_item(self, word: Optional[str]) -> bool:
+        """True if an amount's trailing word is the item's unit or part of its name."""
+        if not word:
+            return True
+        return bool(word_forms(word) & self.item_words)
+
+def parse_number(text: str) -> float:
+    """Parse a digit or number-word amount."""
+    return float(NUMBER_WORDS[text]) if text in NUMBER_WORDS else float(text)
+
+def parse_fraction(text: str) -> float:
+    """Parse a fraction word, n/m or percentage into a 0-1 share."""
+    if text in FRACTION_WORDS:
+        return FRACTION_WORDS[text]
+    if text.endswith("%"):
+        return float(text[:-1]) / 100
+    numerator, denominator = text.split("/")
+    return float(numerator) / float(denominator)
+
+def period_days(amount: str, period: str) -> int:
+    """Convert an amount of days or weeks to days."""
+    return int(round(parse_number(amount) * (7 if period.startswith("week") else 1)))
+
+def format_quantity(value: float) -> float:
+    """Round computed quantities and never go below zero."""
+    return round(max(value, 0.0), 3)
+
+def format_date(value: date) -> str:
+    """Dates are returned as YYYY-MM-DD, matching the LLM response."""
+    return value.isoformat()
+
+def parse_absolute_date(match: re.Match, group: int, today: date) -> Optional[date]:
+    """Resolve an ISO or month-name date captured starting at the given group."""
+    text = match.group(group)
+    try:
+        if re.fullmatch(r"\d{4}-\d{2}-\d{2}", text):
+            return date.fromisoformat(text)
+        if match.group(group + 1):
+            month, day = MONTHS[match.group(group + 1)], int(match.group(group + 2))
+        else:
+            month, day = MONTHS[match.group(group + 4)], int(match.group(group + 3))
+        resolved = date(today.year, month, day)
+    except ValueError:
+        return None
+    # A month/day without a year that is long past refers to next year
+    if (today - resolved).days > 180:
+        resolved = resolved.replace(year=today.year + 1)
+    return resolved
+
+def consume_units(match: re.Match, ctx: InstructionContext) -> Optional[dict]:
+    """Subtract a consumed amount, only when it is expressed in the item's own unit."""
+    if not ctx.refers_to_item(match.group(2)):
+        return None
+    return {"quantity": format_quantity(ctx.quantity - parse_number(match.group(1)))}
+
+def units_left(match: re.Match, ctx: InstructionContext) -> Optional[dict]:
+    """Set the remaining amount, only when it is expressed in the item's own unit."""
+    if not ctx.refers_to_item(match.group(2)):
+        return None
+    return {"quantity": format_quantity(parse_number(match.group(1)))}
+
+def units_added(match: re.Match, ctx: InstructionContext) -> Optional[dict]:
+    """Add a bought amount, only when it is expressed in the item's own unit."""
+    if not ctx.refers_to_item(match.group(2)):
+        return None
+    return {"quantity": format_quantity(ctx.quantity + parse_number(match.group(1)))}
+
+def shift_expiration(ctx: InstructionContext, days: int) -> Optional[dict]:
+    """Move the current expiration date by a number of days."""
+    if ctx.expiration_date is None:
+        return None
+    return {"expiration_date": format_date(ctx.expiration_date + timedelta(days=days))}
+
+def absolute_expiration(match: re.Match, ctx: InstructionContext) -> Optional[dict]:
+    """Set the expiration date to an explicit date."""
+    resolved = parse_absolute_date(match, 1, ctx.today)
+    return {"expiration_date": format_date(resolved)} if resolved else None
+
+RELATIVE_DAYS = {"today": 0, "tomorrow": 1, "yesterday": -1}
+
+Rule = Tuple[str, Callable[[re.Match, InstructionContext], Optional[dict]]]
+
+RULES: List[Rule] = [
+    # Quantity: consumed a share ("I only ate half of this", "used 25%")
+    (SUBJECT + EATEN + r"(?: only| about| roughly)? " + FRACTION + OBJECT,
+     lambda m, ctx: {"quantity": format_quantity(ctx.quantity * (1 - parse_fraction(m.group(1))))}),
+    # Quantity: a share is left ("half left", "only a quarter remaining")
+    (r"(?:there is |there are )?(?:only )?(?:about )?" + FRACTION + OBJECT + r" (?:is |are )?(?:left|remaining|remains)",
+     lambda m, ctx: {"quantity": format_quantity(ctx.quantity * parse_fraction(m.group(1)))}),
+    # Quantity: all used up
+    (SUBJECT + EATEN + r"(?: up)? (?:all|everything|it all|them all|all of (?:it|this|them)|the whole thing|the rest)",
+     lambda m, ctx: {"quantity": 0.0}),
+    (SUBJECT + r"(?:" + EATEN + r" (?:it|this|them) up|finished(?: it| this| them| off)?|used up|polished (?:it |this |them )?off)",
+     lambda m, ctx: {"quantity": 0.0}),
+    (ITEM + r"(?:all )?(?:gone|finished|used up|empty|none left|out|run out|ran out)",
+     lambda m, ctx: {"quantity": 0.0}),
+    # Quantity: consumed a number of units ("I ate 2", "used one more")
+    (SUBJECT + EATEN + r" " + NUM + r"(?: more)?(?: ([a-z]+))?" + OBJECT,
+     consume_units),
+    # Quantity: absolute amount left ("only 3 left", "set quantity to 2")
+    (r"(?:there (?:is|are) |(?:i|we) (?:have|got) )?(?:only )?" + NUM + r"(?: ([a-z]+))? (?:left|remaining|remain)",
+     units_left),
+    (r"(?:set|change|update|make)(?: the)? quantity (?:to|=) " + NUM,
+     lambda m, ctx: {"quantity": format_quantity(parse_number(m.group(1)))}),
+    (r"quantity (?:is|=|should be) " + NUM,
+     lambda m, ctx: {"quantity": format_quantity(parse_number(m.group(1)))}),
+    # Quantity: bought more ("bought 2 more", "add 3 more")
+    (SUBJECT + r"(?:bought|added|add|got|picked up) " + NUM + r" more(?: ([a-z]+))?",
+     units_added),
+
+    # Expiration: relative to today ("this expires in 3 days", "good for another week")
+    (ITEM + EXPIRES + r"(?: in| for)?(?: another)? (?:" + NUM + r" )?(?:more )?" + PERIOD + r"(?: from now| from today)?",
+     lambda m, ctx: {"expiration_date": format_date(ctx.today + timedelta(days=period_days(m.group(1) or "1", m.group(2))))}),
+    (ITEM + r"(?:expires|will expire|expiring|expired|goes bad|went bad|is good until|good until)(?: on)? (today|tomorrow|yesterday)",
+     lambda m, ctx: {"expiration_date": format_date(ctx.today + timedelta(days=RELATIVE_DAYS[m.group(1)]))}),
+    (ITEM + r"(?:expired|went bad|went off) " + NUM + r" " + PERIOD + r" ago",
+     lambda m, ctx: {"expiration_date": format_date(ctx.today - timedelta(days=period_days(m.group(1), m.group(2))))}),
+    # Expiration: spoiled ("this is rotten", "it's gone bad")
+    (ITEM + r"(?:already |now )?(?:rotten|spoiled|spoilt|gone bad|gone off|moldy|mouldy|expired|bad|off)(?: now| already)?",
+     lambda m, ctx: {"expiration_date": format_date(ctx.today - timedelta(days=1))}),
+    # Expiration: absolute date ("expires on 2025-11-03", "best before oct 5")
+    (ITEM + r"(?:expires|will expire|expiring|is good until|good until|best before|use by|(?:set|change|update)(?: the)? expiration(?: date)? to|expiration(?: date)? is)(?: on)? " + ABSOLUTE_DATE,
+     absolute_expiration),
+    # Expiration: shift current date ("add 2 days to the expiration date")
+    (r"(?:add|extend(?: it| this| the expiration(?: date)?)? by|push(?: it| the expiration(?: date)?)?(?: back| out)? by|give it)(?: another)? " + NUM + r" (?:more |extra )?" + PERIOD
+     + r"(?: to (?:the |its )?(?:expiration|expiry)(?: date)?)?",
+     lambda m, ctx: shift_expiration(ctx, period_days(m.group(1), m.group(2)))),
+    (r"(?:subtract|remove|take(?: off)?|shorten(?: it| the expiration(?: date)?)? by) " + NUM + r" " + PERIOD
+     + r"(?: (?:from|off) (?:the |its )?(?:expiration|expiry)(?: date)?)?",
+     lambda m, ctx: shift_expiration(ctx, -period_days(m.group(1), m.group(2)))),
+
+    # Storage moves ("move this to the freezer", "I put it in the fridge")
+    (SUBJECT + r"(?:move|moved|put|store|stored|keep|kept|transfer|transferred|place|placed)(?: it| this| that| them)? (?:in|into|to|on|at)(?: the)? " + STORAGE,
+     lambda m, ctx: {"storage_condition": STORAGE_WORDS[m.group(1)]}),
+    (SUBJECT + r"(?:froze|freeze|frozen)(?: it| this| them)?",
+     lambda m, ctx: {"storage_condition": "frozen"}),
+    (SUBJECT + r"(?:refrigerate|refrigerated)(?: it| this| them)?",
+     lambda m, ctx: {"storage_condition": "refrigerated"}),
+    (ITEM + r"(?:now )?(?:in|at)(?: the)? " + STORAGE,
+     lambda m, ctx: {"storage_condition": STORAGE_WORDS[m.group(1)]}),
+]
+
+COMPILED_RULES = [(re.compile(pattern), handler) for pattern, handler in RULES]
+
+RENAME_PATTERN = re.compile(
+    r"^\s*(?:please\s+)?(?:change|set|update)\s+(?:the\s+)?name\s+to\s+(.+?)\s*$|"
+    r"^\s*(?:please\s+)?rename\s+(?:it\s+|this\s+)?(?:to\s+|as\s+)?(.+?)\s*$|"
+    r"^\s*(?:please\s+)?call\s+(?:it|this)\s+(.+?)\s*$",
+    re.IGNORECASE,
+)
+
+# "call it a day" is not a new name
+RENAME_IDIOMS = {"a day", "a night", "quits", "even"}
+
+CLAUSE_SEPARATOR = r"\s*(?:,|;|\band then\b|\band\b|\bthen\b)\s*"
+
+FILLER_PREFIXES = ("please ", "actually ", "ok ", "okay ", "oh ", "also ", "just ", "so ", "well ")
+
+def normalize(text: str) -> str:
+    """Lowercase, expand contractions and strip punctuation and filler words."""
+    text = text.lower().strip()
+    text = text.replace("’", "'")
+    text = re.sub(r"\b(it|that|there)'s\b", r"\1 is", text)
+    text = re.sub(r"\b(i|we)'ve\b", r"\1 have", text)
+    text = re.sub(r"[\"!?]", "", text)
+    text = re.sub(r"\.(?!\d)", "", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    changed = True
+    while changed:
+        changed = False
+        for prefix in FILLER_PREFIXES:
+            if text.startswith(prefix):
+                text = text[len(prefix):]
+                changed = True
+    return text
+
+def split_clauses(text: str) -> List[str]:
+    """Split a compound instruction on commas, semicolons and 'and'/'then'."""
+    parts = re.split(CLAUSE_SEPARATOR, text)
+    return [normalize(part) for part in parts if part.strip()]
+
+def parse_instruction(instruction: str, item: dict, today: Optional[date] = None) -> Optional[dict]:
+    """Parse an ai-update instruction locally.
+
+    Returns the updated_fields dict, or None when the instruction can't be
+    parsed with confidence and should go to the LLM.
+    """
+    today = today or datetime.utcnow().date()
+
+    rename = RENAME_PATTERN.match(instruction)
+    if rename:
+        new_name = next(group for group in rename.groups() if group).strip().strip("\"'").rstrip(".!")
+        # The rename rule takes the rest of the instruction, so a name that could
+        # be several clauses ("soup, expires in 2 days") is left to the LLM
+        if not new_name or re.search(CLAUSE_SEPARATOR, new_name, re.IGNORECASE) or new_name.lower() in RENAME_IDIOMS:
+            return None
+        return {"name": new_name}
+
+    try:
+        quantity = float(item.get("quantity") or 0)
+    except (TypeError, ValueError):
+        return None
+    try:
+        expiration_date = datetime.fromisoformat(item.get("expiration_date") or "").date()
+    except ValueError:
+        expiration_date = None
+    ctx = InstructionContext(quantity, item.get("unit") or "", item.get("name") or "", expiration_date, today)
+
+    clauses = split_clauses(instruction)
+    if not clauses:
+        return None
+
+    updated_fields = {}
+    for clause in clauses:
+        result = None
+        for pattern, handler in COMPILED_RULES:
+            match = pattern.fullmatch(clause)
+            if match:
+                result = handler(match, ctx)
+                break
+        if not result:
+            return None
+        # Two clauses touching the same field is ambiguous
+        if any(field in updated_fields for field in result):
+            return None
+        updated_fields.update(result)
+    return updated_fields
@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Iterable, List, Tuple, Union
+
+# Streaming export and import of the inventory as NDJSON (one JSON document per
+# line) or CSV (a header row, then one row per item). Both directions work a
+# line at a time, so memory use depends on the batch size, not the file size.
+
+NDJSON = "ndjson"
+CSV = "csv"
+FORMATS = [NDJSON, CSV]
+MEDIA_TYPES = {NDJSON: "application/x-ndjson", CSV: "text/csv"}
+
+class LineTooLong(ValueError):
+    pass
+
+def ndjson_chunk(documents: Iterable[dict]) -> str:
+    """Documents as NDJSON lines."""
+    return "".join(json.dumps(document, ensure_ascii=False, default=str) + "\n" for document in documents)
+
+def csv_chunk(documents: Iterable[dict], fields: List[str], header: bool = False) -> str:
+    """Documents as CSV rows with the given columns (and the header row first if asked)."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore", lineterminator="\n")
+    if header:
+        writer.writeheader()
+    writer.writerows(documents)
+    return buffer.getvalue()
+
+async def read_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[Union[str, LineTooLong]]:
+    """Split a byte stream into decoded lines (without line endings).
+
+    A line longer than max_line_bytes is skipped and yielded as a LineTooLong
+    error instead, so one bad line can't make the whole body buffer in memory.
+    """
+    buffer = bytearray()
+    skipping = False
+    first = True
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line = bytes(buffer[start:end])
+            start = end + 1
+            if skipping:
+                skipping = False
+                continue
+            if len(line) > max_line_bytes:
+                yield LineTooLong(f"Line is longer than {max_line_bytes} bytes")
+                continue
+            yield decode_line(line, first)
+            first = False
+        del buffer[:start]
+        if not skipping and len(buffer) > max_line_bytes:
+            yield LineTooLong(f"Line is longer than {max_line_bytes} bytes")
+            skipping = True
+            first = False
+        if skipping:
+            buffer.clear()
+    if buffer and not skipping:
+        yield decode_line(bytes(buffer), first)
+
+def decode_line(line: bytes, first: bool) -> str:
+    text = line.decode("utf-8-sig" if first else "utf-8", errors="replace")
+    return text[:-1] if text.endswith("\r") else text
+
+async def parse_records(lines: AsyncIterator[Union[str, LineTooLong]], format: str) -> AsyncIterator[Tuple[int, Union[dict, ValueError]]]:
+    """Yield (line number, record or error) for every non-blank record of an NDJSON or CSV stream.
+
+    CSV records may span several lines when a quoted field contains newlines;
+    empty CSV fields are left out so the model defaults apply.
+    """
+    line_number = 0
+    columns = None
+    pending: List[str] = []
+    pending_start = 0
+    async for line in lines:
+        line_number += 1
+        if isinstance(line, LineTooLong):
+            pending = []
+            yield line_number, line
+            continue
+        if format == NDJSON:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, ValueError(f"Invalid JSON: {e}")
+                continue
+            yield line_number, record if isinstance(record, dict) else ValueError("Expected a JSON object")
+            continue
+
+        if not pending:
+            if not line.strip():
+                continue
+            pending_start = line_number
+        pending.append(line)
+        text = "\n".join(pending)
+        if text.count('"') % 2:
+            continue  # Inside a quoted field that continues on the next line
+        pending = []
+        try:
+            values = next(csv.reader([text]))
+        except csv.Error as e:
+            yield pending_start, ValueError(f"Invalid CSV: {e}")
+            continue
+        if columns is None:
+            columns = [column.strip() for column in values]
+            continue
+        if len(values) > len(columns):
+            yield pending_start, ValueError(f"Expected {len(columns)} columns, got {len(values)}")
+            continue
+        yield pending_start, {column: value for column, value in zip(columns, values) if value != ""}
+    if pending:
+        yield pending_start, ValueError("Unterminated quoted field")
@@ -0,0 +1,249 @@
+import asyncio
+import random
+import smtplib
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+# Outbox for delivering notifications outside the app. Every notification gets
+# one outbox entry per delivery target (an email address or a webhook URL),
+# written together with the notification. A pool of worker tasks claims due
+# entries in batches, sends each target one email or one webhook call covering
+# all of its entries in the batch, and reschedules failures with exponential
+# backoff until they run out of attempts.
+#
+# Claims are atomic, so every app worker can run a pool. An entry whose claim
+# expired (its worker died mid-send) is claimed again, so delivery is at least
+# once.
+
+EMAIL = "email"
+WEBHOOK = "webhook"
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+def outbox_entries(notifications: List[dict], targets: Dict[str, List[str]]) -> List[dict]:
+    """Outbox entries for new notifications; targets maps each channel to its addresses / URLs."""
+    now = datetime.utcnow()
+    entries = []
+    for notification in notifications:
+        payload = {key: value for key, value in notification.items() if key not in ("_id", "seq", "updated_at")}
+        for channel, channel_targets in targets.items():
+            for target in channel_targets:
+                entries.append({
+                    "_id": str(uuid.uuid4()),
+                    "notification_id": notification["id"],
+                    "channel": channel,
+                    "target": target,
+                    "payload": payload,
+                    "status": PENDING,
+                    "attempts": 0,
+                    "next_attempt_at": now,
+                    "created_at": now,
+                })
+    return entries
+
+class SmtpSender:
+    """Sends each recipient one email per batch, over a single SMTP connection."""
+
+    def __init__(self, host: str, port: int, sender: str, username: Optional[str] = None,
+                 password: Optional[str] = None, starttls: bool = False, timeout_seconds: float = 30.0):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout_seconds = timeout_seconds
+
+    async def deliver(self, batches: Dict[str, List[dict]]) -> Dict[str, Optional[Exception]]:
+        # smtplib blocks, so the whole session runs in a worker thread
+        return await asyncio.to_thread(self.deliver_blocking, batches)
+
+    def deliver_blocking(self, batches: Dict[str, List[dict]]) -> Dict[str, Optional[Exception]]:
+        results: Dict[str, Optional[Exception]] = {}
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout_seconds) as smtp:
+                if self.starttls:
+                    smtp.starttls()
+                if self.username:
+                    smtp.login(self.username, self.password or "")
+                for recipient, payloads in batches.items():
+                    try:
+                        smtp.send_message(self.message(recipient, payloads))
+                        results[recipient] = None
+                    except smtplib.SMTPException as e:
+                        results[recipient] = e
+        except (OSError, smtplib.SMTPException) as e:
+            # Couldn't connect or the session broke: everything not sent yet failed
+            for recipient in batches:
+                results.setdefault(recipient, e)
+        return results
+
+    def message(self, recipient: str, payloads: List[dict]) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = recipient
+        if len(payloads) == 1:
+            message["Subject"] = f"Food Guard: {payloads[0].get('message', 'reminder')}"
+        else:
+            message["Subject"] = f"Food Guard: {len(payloads)} food reminders"
+        message.set_content("\n".join(
+            f"- [{payload.get('priority', 'medium')}] {payload.get('message', '')}" for payload in payloads
+        ) + "\n")
+        return message
+
+class WebhookSender:
+    """POSTs each URL one JSON body per batch: {"notifications": [...]}; any non-2xx response is a failure."""
+
+    def __init__(self, timeout_seconds: float = 10.0):
+        self.timeout_seconds = timeout_seconds
+        self.client = None
+
+    async def deliver(self, batches: Dict[str, List[dict]]) -> Dict[str, Optional[Exception]]:
+        if self.client is None:
+            # Imported on first use to keep it off the startup path (see ai_router.py)
+            import httpx
+            self.client = httpx.AsyncClient(timeout=self.timeout_seconds)
+        urls = list(batches)
+        responses = await asyncio.gather(
+            *(self.client.post(url, json={"notifications": batches[url]}) for url in urls),
+            return_exceptions=True
+        )
+        results: Dict[str, Optional[Exception]] = {}
+        for url, response in zip(urls, responses):
+            if isinstance(response, Exception):
+                results[url] = response
+            elif response.is_success:
+                results[url] = None
+            else:
+                results[url] = RuntimeError(f"HTTP {response.status_code}")
+        return results
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+class OutboxWorkerPool:
+    """Worker tasks that drain the outbox collection."""
+
+    def __init__(self, collection, senders: Dict[str, object], workers: int, batch_size: int, max_attempts: int,
+                 retry_base_seconds: float, retry_max_seconds: float, poll_seconds: float, claim_seconds: float):
+        self.collection = collection
+        self.senders = senders
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.poll_seconds = poll_seconds
+        self.claim_seconds = claim_seconds
+        self.wakeup = asyncio.Event()
+        self.stopping = False
+        self.tasks: List[asyncio.Task] = []
+        self.stats = {"batches": 0, "sent": 0, "retried": 0, "failed": 0}
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self.run()) for _ in range(self.workers)]
+
+    def wake(self):
+        """Have idle workers look for due entries now instead of at their next poll."""
+        self.wakeup.set()
+
+    async def close(self, timeout_seconds: float):
+        """Let workers finish the batch they are sending (up to timeout_seconds), then stop them."""
+        self.stopping = True
+        self.wake()
+        done, pending = await asyncio.wait(self.tasks, timeout=timeout_seconds) if self.tasks else (set(), set())
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        for sender in self.senders.values():
+            if hasattr(sender, "close"):
+                await sender.close()
+
+    async def run(self):
+        while not self.stopping:
+            try:
+                entries = await self.claim()
+                if entries:
+                    await self.deliver(entries)
+                    continue
+            except Exception as e:
+                print(f"Notification delivery failed: {e}")
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    async def claim(self) -> List[dict]:
+        """Claim up to batch_size due entries for this worker."""
+        now = datetime.utcnow()
+        due = {"$or": [
+            {"status": PENDING, "next_attempt_at": {"$lte": now}},
+            {"status": SENDING, "claimed_until": {"$lt": now}},
+        ]}
+        candidates = await self.collection.find(due, {"_id": 1}).sort("next_attempt_at", 1).limit(self.batch_size).to_list(length=None)
+        if not candidates:
+            return []
+        # Another worker may claim some of the same entries; the update only takes those still due
+        claim = str(uuid.uuid4())
+        await self.collection.update_many(
+            {"_id": {"$in": [entry["_id"] for entry in candidates]}, **due},
+            {"$set": {"status": SENDING, "claim": claim, "claimed_until": now + timedelta(seconds=self.claim_seconds)}}
+        )
+        return await self.collection.find({"claim": claim, "status": SENDING}).to_list(length=None)
+
+    async def deliver(self, entries: List[dict]):
+        """Send claimed entries, batched per channel and target, and record the outcomes."""
+        batches: Dict[str, Dict[str, List[dict]]] = {}
+        for entry in entries:
+            batches.setdefault(entry["channel"], {}).setdefault(entry["target"], []).append(entry)
+
+        async def send(channel: str, by_target: Dict[str, List[dict]]) -> Dict[str, Optional[Exception]]:
+            sender = self.senders.get(channel)
+            if sender is None:
+                error = RuntimeError(f"No sender configured for channel {channel}")
+                return {target: error for target in by_target}
+            return await sender.deliver({target: [entry["payload"] for entry in target_entries]
+                                         for target, target_entries in by_target.items()})
+
+        channels = list(batches)
+        outcomes = await asyncio.gather(*(send(channel, batches[channel]) for channel in channels), return_exceptions=True)
+
+        now = datetime.utcnow()
+        operations = []
+        for channel, results in zip(channels, outcomes):
+            for target, target_entries in batches[channel].items():
+                error = results if isinstance(results, Exception) else results.get(target)
+                for entry in target_entries:
+                    operations.append(self.outcome(entry, error, now))
+        await self.collection.bulk_write(operations, ordered=False)
+        self.stats["batches"] += 1
+
+    def outcome(self, entry: dict, error: Optional[Exception], now: datetime) -> UpdateOne:
+        attempts = entry.get("attempts", 0) + 1
+        claimed = {"_id": entry["_id"], "claim": entry["claim"]}
+        if error is None:
+            self.stats["sent"] += 1
+            return UpdateOne(claimed, {"$set": {"status": SENT, "attempts": attempts, "finished_at": now},
+                                       "$unset": {"claim": "", "claimed_until": "", "last_error": ""}})
+        if attempts >= self.max_attempts:
+            self.stats["failed"] += 1
+            print(f"Giving up on {entry['channel']} delivery to {entry['target']} after {attempts} attempts: {error}")
+            return UpdateOne(claimed, {"$set": {"status": FAILED, "attempts": attempts, "finished_at": now, "last_error": str(error)},
+                                       "$unset": {"claim": "", "claimed_until": ""}})
+        self.stats["retried"] += 1
+        # Exponential backoff with jitter, so a recovering endpoint isn't hit by every retry at once
+        delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+        return UpdateOne(claimed, {"$set": {"status": PENDING, "attempts": attempts, "last_error": str(error),
+                                            "next_attempt_at": now + timedelta(seconds=delay)},
+                                   "$unset": {"claim": "", "claimed_until": ""}})
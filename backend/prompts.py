@@ -0,0 +1,141 @@
+import os
+from typing import List, Optional
+
+# Prompt templates, token budgets and token accounting for every AI call.
+# Each call site is identified by a task name used for budgets and usage stats.
+
+SHELF_LIFE = "shelf_life"
+ITEM_UPDATE = "item_update"
+BATCH_UPDATE = "batch_update"
+RECIPES = "recipes"
+RECIPE_FANOUT = "recipe_fanout"
+
+TASKS = [SHELF_LIFE, ITEM_UPDATE, BATCH_UPDATE, RECIPES, RECIPE_FANOUT]
+
+# max_tokens per task, overridable with AI_MAX_TOKENS_<TASK>
+DEFAULT_TOKEN_BUDGETS = {
+    SHELF_LIFE: 200,
+    ITEM_UPDATE: 150,
+    BATCH_UPDATE: 800,
+    RECIPES: 2500,
+    RECIPE_FANOUT: 1000,
+}
+TOKEN_BUDGETS = {
+    task: int(os.environ.get(f"AI_MAX_TOKENS_{task.upper()}", budget))
+    for task, budget in DEFAULT_TOKEN_BUDGETS.items()
+}
+# Output tokens reserved per listed item in a batch update
+BATCH_UPDATE_TOKENS_PER_ITEM = 60
+
+CATEGORIES = "produce|dairy|meat|packaged|frozen|other"
+STORAGE_CONDITIONS = "pantry|refrigerated|frozen|room_temp"
+UNITS = "each|lbs|oz|kg|g|gallon|liter"
+
+SHELF_LIFE_SYSTEM = "You are a food safety and storage expert. Reply with JSON only."
+UPDATE_SYSTEM = "You turn food inventory instructions into JSON field updates. Reply with JSON only."
+RECIPES_SYSTEM = "You are a creative chef who suggests recipes from available ingredients. Reply with JSON only."
+
+def token_budget(task: str, item_count: Optional[int] = None) -> int:
+    """max_tokens for a task; batch updates scale with the number of listed items."""
+    budget = TOKEN_BUDGETS[task]
+    if task == BATCH_UPDATE and item_count is not None:
+        budget = min(budget, 100 + BATCH_UPDATE_TOKENS_PER_ITEM * item_count)
+    return budget
+
+def shelf_life_prompt(food_name: str, category: Optional[str], storage_condition: Optional[str]) -> str:
+    """Prompt for category, shelf life, emoji and tip of a new item."""
+    category_line = f"\nCategory hint: {category}" if category else ""
+    return f"""Food: {food_name}
+Storage: {storage_condition}{category_line}
+JSON: {{"category":"{CATEGORIES}","shelf_life_days":<int>,"storage_recommendation":"{STORAGE_CONDITIONS}","emoji":"<one emoji>","tips":"<short storage tip>"}}
+shelf_life_days must be for the given Storage (e.g. chicken: frozen 90-365, refrigerated 1-2)."""
+
+def item_update_prompt(item: dict, instruction: str, today: str) -> str:
+    """Prompt for the fields a natural-language instruction changes on one item."""
+    return f"""Today: {today}
+Item: name={item['name']}; category={item['category']}; quantity={item['quantity']} {item['unit']}; storage={item['storage_condition']}; expires={item['expiration_date']}; notes={item['notes']}; emoji={item['emoji']}
+Instruction: "{instruction}"
+Return JSON with only the changed fields among name, category, quantity, unit, storage_condition, expiration_date, notes, emoji.
+quantity is the new absolute amount (e.g. "ate half" of 2 -> 1). expiration_date is an absolute YYYY-MM-DD computed from Today.
+Shifts like "add 2 days" or "one week less" apply to the current expires value, not to Today.
+category: {CATEGORIES}; storage_condition: {STORAGE_CONDITIONS}; unit: {UNITS}"""
+
+def batch_update_prompt(items: List[dict], instruction: str, today: str) -> str:
+    """Prompt for per-item updates across a pre-filtered inventory listing."""
+    listing = "\n".join(
+        f"{item['id']}|{item['name']}|{item['quantity']} {item['unit']}|{item['storage_condition']}|{str(item.get('expiration_date', ''))[:10]}"
+        for item in items
+    )
+    return f"""Today: {today}
+Items (id|name|quantity unit|storage|expires):
+{listing}
+Instruction: "{instruction}"
+JSON: {{"updates":[{{"id":"<item id>","fields":{{<changed fields only>}}}}]}}
+Only items the instruction refers to. quantity is the new absolute amount. expiration_date is an absolute YYYY-MM-DD computed from Today.
+Shifts like "add 2 days" or "one week less" apply to the item's current expires value, not to Today.
+category: {CATEGORIES}; storage_condition: {STORAGE_CONDITIONS}; unit: {UNITS}"""
+
+def recipes_prompt(available_items: List[dict], meal_type: str, style: str, max_time, servings, additional_prefs: str,
+                   recipe_count: int = 3, focus_ingredient: Optional[str] = None) -> str:
+    """Prompt for recipe suggestions from the soonest-expiring inventory items.
+
+    With a focus_ingredient the recipe is built around that item (used by the parallel fan-out mode).
+    """
+    listing = "\n".join(
+        f"{item['inventory_item_id']}|{item['name']}|{item['quantity']} {item['unit']}|{item['days_left']}d"
+        for item in available_items
+    )
+    focus_line = f"\nBuild the recipe around: {focus_ingredient}" if focus_ingredient else ""
+    recipe_word = "recipe" if recipe_count == 1 else "recipes"
+    return f"""Suggest {recipe_count} {recipe_word} using these ingredients (id|name|amount|expires in), soonest-expiring first:
+{listing}
+Meal type: {meal_type or "any"}; cuisine: {style or "any"}; max total time: {max_time} min; servings: {servings}; other: {additional_prefs or "none"}{focus_line}
+Rules: prefer soonest-expiring items; use 2+ listed items per recipe; total_time <= {max_time}; list every ingredient incl. staples; give step-by-step instructions.
+JSON: {{"recipes":[{{"name":"","servings":{servings},"prep_time":<min>,"cook_time":<min>,"total_time":<min>,"description":"<one sentence>","ingredients_used":["<listed item name>"],"ingredients":[{{"name":"","quantity_required":<number>,"unit":"<g, ml, tbsp, each...>","inventory_item_id":"<id from the list, or null>"}}],"instructions":["<step>"]}}]}}"""
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for when no usage is reported."""
+    return max(1, (len(text) + 3) // 4)
+
+class TokenUsageTracker:
+    """Accumulates prompt/completion token usage per AI task."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.usage = {task: self.empty_stats() for task in TASKS}
+
+    @staticmethod
+    def empty_stats() -> dict:
+        return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "truncated": 0, "cancelled": 0, "served_locally": 0}
+
+    def record(self, task: str, prompt_tokens: int, completion_tokens: int, truncated: bool = False):
+        stats = self.usage.setdefault(task, self.empty_stats())
+        stats["calls"] += 1
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        stats["truncated"] += int(truncated)
+
+    def record_cancellation(self, task: str):
+        """Count an in-flight call abandoned because the HTTP client disconnected."""
+        self.usage.setdefault(task, self.empty_stats())["cancelled"] += 1
+
+    def record_local(self, task: str):
+        """Count a request for the task answered without calling a model (e.g. by the local instruction parser)."""
+        self.usage.setdefault(task, self.empty_stats())["served_locally"] += 1
+
+    def summary(self) -> dict:
+        """Per-task totals and averages, plus the configured budgets."""
+        summary = {}
+        for task, stats in self.usage.items():
+            calls = stats["calls"] or 1
+            summary[task] = {
+                **stats,
+                "avg_prompt_tokens": round(stats["prompt_tokens"] / calls, 1),
+                "avg_completion_tokens": round(stats["completion_tokens"] / calls, 1),
+                "max_tokens": TOKEN_BUDGETS.get(task),
+            }
+        return summary
+
+token_usage = TokenUsageTracker()
@@ -0,0 +1,123 @@
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Similarity cache for AI food analyses. Food names are embedded as hashed
+# character n-gram vectors, so "organic bananas", "Bananas (bunch)" and
+# "banana" land next to each other, and a brute-force cosine search over an
+# in-memory matrix finds the nearest previously analysed name.
+
+EMBEDDING_DIM = 512
+NGRAM_SIZES = (2, 3, 4)
+
+# Words that describe packaging or quality rather than the food itself
+DESCRIPTOR_WORDS = {
+    "organic", "fresh", "large", "small", "medium", "bunch", "bag", "pack", "package", "box",
+    "of", "the", "a", "whole", "free", "range", "local", "natural", "premium", "family", "size",
+}
+
+def normalize_food_name(name: str) -> str:
+    """Lowercase, drop parentheticals, punctuation and descriptor words, and singularize."""
+    text = re.sub(r"\(.*?\)", " ", name.lower())
+    words = re.findall(r"[a-z]+", text)
+    kept = [word for word in words if word not in DESCRIPTOR_WORDS] or words
+    return " ".join(singularize(word) for word in kept)
+
+def singularize(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def embed(text: str) -> np.ndarray:
+    """Hashed character n-gram vector (L2-normalized) for a normalized food name."""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in text.split():
+        padded = f"<{word}>"
+        # Whole words get extra weight so shared words dominate shared fragments
+        vector[zlib.crc32(padded.encode()) % EMBEDDING_DIM] += 2.0
+        for size in NGRAM_SIZES:
+            for start in range(len(padded) - size + 1):
+                vector[zlib.crc32(padded[start:start + size].encode()) % EMBEDDING_DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+# Partition matrices grow by this many rows at a time, so adding an entry
+# doesn't copy the whole matrix
+GROWTH_BLOCK_ROWS = 256
+
+class Partition:
+    """Vectors of one partition in the first `size` rows of a block-allocated matrix, with their texts and analyses."""
+
+    def __init__(self, vectors: List[np.ndarray], texts: List[str], analyses: List[dict]):
+        self.size = len(vectors)
+        rows = -(-max(self.size, 1) // GROWTH_BLOCK_ROWS) * GROWTH_BLOCK_ROWS
+        self.matrix = np.zeros((rows, EMBEDDING_DIM), dtype=np.float32)
+        if vectors:
+            self.matrix[:self.size] = np.vstack(vectors)
+        self.texts = texts
+        self.analyses = analyses
+
+    def append(self, vector: np.ndarray, text: str, analysis: dict):
+        if self.size == len(self.matrix):
+            grown = np.zeros((len(self.matrix) + GROWTH_BLOCK_ROWS, EMBEDDING_DIM), dtype=np.float32)
+            grown[:self.size] = self.matrix
+            self.matrix = grown
+        self.matrix[self.size] = vector
+        self.size += 1
+        self.texts.append(text)
+        self.analyses.append(analysis)
+
+class SemanticCache:
+    """Nearest-neighbour cache of AI analyses, partitioned (e.g. by storage condition)."""
+
+    def __init__(self, threshold: float, max_entries: int):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.partitions: Dict[str, Partition] = {}
+        self.stats = {"hits": 0, "misses": 0, "entries": 0}
+
+    def lookup(self, partition: str, name: str) -> Optional[Tuple[dict, float, str]]:
+        """Return (analysis, similarity, matched name) for the closest entry above the threshold."""
+        if partition not in self.partitions:
+            self.stats["misses"] += 1
+            return None
+        entries = self.partitions[partition]
+        similarities = entries.matrix[:entries.size] @ embed(normalize_food_name(name))
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return entries.analyses[best], float(similarities[best]), entries.texts[best]
+
+    def add(self, partition: str, name: str, analysis: dict, vector: Optional[np.ndarray] = None) -> np.ndarray:
+        """Index an analysis; returns its vector so the caller can persist it."""
+        text = normalize_food_name(name)
+        if vector is None:
+            vector = embed(text)
+        if self.stats["entries"] >= self.max_entries:
+            return vector
+        if partition in self.partitions:
+            self.partitions[partition].append(vector, text, analysis)
+        else:
+            self.partitions[partition] = Partition([vector], [text], [analysis])
+        self.stats["entries"] += 1
+        return vector
+
+    def load(self, documents: List[dict]):
+        """Rebuild the index from persisted documents with stored vectors."""
+        grouped: Dict[str, Tuple[list, list, list]] = {}
+        for document in documents[:self.max_entries]:
+            vectors, texts, analyses = grouped.setdefault(document["partition"], ([], [], []))
+            vectors.append(np.frombuffer(document["vector"], dtype=np.float32))
+            texts.append(document["text"])
+            analyses.append(document["analysis"])
+        self.partitions = {
+            partition: Partition(vectors, texts, analyses)
+            for partition, (vectors, texts, analyses) in grouped.items()
+        }
+        self.stats["entries"] = sum(entries.size for entries in self.partitions.values())
@@ -1,18 +1,152 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import os
-from dotenv import load_dotenv
 import uuid
-from openai import AsyncOpenAI
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+import asyncio
+import hashlib
 import json
+import re
 
-load_dotenv()
+import prompts
+from ai_router import ModelRouter
+from instruction_parser import parse_instruction
+from semantic_cache import SemanticCache, normalize_food_name
+from coordination import InvalidationChannel, Lease, SequenceCounter, WORKER_ID
+from write_buffer import PendingQuantity, QuantityWriteBuffer
+import analytics
+import forecasting
+import inventory_transfer
+import units
+import shopping_list
+import notification_outbox
+from barcode_index import BarcodeIndex
+from bson import Binary
+import numpy as np
 
-app = FastAPI(title="Home Food Management System")
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+def find_env_file() -> Optional[str]:
+    """The nearest .env in this directory or its parents, like python-dotenv's find_dotenv."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, '.env')
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+# python-dotenv builds its parser on import, which is a measurable part of
+# startup (see benchmarks/import_time_benchmark.py), so only load it if there
+# is a .env file to read
+env_file = find_env_file()
+if env_file:
+    from dotenv import load_dotenv
+    load_dotenv(env_file)
+
+# MongoDB connection. The client and the AI clients are created, warmed and
+# closed by the app lifespan so pools are ready before traffic and in-flight
+# work is drained on shutdown.
+mongo_url = os.environ.get('MONGO_URL')
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '10'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '10000'))
+SHUTDOWN_DRAIN_SECONDS = float(os.environ.get('SHUTDOWN_DRAIN_SECONDS', '30'))
+WARMUP_RETRY_MAX_SECONDS = float(os.environ.get('WARMUP_RETRY_MAX_SECONDS', '30'))
+client = None
+db = None
+
+# Offline barcode lookups from an index built with barcode_index.py
+BARCODE_INDEX_PATH = os.environ.get('BARCODE_INDEX_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "barcodes.idx"))
+barcode_index = None
+
+# Readiness as reported by /readyz: warm once Mongo answers, the startup steps
+# that need it have run and the AI endpoints have been pinged. On shutdown
+# uvicorn stops accepting connections and waits for open requests before the
+# lifespan shutdown runs (up to SHUTDOWN_DRAIN_SECONDS when started with
+# `python server.py`; uvicorn's --timeout-graceful-shutdown otherwise), so load
+# balancers should stop routing to a worker before it gets SIGTERM.
+readiness = {"warm": False, "mongo": None, "ai": {}}
+
+async def ping_mongo_pool():
+    """Open min-pool-size Mongo connections."""
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(max(1, MONGO_MIN_POOL_SIZE))))
+
+async def warm_up_pools():
+    """Warm the Mongo pool, run the startup steps that need Mongo and pre-connect to every AI endpoint.
+    
+    A failing step is retried with exponential backoff (up to WARMUP_RETRY_MAX_SECONDS
+    apart) until it succeeds, so the worker starts without Mongo and becomes ready
+    once Mongo is reachable.
+    """
+    steps = [ping_mongo_pool, create_indexes, load_analysis_cache, detect_transaction_support, start_background_jobs]
+    delay = 1.0
+    while steps:
+        try:
+            await steps[0]()
+        except Exception as e:
+            print(f"Mongo warmup ({steps[0].__name__}) failed, retrying in {delay:.0f}s: {e}")
+            readiness["mongo"] = f"error: {e}"
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+        else:
+            steps.pop(0)
+    readiness["mongo"] = "ok"
+    readiness["ai"] = await model_router.warm_up()
+    readiness["warm"] = True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open and warm connection pools and start background jobs; close them on shutdown."""
+    global client, db, invalidation_channel, background_lease, sync_sequence, barcode_index, outbox_workers
+    client = AsyncIOMotorClient(
+        mongo_url,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS
+    )
+    db = client.food_management
+    invalidation_channel = InvalidationChannel(db, "cache_invalidations", CACHE_INVALIDATION_COLLECTION_BYTES)
+    background_lease = Lease(db.leases, "background_jobs", BACKGROUND_LEASE_TTL_SECONDS)
+    sync_sequence = SequenceCounter(db.counters, "sync_seq", SYNC_RESERVATION_TIMEOUT_SECONDS)
+    barcode_index = BarcodeIndex(BARCODE_INDEX_PATH) if os.path.exists(BARCODE_INDEX_PATH) else None
+    if barcode_index is not None:
+        print(f"Loaded barcode index with {barcode_index.count} products")
+    outbox_workers = create_outbox_workers()
+    if outbox_workers is not None:
+        outbox_workers.start()
+    warmup_task = asyncio.create_task(warm_up_pools())
+    try:
+        yield
+    finally:
+        warmup_task.cancel()
+        await asyncio.gather(warmup_task, return_exceptions=True)
+        if quantity_buffer is not None:
+            await quantity_buffer.close()
+        if outbox_workers is not None:
+            await outbox_workers.close(SHUTDOWN_DRAIN_SECONDS)
+            outbox_workers = None
+        await stop_background_jobs()
+        await model_router.close()
+        client.close()
+        if barcode_index is not None:
+            barcode_index.close()
+            barcode_index = None
+
+app = FastAPI(title="Home Food Management System", lifespan=lifespan)
 
 # CORS Configuration
 app.add_middleware(
@@ -21,18 +155,168 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
-# MongoDB connection
-mongo_url = os.environ.get('MONGO_URL')
-client = AsyncIOMotorClient(mongo_url)
-db = client.food_management
+# Response compression for the large list payloads. Brotli is preferred when
+# available and falls back to gzip for clients that don't accept it.
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1000'))
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_SIZE, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
 
-# DeepSeek client
-deepseek_client = AsyncOpenAI(
-    api_key=os.environ.get('DEEPSEEK_API_KEY'),
-    base_url=os.environ.get('DEEPSEEK_BASE_URL')
-)
+# Retention policies (days). Read notifications and past calendar events are
+# removed by the archival job, which leaves sync tombstones (a TTL index would
+# delete them without one); fully consumed items are moved to the archive after
+# a grace period so the UI can still offer to clean them up.
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', '30'))
+CALENDAR_EVENT_RETENTION_DAYS = int(os.environ.get('CALENDAR_EVENT_RETENTION_DAYS', '30'))
+CONSUMED_ITEM_GRACE_DAYS = int(os.environ.get('CONSUMED_ITEM_GRACE_DAYS', '7'))
+ARCHIVE_INTERVAL_MINUTES = int(os.environ.get('ARCHIVE_INTERVAL_MINUTES', '60'))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', '30'))
+# Raw food events are kept for a while; the daily rollups built from them are kept forever
+FOOD_EVENT_RETENTION_DAYS = int(os.environ.get('FOOD_EVENT_RETENTION_DAYS', '400'))
+NOTIFICATION_OUTBOX_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_OUTBOX_RETENTION_DAYS', '30'))
+
+# Fields kept on archived food items
+ARCHIVE_FIELDS = ["id", "name", "category", "quantity", "unit", "storage_condition",
+                  "purchase_date", "expiration_date", "created_at"]
+
+# Multi-worker coordination. Periodic jobs run only in the worker holding the
+# background-jobs lease; writes are broadcast over a capped collection so other
+# workers invalidate their ETag versions and learn new similarity cache entries.
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '1'))
+CACHE_INVALIDATION_ENABLED = os.environ.get('CACHE_INVALIDATION_ENABLED', str(WEB_CONCURRENCY > 1)).lower() in ('1', 'true', 'yes')
+CACHE_INVALIDATION_COLLECTION_BYTES = int(os.environ.get('CACHE_INVALIDATION_COLLECTION_BYTES', str(16 * 1024 * 1024)))
+BACKGROUND_LEASE_TTL_SECONDS = float(os.environ.get('BACKGROUND_LEASE_TTL_SECONDS', '30'))
+invalidation_channel = None
+background_lease = None
+
+# Tasks every worker runs, and the jobs running while this worker is leader
+background_tasks = []
+leader_tasks = []
+
+async def ensure_ttl_index(collection, field: str, retention_days: int):
+    """Create a TTL index on field, updating its expiry if the policy changed."""
+    expire_after = retention_days * 86400
+    try:
+        await collection.create_index(field, expireAfterSeconds=expire_after)
+    except OperationFailure:
+        # Index already exists with a different expireAfterSeconds
+        await db.command("collMod", collection.name,
+                         index={"keyPattern": {field: 1}, "expireAfterSeconds": expire_after})
+
+async def drop_ttl_index(collection, field: str):
+    """Drop the TTL index on field if there is one."""
+    for name, index in (await collection.index_information()).items():
+        if index.get("key") == [(field, 1)] and "expireAfterSeconds" in index:
+            await collection.drop_index(name)
+
+async def create_indexes():
+    """Create the indexes the query endpoints and retention policies rely on."""
+    await db.calendar_events.create_index("event_date")
+    await db.food_items.create_index("id")
+    await db.food_items.create_index("name_key")
+    await db.food_items.create_index([("quantity", 1), ("consumed_at", 1)])
+    await db.food_items.create_index([("expiration_date", 1), ("quantity", 1)])
+    await db.food_items_archive.create_index("archived_at")
+    # Formerly TTL indexes; see expire_old_reminders
+    await drop_ttl_index(db.notifications, "read_at")
+    await drop_ttl_index(db.calendar_events, "event_at")
+    await db.notifications.create_index("read_at")
+    await db.calendar_events.create_index("event_at")
+    for collection in (db.food_items, db.notifications, db.calendar_events, db.tombstones):
+        await collection.create_index("seq")
+    await ensure_ttl_index(db.tombstones, "deleted_at", SYNC_TOMBSTONE_RETENTION_DAYS)
+    await ensure_ttl_index(db.food_events, "at", FOOD_EVENT_RETENTION_DAYS)
+    await db.food_events.create_index([("item_id", 1), ("at", 1)])
+    await db.analytics_daily.create_index("day")
+    await db.notification_outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+    await db.notification_outbox.create_index("claim")
+    await ensure_ttl_index(db.notification_outbox, "finished_at", NOTIFICATION_OUTBOX_RETENTION_DAYS)
+    await ensure_ttl_index(db.ai_analysis_cache, "created_at", SEMANTIC_CACHE_RETENTION_DAYS)
+
+async def cancel_tasks(tasks: list):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    tasks.clear()
+
+async def leader_election_loop():
+    """Keep trying to hold the background-jobs lease; run the leader jobs only while holding it."""
+    while True:
+        try:
+            is_leader = await background_lease.acquire()
+        except Exception as e:
+            print(f"Lease renewal failed: {e}")
+            is_leader = False
+        if is_leader and not leader_tasks:
+            print(f"Worker {WORKER_ID} is running background jobs")
+            leader_tasks.append(asyncio.create_task(archival_loop()))
+        elif not is_leader and leader_tasks:
+            print(f"Worker {WORKER_ID} lost the background jobs lease")
+            await cancel_tasks(leader_tasks)
+        # Renew well before expiry so a slow round trip doesn't hand the lease over
+        await asyncio.sleep(BACKGROUND_LEASE_TTL_SECONDS / 3)
+
+async def apply_invalidation(event: dict):
+    """Apply a cache invalidation published by another worker."""
+    global etag_scope
+    if event["type"] == "collections_changed":
+        if "versions" in event:
+            apply_collection_versions(event["versions"])
+        else:
+            # From a worker that doesn't share versions yet: fall back to per-boot ETags
+            etag_scope = ETAG_BOOT_ID
+            for name in event["collections"]:
+                collection_versions[name] += 1
+    elif event["type"] == "analysis_cached":
+        analysis_cache.add(event["partition"], event["food_name"], event["analysis"],
+                           vector=np.frombuffer(event["vector"], dtype=np.float32))
+
+async def start_background_jobs():
+    """Start leader election for periodic jobs and the cross-worker cache invalidation listener."""
+    if CACHE_INVALIDATION_ENABLED:
+        await invalidation_channel.ensure_collection()
+        # Versions bumped before the listener's starting position are in the shared document
+        position = await invalidation_channel.position()
+        await load_collection_versions()
+        background_tasks.append(asyncio.create_task(invalidation_channel.listen(apply_invalidation, position=position)))
+    background_tasks.append(asyncio.create_task(leader_election_loop()))
+
+async def stop_background_jobs():
+    """Cancel background tasks and hand the lease to another worker."""
+    await cancel_tasks(background_tasks)
+    if leader_tasks:
+        await cancel_tasks(leader_tasks)
+        try:
+            await background_lease.release()
+        except Exception as e:
+            print(f"Failed to release background jobs lease: {e}")
+
+# AI model routing: each task goes to a fast or large model tier with fallback
+model_router = ModelRouter.from_env()
+
+# Reuse shelf-life analyses for food names similar to ones already analysed
+# ("organic bananas" -> "banana") instead of calling the model again. Entries
+# are persisted with their vectors so the index is warm after a restart, and
+# expire from the collection after SEMANTIC_CACHE_RETENTION_DAYS.
+SEMANTIC_CACHE_ENABLED = os.environ.get('SEMANTIC_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', '0.9'))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get('SEMANTIC_CACHE_MAX_ENTRIES', '20000'))
+SEMANTIC_CACHE_RETENTION_DAYS = int(os.environ.get('SEMANTIC_CACHE_RETENTION_DAYS', '90'))
+analysis_cache = SemanticCache(SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES)
+
+async def load_analysis_cache():
+    """Warm the similarity cache from persisted analyses."""
+    if SEMANTIC_CACHE_ENABLED:
+        documents = await db.ai_analysis_cache.find({}, {"_id": 0}).sort("created_at", -1).to_list(SEMANTIC_CACHE_MAX_ENTRIES)
+        analysis_cache.load(documents)
+
+# Answer common ai-update instructions with the local rule-based parser and
+# only call the LLM when it can't parse the instruction with confidence
+LOCAL_INSTRUCTION_PARSER = os.environ.get('LOCAL_INSTRUCTION_PARSER', 'true').lower() in ('1', 'true', 'yes')
 
 # Pydantic Models
 class FoodItemCreate(BaseModel):
@@ -59,6 +343,11 @@ class FoodItem(BaseModel):
     emoji: Optional[str] = None
     storage_tips: Optional[str] = None
     created_at: str = Field(default_factory=lambda: datetime.utcnow().isoformat())
+    version: int = 0
+    # Quantity in g/ml/each and in grams, maintained by the server (see units.py)
+    base_quantity: Optional[float] = None
+    base_unit: Optional[str] = None
+    base_grams: Optional[float] = None
     
     class Config:
         json_schema_extra = {
@@ -91,51 +380,211 @@ class CalendarEvent(BaseModel):
     color: str
     created_at: str = Field(default_factory=lambda: datetime.utcnow().isoformat())
 
+# Fast JSON path: when enabled, list/detail endpoints serialize the projected
+# Mongo documents with orjson directly instead of re-validating every document
+# against its response_model. The documents are written by this server only.
+FAST_JSON_RESPONSES = os.environ.get('FAST_JSON_RESPONSES', 'false').lower() in ('1', 'true', 'yes')
+
+def model_projection(model) -> dict:
+    """Mongo projection returning exactly the fields of a response model, without _id."""
+    projection = {field: 1 for field in model.model_fields}
+    projection['_id'] = 0
+    return projection
+
+FOOD_ITEM_PROJECTION = model_projection(FoodItem)
+NOTIFICATION_PROJECTION = model_projection(NotificationItem)
+CALENDAR_EVENT_PROJECTION = model_projection(CalendarEvent)
+
+def db_response(content, response: Optional[Response] = None):
+    """Return trusted, projected DB documents, bypassing response_model validation on the fast path."""
+    if FAST_JSON_RESPONSES:
+        headers = dict(response.headers) if response is not None else None
+        return ORJSONResponse(content, headers=headers)
+    return content
+
+# HTTP caching: every write handler bumps the version of the collections it
+# touched, and read endpoints derive an ETag from those versions so conditional
+# GETs are answered with 304 without querying Mongo. The ETags are weak: the
+# compression middleware sends brotli, gzip and identity bodies under the same
+# tag, which only a weak validator allows.
+# With a single worker the versions are in-process counters, scoped to this
+# boot. With the invalidation channel on they are shared counters in Mongo
+# (db.counters "collection_versions"), carried by the invalidation events, so
+# every worker builds the same ETag for the same data.
+# Results that depend on the wall clock (expiry filters) also roll over every
+# ETAG_TIME_BUCKET_SECONDS.
+ETAG_TIME_BUCKET_SECONDS = int(os.environ.get('ETAG_TIME_BUCKET_SECONDS', '300'))
+ETAG_BOOT_ID = uuid.uuid4().hex
+SHARED_VERSIONS_ID = "collection_versions"
+collection_versions = {"food_items": 0, "notifications": 0, "calendar_events": 0}
+# Per-boot until the shared versions are loaded (see load_collection_versions)
+etag_scope = ETAG_BOOT_ID
+
+def apply_collection_versions(versions: Dict[str, int]):
+    for name, version in versions.items():
+        if name in collection_versions:
+            collection_versions[name] = max(collection_versions[name], version)
+
+async def load_collection_versions():
+    """Start from the shared versions and tag ETags with them from now on."""
+    global etag_scope
+    apply_collection_versions(await db.counters.find_one({"_id": SHARED_VERSIONS_ID}, {"_id": 0}) or {})
+    etag_scope = SHARED_VERSIONS_ID
+
+async def bump_versions(*collections: str):
+    """Invalidate cached representations built from the given collections, in every worker."""
+    if not CACHE_INVALIDATION_ENABLED:
+        for name in collections:
+            collection_versions[name] += 1
+        return
+    shared = await db.counters.find_one_and_update(
+        {"_id": SHARED_VERSIONS_ID}, {"$inc": {name: 1 for name in collections}},
+        upsert=True, return_document=ReturnDocument.AFTER
+    )
+    versions = {name: shared[name] for name in collections}
+    apply_collection_versions(versions)
+    await invalidation_channel.publish("collections_changed", collections=list(collections), versions=versions)
+
+def etag_precondition(request: Request, response: Response, collections: List[str], time_dependent: bool = False) -> Optional[Response]:
+    """Set a weak ETag on the response and return a 304 if the client already has it."""
+    key_parts = [etag_scope, request.url.path, str(sorted(request.query_params.multi_items()))]
+    key_parts += [f"{name}:{collection_versions[name]}" for name in collections]
+    if time_dependent:
+        key_parts.append(str(int(datetime.utcnow().timestamp()) // ETAG_TIME_BUCKET_SECONDS))
+    etag = 'W/"' + hashlib.sha1("|".join(key_parts).encode()).hexdigest() + '"'
+    return not_modified_response(request, response, etag)
+
+def not_modified_response(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Set etag on the response and return a 304 if If-None-Match matches it (weak comparison)."""
+    response.headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag.removeprefix("W/") in candidates or "*" in candidates:
+            return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+# Differential sync: every write stamps the document with the next value of a
+# global monotonic sequence, and deletes leave a tombstone carrying one, so
+# clients can ask for everything that changed after the last sequence they saw.
+# Writes hold their sequence reservation until the write is done, and /api/sync
+# never moves the cursor past a reservation still in flight (see SequenceCounter).
+# Reservations older than SYNC_RESERVATION_TIMEOUT_SECONDS are treated as abandoned.
+SYNC_COLLECTIONS = ["food_items", "notifications", "calendar_events"]
+SYNC_RESERVATION_TIMEOUT_SECONDS = float(os.environ.get('SYNC_RESERVATION_TIMEOUT_SECONDS', '60'))
+sync_sequence = None
+
+@asynccontextmanager
+async def stamp_sync_fields(*documents: dict):
+    """Set seq/updated_at on documents inserted inside the block."""
+    if not documents:
+        yield
+        return
+    async with sync_sequence.reserve(len(documents)) as first_seq:
+        updated_at = datetime.utcnow().isoformat()
+        for offset, document in enumerate(documents):
+            document['seq'] = first_seq + offset
+            document['updated_at'] = updated_at
+        yield
+
+async def delete_with_tombstones(collection_name: str, query: dict, projection: Optional[dict] = None) -> List[dict]:
+    """Delete matching documents and record tombstones for differential sync; returns the deleted documents.
+    
+    A document that stops matching the query before the delete (e.g. an item
+    restocked in the meantime) is left alone. projection must include id.
+    """
+    collection = db[collection_name]
+    docs = await collection.find(query, projection or {"_id": 0, "id": 1}).to_list(length=None)
+    ids = [doc['id'] for doc in docs]
+    if not ids:
+        return []
+    
+    async with sync_sequence.reserve(len(ids)) as first_seq:
+        result = await collection.delete_many({"$and": [query, {"id": {"$in": ids}}]})
+        if result.deleted_count < len(ids):
+            remaining = {doc['id'] async for doc in collection.find({"id": {"$in": ids}}, {"_id": 0, "id": 1})}
+            docs = [doc for doc in docs if doc['id'] not in remaining]
+        if docs:
+            deleted_at = datetime.utcnow()
+            await db.tombstones.insert_many([
+                {"collection": collection_name, "id": doc['id'], "seq": first_seq + offset, "deleted_at": deleted_at}
+                for offset, doc in enumerate(docs)
+            ])
+    return docs
+
+def extract_json(content: str):
+    """Parse a JSON reply, stripping markdown code fences if present."""
+    content = content.strip()
+    if '```json' in content:
+        content = content.split('```json')[1].split('```')[0].strip()
+    elif '```' in content:
+        content = content.split('```')[1].split('```')[0].strip()
+    return json.loads(content)
+
+async def complete_json(task: str, system_prompt: str, prompt: str, temperature: float, max_tokens: Optional[int] = None):
+    """Run a chat completion on the task's model route, record its token usage and parse the JSON reply."""
+    response = await model_router.complete(
+        task,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=temperature,
+        max_tokens=max_tokens or prompts.token_budget(task)
+    )
+    
+    content = response.choices[0].message.content or ""
+    usage = getattr(response, "usage", None)
+    truncated = getattr(response.choices[0], "finish_reason", None) == "length"
+    if usage is not None:
+        prompts.token_usage.record(task, usage.prompt_tokens, usage.completion_tokens, truncated)
+    else:
+        prompts.token_usage.record(task, prompts.estimate_tokens(system_prompt + prompt), prompts.estimate_tokens(content), truncated)
+    
+    return extract_json(content)
+
+# In-flight AI calls are cancelled when the HTTP client goes away
+AI_DISCONNECT_POLL_SECONDS = float(os.environ.get('AI_DISCONNECT_POLL_SECONDS', '0.5'))
+
+async def run_until_disconnect(http_request: Request, task: str, awaitable):
+    """Await an AI-backed coroutine, cancelling it if the HTTP client disconnects first."""
+    work = asyncio.ensure_future(awaitable)
+    
+    async def wait_for_disconnect():
+        while not await http_request.is_disconnected():
+            await asyncio.sleep(AI_DISCONNECT_POLL_SECONDS)
+    
+    watcher = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+    
+    if not work.done():
+        work.cancel()
+        await asyncio.gather(work, return_exceptions=True)
+        prompts.token_usage.record_cancellation(task)
+        print(f"Cancelled {task} AI call: client disconnected")
+        raise HTTPException(status_code=499, detail="Client closed request")
+    return work.result()
+
 # Helper function to use DeepSeek AI
-# START: Modified function signature to accept storage_condition
 async def analyze_food_with_ai(food_name: str, category: Optional[str] = None, storage_condition: Optional[str] = "pantry"):
     """Use DeepSeek to analyze food item and suggest category, shelf life, and emoji."""
+    # Shelf life depends on storage, so only names under the same storage condition are matched.
+    # The category hint is not part of the key: a user-chosen category overrides the analysis anyway.
+    partition = storage_condition or "pantry"
+    if SEMANTIC_CACHE_ENABLED:
+        cached = analysis_cache.lookup(partition, food_name)
+        if cached:
+            return dict(cached[0])
     try:
-        # START: Updated prompt to use the storage_condition for shelf_life calculation
-        prompt = f"""Analyze this food item based on its intended storage condition and provide structured information:
-Food: {food_name}
-Intended Storage: {storage_condition}
-{f"Suggested Category: {category}" if category else ""}
-
-Return a JSON object with:
-{{
-    "category": "produce|dairy|meat|packaged|frozen|other",
-    "shelf_life_days": <number of days, **specifically for the given 'Intended Storage'**>,
-    "storage_recommendation": "pantry|refrigerated|frozen|room_temp",
-    "emoji": "<single most appropriate emoji for this food>",
-    "tips": "brief storage tip"
-}}
-
-Example: If Food is "Chicken Breast" and Intended Storage is "frozen", shelf_life_days should be 90-365. If Intended Storage is "refrigerated", it should be 1-2.
-
-Be concise and accurate. The 'shelf_life_days' MUST match the 'Intended Storage' provided."""
-        # END: Updated prompt
-
-        response = await deepseek_client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "You are a food safety and storage expert. Provide accurate, concise information in JSON format only."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=500
-        )
-        
-        content = response.choices[0].message.content.strip()
-        
-        # Try to extract JSON from the response
-        if '```json' in content:
-            content = content.split('```json')[1].split('```')[0].strip()
-        elif '```' in content:
-            content = content.split('```')[1].split('```')[0].strip()
-            
-        result = json.loads(content)
-        return result
+        # Shelf life is requested specifically for the intended storage condition
+        prompt = prompts.shelf_life_prompt(food_name, category, storage_condition)
+        analysis = await complete_json(prompts.SHELF_LIFE, prompts.SHELF_LIFE_SYSTEM, prompt, temperature=0.3)
+        if SEMANTIC_CACHE_ENABLED:
+            await remember_analysis(partition, food_name, analysis)
+        return analysis
         
     except Exception as e:
         print(f"AI analysis failed: {e}")
@@ -147,7 +596,24 @@ Be concise and accurate. The 'shelf_life_days' MUST match the 'Intended Storage'
             "emoji": "🍽️",
             "tips": "Store in a cool, dry place"
         }
-# END: Modified function
+
+async def remember_analysis(partition: str, food_name: str, analysis: dict):
+    """Add an analysis to the similarity cache and persist it with its vector."""
+    vector = analysis_cache.add(partition, food_name, analysis)
+    vector_bytes = Binary(vector.astype("float32").tobytes())
+    try:
+        await db.ai_analysis_cache.insert_one({
+            "partition": partition,
+            "text": normalize_food_name(food_name),
+            "vector": vector_bytes,
+            "analysis": analysis,
+            "created_at": datetime.utcnow()
+        })
+        if CACHE_INVALIDATION_ENABLED:
+            await invalidation_channel.publish("analysis_cached", partition=partition, food_name=food_name,
+                                               analysis=analysis, vector=vector_bytes)
+    except Exception as e:
+        print(f"Failed to persist analysis cache entry: {e}")
 
 def calculate_expiration_date(purchase_date: str, shelf_life_days: int) -> str:
     """Calculate expiration date based on purchase date and shelf life."""
@@ -155,16 +621,100 @@ def calculate_expiration_date(purchase_date: str, shelf_life_days: int) -> str:
     expiration_dt = purchase_dt + timedelta(days=shelf_life_days)
     return expiration_dt.isoformat()
 
-async def create_calendar_events(food_item: dict):
-    """Create calendar events for food expiration reminders."""
+# Delivery of notifications by email and webhook through the notification_outbox
+# collection (see notification_outbox.py). Off unless a channel is configured.
+# For local testing, notification_sink_server.py runs an SMTP debugging server
+# and an HTTP sink.
+NOTIFICATION_EMAIL_TO = [address.strip() for address in os.environ.get('NOTIFICATION_EMAIL_TO', '').split(',') if address.strip()]
+NOTIFICATION_WEBHOOK_URLS = [url.strip() for url in os.environ.get('NOTIFICATION_WEBHOOK_URLS', '').split(',') if url.strip()]
+SMTP_HOST = os.environ.get('SMTP_HOST', 'localhost')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', '25'))
+SMTP_FROM = os.environ.get('SMTP_FROM', 'food-guard@localhost')
+SMTP_USERNAME = os.environ.get('SMTP_USERNAME')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', 'false').lower() in ('1', 'true', 'yes')
+NOTIFICATION_DELIVERY_WORKERS = int(os.environ.get('NOTIFICATION_DELIVERY_WORKERS', '2'))
+NOTIFICATION_DELIVERY_BATCH_SIZE = int(os.environ.get('NOTIFICATION_DELIVERY_BATCH_SIZE', '50'))
+NOTIFICATION_DELIVERY_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_DELIVERY_MAX_ATTEMPTS', '8'))
+NOTIFICATION_RETRY_BASE_SECONDS = float(os.environ.get('NOTIFICATION_RETRY_BASE_SECONDS', '30'))
+NOTIFICATION_RETRY_MAX_SECONDS = float(os.environ.get('NOTIFICATION_RETRY_MAX_SECONDS', '3600'))
+NOTIFICATION_OUTBOX_POLL_SECONDS = float(os.environ.get('NOTIFICATION_OUTBOX_POLL_SECONDS', '5'))
+NOTIFICATION_DELIVERY_CLAIM_SECONDS = float(os.environ.get('NOTIFICATION_DELIVERY_CLAIM_SECONDS', '120'))
+outbox_workers = None
+mongo_supports_transactions = False
+
+def notification_targets() -> Dict[str, List[str]]:
+    targets = {}
+    if NOTIFICATION_EMAIL_TO:
+        targets[notification_outbox.EMAIL] = NOTIFICATION_EMAIL_TO
+    if NOTIFICATION_WEBHOOK_URLS:
+        targets[notification_outbox.WEBHOOK] = NOTIFICATION_WEBHOOK_URLS
+    return targets
+
+def create_outbox_workers():
+    """Delivery worker pool for the configured channels, or None if there are none."""
+    senders = {}
+    if NOTIFICATION_EMAIL_TO:
+        senders[notification_outbox.EMAIL] = notification_outbox.SmtpSender(
+            SMTP_HOST, SMTP_PORT, SMTP_FROM, SMTP_USERNAME, SMTP_PASSWORD, SMTP_STARTTLS
+        )
+    if NOTIFICATION_WEBHOOK_URLS:
+        senders[notification_outbox.WEBHOOK] = notification_outbox.WebhookSender()
+    if not senders:
+        return None
+    return notification_outbox.OutboxWorkerPool(
+        db.notification_outbox, senders,
+        workers=NOTIFICATION_DELIVERY_WORKERS,
+        batch_size=NOTIFICATION_DELIVERY_BATCH_SIZE,
+        max_attempts=NOTIFICATION_DELIVERY_MAX_ATTEMPTS,
+        retry_base_seconds=NOTIFICATION_RETRY_BASE_SECONDS,
+        retry_max_seconds=NOTIFICATION_RETRY_MAX_SECONDS,
+        poll_seconds=NOTIFICATION_OUTBOX_POLL_SECONDS,
+        claim_seconds=NOTIFICATION_DELIVERY_CLAIM_SECONDS
+    )
+
+async def detect_transaction_support():
+    """Multi-document transactions need a replica set or a sharded cluster."""
+    global mongo_supports_transactions
+    try:
+        hello = await client.admin.command("hello")
+    except Exception:
+        mongo_supports_transactions = False
+        return
+    mongo_supports_transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+
+async def insert_notifications(notifications: List[dict]):
+    """Insert notifications together with their outbox entries; delivery itself happens in the background.
+    
+    Both inserts share a transaction where Mongo supports them. Otherwise the outbox
+    goes first, so a crash in between can deliver a notification that isn't listed
+    but never loses a delivery.
+    """
+    outbox = notification_outbox.outbox_entries(notifications, notification_targets())
+    if not outbox:
+        await db.notifications.insert_many(notifications)
+        return
+    if mongo_supports_transactions:
+        async with await client.start_session() as session:
+            async with session.start_transaction():
+                await db.notification_outbox.insert_many(outbox, session=session)
+                await db.notifications.insert_many(notifications, session=session)
+    else:
+        await db.notification_outbox.insert_many(outbox)
+        await db.notifications.insert_many(notifications)
+    if outbox_workers is not None:
+        outbox_workers.wake()
+
+def build_reminders(food_item: dict, current_time: datetime):
+    """Calendar event and notification documents for a food item's expiration reminders."""
     try:
         expiration_date = datetime.fromisoformat(food_item['expiration_date'])
     except (ValueError, TypeError):
         print(f"Invalid expiration date for item {food_item.get('id')}. Skipping calendar events.")
-        return # Skip event creation if date is invalid
+        return [], [] # Skip event creation if date is invalid
         
     events = []
-    current_time = datetime.utcnow()
+    notifications = []
     
     # Event configurations: (days_before, type, color, priority)
     event_configs = [
@@ -187,7 +737,9 @@ async def create_calendar_events(food_item: dict):
                 description=f"{food_item['name']} expires on {expiration_date.strftime('%Y-%m-%d')}",
                 color=color
             )
-            events.append(event.model_dump())
+            event_dict = event.model_dump()
+            event_dict['event_at'] = event_date # BSON date for the retention job
+            events.append(event_dict)
             
             # Only create notification if it's the actual day (within 24 hours of event_date)
             # Check if today is the day when notification should be sent
@@ -203,22 +755,230 @@ async def create_calendar_events(food_item: dict):
                     message=f"{food_item['name']} {'expires today' if days_before == 0 else f'expires in {days_before} day(s)'}!",
                     priority=priority
                 )
-                await db.notifications.insert_one(notification.model_dump())
+                notifications.append(notification.model_dump())
+    
+    return events, notifications
+
+async def insert_reminders(events: List[dict], notifications: List[dict]):
+    """Store reminder documents built by build_reminders."""
+    if notifications:
+        async with stamp_sync_fields(*notifications):
+            await insert_notifications(notifications)
+        await bump_versions("notifications")
+    if events:
+        async with stamp_sync_fields(*events):
+            await db.calendar_events.insert_many(events)
+        await bump_versions("calendar_events")
+
+async def create_calendar_events(food_item: dict):
+    """Create calendar events for food expiration reminders."""
+    await insert_reminders(*build_reminders(food_item, datetime.utcnow()))
+
+def compact_archive_record(item: dict, reason: str) -> dict:
+    """Reduce a food item document to the fields retained for analytics."""
+    record = {field: item.get(field) for field in ARCHIVE_FIELDS}
+    record['archive_reason'] = reason
+    record['archived_at'] = datetime.utcnow()
+    return record
+
+async def archive_consumed_items() -> int:
+    """Move items that have been at zero quantity past the grace period into the archive."""
+    cutoff = (datetime.utcnow() - timedelta(days=CONSUMED_ITEM_GRACE_DAYS)).isoformat()
+    # Only items still consumed at the delete are removed, and only those are archived
+    items = await delete_with_tombstones("food_items", {"quantity": {"$lte": 0}, "consumed_at": {"$lte": cutoff}}, {"_id": 0})
+    if not items:
+        return 0
+    
+    await db.food_items_archive.insert_many([compact_archive_record(item, "consumed") for item in items])
+    item_ids = [item['id'] for item in items]
+    await delete_with_tombstones("calendar_events", {"food_item_id": {"$in": item_ids}})
+    await delete_with_tombstones("notifications", {"food_item_id": {"$in": item_ids}})
+    await bump_versions("food_items", "calendar_events", "notifications")
+    return len(item_ids)
+
+async def record_food_events(events: List[dict]):
+    """Store food events and add them to the daily analytics rollups."""
+    events = [event for event in events if event["quantity"] > 0 or event["type"] != analytics.CONSUMED]
+    if not events:
+        return
+    try:
+        await db.food_events.insert_many(events)
+        await db.analytics_daily.bulk_write([analytics.rollup_update(event) for event in events], ordered=False)
+    except Exception as e:
+        # Analytics must never fail the write that produced them
+        print(f"Failed to record food events: {e}")
+
+def consumption_events(before: dict, after: dict) -> List[dict]:
+    """A consumed event for the quantity an update took away, if any."""
+    try:
+        consumed = float(before.get("quantity") or 0) - max(float(after.get("quantity") or 0), 0)
+    except (TypeError, ValueError):
+        return []
+    return [analytics.food_event(analytics.CONSUMED, after, consumed)] if consumed > 0 else []
+
+async def record_expired_items() -> int:
+    """Record an expired event (the food wasted) once for each expired item that still has some left."""
+    query = {
+        "expiration_date": {"$lt": datetime.utcnow().isoformat()},
+        "quantity": {"$gt": 0},
+        "expired_recorded_at": {"$exists": False}
+    }
+    items = await db.food_items.find(query, {"_id": 0}).to_list(length=None)
+    if not items:
+        return 0
+    recorded_at = datetime.utcnow().isoformat()
+    await db.food_items.bulk_write([
+        UpdateOne({"id": item['id']}, {"$set": {"expired_recorded_at": recorded_at, "expired_recorded_quantity": item['quantity']}})
+        for item in items
+    ], ordered=False)
+    await record_food_events([analytics.food_event(analytics.EXPIRED, item, item['quantity']) for item in items])
+    return len(items)
+
+async def reopen_expired_items(changes: List[tuple]) -> List[dict]:
+    """Forget the expired record of items whose expiration date changed since; returns correction events.
     
+    changes are (before, after) item pairs. The waste that was recorded is taken back
+    with a negative expired event dated when it was recorded, so an item whose expiry
+    is extended and then eaten only counts as consumed, and one that expires again is
+    recorded again with what is left then. Records from before the quantity was kept
+    are cleared without a correction.
+    """
+    reopened = [(before, after) for before, after in changes
+                if before.get('expired_recorded_at') and after.get('expiration_date') != before.get('expiration_date')]
+    if not reopened:
+        return []
+    await db.food_items.update_many({"id": {"$in": [after['id'] for _, after in reopened]}},
+                                    {"$unset": {"expired_recorded_at": "", "expired_recorded_quantity": ""}})
+    events = []
+    for before, after in reopened:
+        after.pop('expired_recorded_at', None)
+        after.pop('expired_recorded_quantity', None)
+        if before.get('expired_recorded_quantity'):
+            try:
+                recorded_at = datetime.fromisoformat(before['expired_recorded_at'])
+            except (ValueError, TypeError):
+                recorded_at = None
+            events.append(analytics.food_event(analytics.EXPIRED, before, -before['expired_recorded_quantity'], at=recorded_at))
+    return events
+
+async def expire_old_reminders() -> int:
+    """Delete read notifications and calendar events past their retention period."""
+    now = datetime.utcnow()
+    notifications = len(await delete_with_tombstones(
+        "notifications", {"read_at": {"$lt": now - timedelta(days=NOTIFICATION_RETENTION_DAYS)}}))
+    events = len(await delete_with_tombstones(
+        "calendar_events", {"event_at": {"$lt": now - timedelta(days=CALENDAR_EVENT_RETENTION_DAYS)}}))
+    if notifications:
+        await bump_versions("notifications")
     if events:
-        await db.calendar_events.insert_many(events)
+        await bump_versions("calendar_events")
+    return notifications + events
+
+async def backfill_retention_fields(batch_size: int = 1000) -> int:
+    """Add the dates retention relies on to documents stored before they were recorded.
+
+    Read notifications and consumed items get the current time, so their retention
+    period starts now; calendar events get event_at from their event_date.
+    """
+    now = datetime.utcnow()
+    result = await db.notifications.update_many({"is_read": True, "read_at": {"$exists": False}}, {"$set": {"read_at": now}})
+    total = result.modified_count
+    result = await db.food_items.update_many({"quantity": {"$lte": 0}, "consumed_at": {"$exists": False}},
+                                             {"$set": {"consumed_at": now.isoformat()}})
+    total += result.modified_count
+    while True:
+        events = await db.calendar_events.find({"event_at": {"$exists": False}}, {"_id": 1, "event_date": 1}).limit(batch_size).to_list(length=None)
+        if not events:
+            return total
+        operations = []
+        for event in events:
+            try:
+                event_at = datetime.fromisoformat(event.get('event_date') or '')
+            except (ValueError, TypeError):
+                event_at = now # Malformed dates still expire eventually
+            operations.append(UpdateOne({"_id": event["_id"]}, {"$set": {"event_at": event_at}}))
+        await db.calendar_events.bulk_write(operations, ordered=False)
+        total += len(operations)
+
+async def backfill_sync_fields(batch_size: int = 1000) -> int:
+    """Stamp seq/updated_at on documents stored before differential sync, so since=0 returns them."""
+    total = 0
+    for name in SYNC_COLLECTIONS:
+        collection = db[name]
+        while True:
+            docs = await collection.find({"seq": {"$exists": False}}, {"_id": 1}).limit(batch_size).to_list(length=None)
+            if not docs:
+                break
+            async with sync_sequence.reserve(len(docs)) as first_seq:
+                updated_at = datetime.utcnow().isoformat()
+                # A document written in the meantime already carries its own seq
+                await collection.bulk_write([
+                    UpdateOne({"_id": doc["_id"], "seq": {"$exists": False}},
+                              {"$set": {"seq": first_seq + offset, "updated_at": updated_at}})
+                    for offset, doc in enumerate(docs)
+                ], ordered=False)
+            total += len(docs)
+    return total
+
+async def archival_loop():
+    """Periodically archive fully consumed food items, expire old reminders, record newly expired items and backfill derived, retention and sync fields."""
+    while True:
+        try:
+            archived = await archive_consumed_items()
+            if archived:
+                print(f"Archived {archived} consumed food item(s).")
+        except Exception as e:
+            print(f"Archival job failed: {e}")
+        try:
+            expired = await expire_old_reminders()
+            if expired:
+                print(f"Removed {expired} old notification(s) and calendar event(s).")
+        except Exception as e:
+            print(f"Reminder retention job failed: {e}")
+        try:
+            await record_expired_items()
+        except Exception as e:
+            print(f"Expired item recording failed: {e}")
+        try:
+            backfilled = await backfill_derived_fields()
+            if backfilled:
+                print(f"Added derived fields to {backfilled} food item(s).")
+        except Exception as e:
+            print(f"Derived field backfill failed: {e}")
+        try:
+            backfilled = await backfill_retention_fields()
+            if backfilled:
+                print(f"Added retention dates to {backfilled} document(s).")
+        except Exception as e:
+            print(f"Retention field backfill failed: {e}")
+        try:
+            backfilled = await backfill_sync_fields()
+            if backfilled:
+                print(f"Added sync sequence numbers to {backfilled} document(s).")
+        except Exception as e:
+            print(f"Sync field backfill failed: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL_MINUTES * 60)
 
 # API Endpoints
 @app.get("/")
 async def root():
     return {"message": "Home Food Management System API", "status": "running"}
 
+@app.get("/readyz")
+async def readyz():
+    """Readiness probe: 200 once connection pools are warm, 503 while warming up."""
+    ready = readiness["warm"]
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, **readiness})
+
 @app.post("/api/food-items", response_model=FoodItem)
-async def create_food_item(item: FoodItemCreate):
+async def create_food_item(item: FoodItemCreate, http_request: Request):
     """Create a new food item with AI-powered analysis."""
     try:
         # START: Pass storage_condition to the AI
-        ai_analysis = await analyze_food_with_ai(item.name, item.category, item.storage_condition)
+        ai_analysis = await run_until_disconnect(
+            http_request, prompts.SHELF_LIFE,
+            analyze_food_with_ai(item.name, item.category, item.storage_condition)
+        )
         # END: Pass storage_condition
         
         # Use AI suggestions if not provided
@@ -254,23 +1014,170 @@ async def create_food_item(item: FoodItemCreate):
             expiration_date=expiration_date,
             notes=item.notes,
             emoji=emoji,
-            storage_tips=storage_tips
+            storage_tips=storage_tips,
+            **units.base_fields(item.quantity, item.unit, item.name)
         )
         
         # Save to database
         food_dict = food_item.model_dump()
-        await db.food_items.insert_one(food_dict)
+        food_dict['name_key'] = normalize_food_name(item.name)
+        async with stamp_sync_fields(food_dict):
+            await db.food_items.insert_one(food_dict)
+        await bump_versions("food_items")
         
         # Create calendar events and notifications
         await create_calendar_events(food_dict)
         
         return food_item
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create food item: {str(e)}")
 
+class BarcodeItemCreate(BaseModel):
+    barcode: str
+    quantity: float = 1.0
+    unit: str = "each"
+    storage_condition: str = "pantry"
+    purchase_date: Optional[str] = None
+    notes: Optional[str] = None
+
+def lookup_barcode(barcode: str) -> dict:
+    if barcode_index is None:
+        raise HTTPException(status_code=503, detail="Barcode database is not installed")
+    product = barcode_index.lookup(barcode)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Unknown barcode")
+    return product
+
+@app.get("/api/barcodes/{barcode}")
+async def get_barcode_product(barcode: str):
+    """Look up a product by barcode in the offline product database."""
+    return lookup_barcode(barcode)
+
+@app.post("/api/food-items/barcode", response_model=FoodItem)
+async def create_food_item_from_barcode(item: BarcodeItemCreate, http_request: Request):
+    """Create a food item from a scanned barcode, with name, category and emoji from the offline product database."""
+    product = lookup_barcode(item.barcode)
+    return await create_food_item(FoodItemCreate(
+        name=product["name"],
+        category=product["category"],
+        emoji=product["emoji"],
+        **item.model_dump(exclude={"barcode"})
+    ), http_request)
+
+# Streaming backup / migration of the inventory. Exports read the cursor in
+# EXPORT_BATCH_SIZE batches; imports write IMPORT_BATCH_SIZE items per insert_many.
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '500'))
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '1000'))
+IMPORT_MAX_LINE_BYTES = int(os.environ.get('IMPORT_MAX_LINE_BYTES', str(64 * 1024)))
+IMPORT_MAX_ERRORS = 100
+EXPORT_FIELDS = list(FoodItem.model_fields)
+
+def export_food_items(format: str) -> StreamingResponse:
+    async def generate():
+        if format == inventory_transfer.CSV:
+            yield inventory_transfer.csv_chunk([], EXPORT_FIELDS, header=True)
+        cursor = db.food_items.find({}, FOOD_ITEM_PROJECTION).sort("seq", 1).batch_size(EXPORT_BATCH_SIZE)
+        batch = []
+        async for item in cursor:
+            batch.append(item)
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                yield format_export_chunk(batch, format)
+                batch = []
+        if batch:
+            yield format_export_chunk(batch, format)
+
+    return StreamingResponse(
+        generate(),
+        media_type=f"{inventory_transfer.MEDIA_TYPES[format]}; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="food-guard-inventory.{format}"'}
+    )
+
+def format_export_chunk(items: List[dict], format: str) -> str:
+    if format == inventory_transfer.CSV:
+        return inventory_transfer.csv_chunk(items, EXPORT_FIELDS)
+    return inventory_transfer.ndjson_chunk(items)
+
+@app.get("/api/food-items/export.ndjson")
+async def export_food_items_ndjson():
+    """Stream the whole inventory as NDJSON, one food item per line."""
+    return export_food_items(inventory_transfer.NDJSON)
+
+@app.get("/api/food-items/export.csv")
+async def export_food_items_csv():
+    """Stream the whole inventory as CSV."""
+    return export_food_items(inventory_transfer.CSV)
+
+async def insert_imported_items(items: List[dict]) -> int:
+    """Insert a batch of validated imported items, skipping ids already in the inventory; returns how many were inserted."""
+    ids = [item['id'] for item in items]
+    existing = {doc['id'] async for doc in db.food_items.find({"id": {"$in": ids}}, {"_id": 0, "id": 1})}
+    seen = set()
+    new_items = []
+    for item in items:
+        if item['id'] not in existing and item['id'] not in seen:
+            seen.add(item['id'])
+            new_items.append(item)
+    if not new_items:
+        return 0
+    
+    async with stamp_sync_fields(*new_items):
+        await db.food_items.insert_many(new_items, ordered=False)
+    await bump_versions("food_items")
+    
+    current_time = datetime.utcnow()
+    events, notifications = [], []
+    for item in new_items:
+        item_events, item_notifications = build_reminders(item, current_time)
+        events += item_events
+        notifications += item_notifications
+    await insert_reminders(events, notifications)
+    return len(new_items)
+
+@app.post("/api/food-items/import")
+async def import_food_items(request: Request, format: Optional[str] = Query(None)):
+    """Import food items from an NDJSON or CSV body (as produced by the export endpoints).
+    
+    The format defaults from the Content-Type (text/csv, otherwise NDJSON). Items keep
+    their id, and ids already in the inventory are skipped, so re-running an import is
+    safe. Invalid lines are skipped and reported with their line number.
+    """
+    if format is None:
+        format = inventory_transfer.CSV if "csv" in request.headers.get("content-type", "") else inventory_transfer.NDJSON
+    if format not in inventory_transfer.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(inventory_transfer.FORMATS)}")
+    
+    result = {"imported": 0, "skipped": 0, "errors": []}
+    batch = []
+    lines = inventory_transfer.read_lines(request.stream(), IMPORT_MAX_LINE_BYTES)
+    async for line_number, record in inventory_transfer.parse_records(lines, format):
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            item = FoodItem(**record).model_dump()
+        except ValueError as e:
+            result["skipped"] += 1
+            if len(result["errors"]) < IMPORT_MAX_ERRORS:
+                result["errors"].append({"line": line_number, "error": str(e)})
+            continue
+        item['version'] = 0
+        item.update(item_derived_fields(item))
+        batch.append(item)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            imported = await insert_imported_items(batch)
+            result["imported"] += imported
+            result["skipped"] += len(batch) - imported
+            batch = []
+    if batch:
+        imported = await insert_imported_items(batch)
+        result["imported"] += imported
+        result["skipped"] += len(batch) - imported
+    return result
+
 @app.get("/api/food-items", response_model=List[FoodItem])
-async def get_food_items(filter: Optional[str] = None):
+async def get_food_items(request: Request, response: Response, filter: Optional[str] = None):
     """Get all food items with optional filtering by expiration status.
     
     Filter options:
@@ -279,7 +1186,11 @@ async def get_food_items(filter: Optional[str] = None):
     - fresh: Items expiring in more than 7 days
     - all or None: All items
     """
-    items = await db.food_items.find().to_list(length=None)
+    not_modified = etag_precondition(request, response, ["food_items"], time_dependent=bool(filter and filter != "all"))
+    if not_modified:
+        return not_modified
+    
+    items = await db.food_items.find({}, FOOD_ITEM_PROJECTION).to_list(length=None)
     
     # Apply filtering if requested
     if filter and filter != "all":
@@ -302,22 +1213,57 @@ async def get_food_items(filter: Optional[str] = None):
         
         items = filtered_items
     
-    for item in items:
-        item.pop('_id', None)
-    return items
+    return db_response(items, response)
 
 @app.get("/api/food-items/{item_id}", response_model=FoodItem)
-async def get_food_item(item_id: str):
-    """Get a specific food item."""
-    item = await db.food_items.find_one({"id": item_id})
+async def get_food_item(item_id: str, request: Request, response: Response):
+    """Get a specific food item; its ETag is the item version, to send back as If-Match."""
+    item = await db.food_items.find_one({"id": item_id}, FOOD_ITEM_PROJECTION)
     if not item:
         raise HTTPException(status_code=404, detail="Food item not found")
-    item.pop('_id', None)
-    return item
+    not_modified = not_modified_response(request, response, f'W/"{item.get("version", 0)}"')
+    if not_modified:
+        return not_modified
+    return db_response(item, response)
 
-@app.put("/api/food-items/{item_id}", response_model=FoodItem)
-async def update_food_item(item_id: str, updates: dict):
-    """Update a food item."""
+def parse_quantity(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid quantity.")
+
+# Optimistic concurrency: every write increments the item's version. A client
+# that sends If-Match: <version> only writes if nobody changed the item since it
+# read that version, and gets 412 otherwise. GET /api/food-items/{id} returns the
+# version as its ETag (W/"3"), so the ETag can be sent back as is. Items stored
+# before versioning have no version field and count as version 0.
+def expected_version(request: Request) -> Optional[int]:
+    """Item version from an If-Match header (3, "3" or W/"3"); None if absent or *."""
+    header = request.headers.get("if-match")
+    if header is None or header.strip() == "*":
+        return None
+    try:
+        return int(header.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be the item version.")
+
+def versioned_filter(item_id: str, version: Optional[int]) -> dict:
+    query = {"id": item_id}
+    if version is not None:
+        query["version"] = {"$in": [0, None]} if version == 0 else version
+    return query
+
+async def write_conflict_or_missing(item_id: str) -> HTTPException:
+    """Error for a conditional write that matched nothing: 412 if the item exists, else 404."""
+    if await db.food_items.count_documents({"id": item_id}, limit=1):
+        return HTTPException(status_code=412, detail="Food item was changed by another request. Reload it and retry.")
+    return HTTPException(status_code=404, detail="Food item not found")
+
+def build_item_update(updates: dict, seq: int) -> dict:
+    """Validate a food item field update and turn it into Mongo update operators."""
+    # Identity and bookkeeping fields are managed by the server
+    for field in ('_id', 'id', 'version', 'seq', 'expired_recorded_at', 'expired_recorded_quantity', 'base_quantity', 'base_unit', 'base_grams', 'name_key'):
+        updates.pop(field, None)
     
     # START: Ensure expiration_date is in correct ISO format if present
     if 'expiration_date' in updates and updates['expiration_date']:
@@ -327,46 +1273,374 @@ async def update_food_item(item_id: str, updates: dict):
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid expiration_date format. Use YYYY-MM-DD.")
     # END: Date formatting
-            
-    result = await db.food_items.update_one(
-        {"id": item_id},
-        {"$set": updates}
-    )
     
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Food item not found")
+    updates['seq'] = seq
+    updates['updated_at'] = datetime.utcnow().isoformat()
+    
+    # Track when an item runs out so the archival job can pick it up later
+    update_ops = {"$set": updates, "$inc": {"version": 1}}
+    if 'quantity' in updates:
+        updates['quantity'] = parse_quantity(updates['quantity'])
+        if updates['quantity'] <= 0:
+            updates['consumed_at'] = datetime.utcnow().isoformat()
+        else:
+            update_ops["$unset"] = {"consumed_at": ""}
+    
+    # Derived fields the update determines on its own are written with it (the
+    # edit form always sends name, quantity and unit); sync_derived_fields
+    # catches up on the rest once the updated item is known
+    if {'name', 'quantity', 'unit'} <= set(updates):
+        updates.update(item_derived_fields(updates))
+    elif 'name' in updates:
+        updates['name_key'] = normalize_food_name(updates['name'] or '')
+    return update_ops
+
+async def refresh_calendar_events(item: dict):
+    """Replace an item's calendar events and notifications after its expiration date changed."""
+    await delete_with_tombstones("calendar_events", {"food_item_id": item['id']})
+    await delete_with_tombstones("notifications", {"food_item_id": item['id']})
+    await bump_versions("calendar_events", "notifications")
+    await create_calendar_events(item)
+
+def item_derived_fields(item: dict) -> dict:
+    """The base quantity fields and name_key an item should have for its current quantity, unit and name."""
+    try:
+        quantity = float(item.get('quantity') or 0)
+    except (TypeError, ValueError):
+        quantity = 0.0
+    return {**units.base_fields(quantity, item.get('unit'), item.get('name')),
+            "name_key": normalize_food_name(item.get('name') or '')}
+
+def stale_derived_fields(item: dict) -> dict:
+    """The derived fields whose stored value doesn't match the item (empty if all do)."""
+    return {field: value for field, value in item_derived_fields(item).items()
+            if item.get(field) != value or field not in item}
+
+async def sync_derived_fields(items: List[dict]) -> int:
+    """Store fresh derived fields for items whose quantity, unit or name changed; returns how many changed.
+    
+    Each write only applies to the version the item was derived from; a newer write
+    brings its own derived fields.
+    """
+    operations = []
+    for item in items:
+        fields = stale_derived_fields(item)
+        if fields:
+            item.update(fields)
+            operations.append(UpdateOne(versioned_filter(item['id'], item.get('version', 0)), {"$set": fields}))
+    if operations:
+        await db.food_items.bulk_write(operations, ordered=False)
+    return len(operations)
+
+async def backfill_derived_fields(batch_size: int = 1000) -> int:
+    """Add derived fields to items stored before they existed."""
+    total = 0
+    while True:
+        items = await db.food_items.find(
+            {"$or": [{"base_unit": {"$exists": False}}, {"name_key": {"$exists": False}}]},
+            {"_id": 0, "id": 1, "name": 1, "quantity": 1, "unit": 1, "version": 1}
+        ).limit(batch_size).to_list(length=None)
+        if not items:
+            return total
+        changed = await sync_derived_fields(items)
+        await bump_versions("food_items")
+        total += len(items)
+        if not changed:
+            return total
+
+async def flush_quantity_changes(batch: Dict[str, PendingQuantity]) -> Dict[str, object]:
+    """Apply quantity changes with one bulk_write and return the updated items by id.
     
-    item = await db.food_items.find_one({"id": item_id})
+    A change Mongo rejected (e.g. $inc on a quantity stored as a string) maps to
+    the HTTPException for its request instead; the rest of the batch still applies.
+    """
+    now = datetime.utcnow().isoformat()
+    # Fixes land before the reservation ends, so sync sees the final document
+    async with sync_sequence.reserve(len(batch)) as first_seq:
+        operations = []
+        for offset, (item_id, change) in enumerate(batch.items()):
+            fields = {"seq": first_seq + offset, "updated_at": now}
+            if change.absolute is not None:
+                fields["quantity"] = change.absolute + change.delta
+                operations.append(UpdateOne({"id": item_id}, {"$set": fields, "$inc": {"version": 1}}))
+            else:
+                operations.append(UpdateOne({"id": item_id}, {"$inc": {"quantity": change.delta, "version": 1}, "$set": fields}))
+        before = {item["id"]: item async for item in db.food_items.find({"id": {"$in": list(batch)}}, {"_id": 0, "id": 1, "quantity": 1})}
+        failed = {}
+        try:
+            await db.food_items.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            if not e.details.get("writeErrors"):
+                raise
+            item_ids = list(batch)
+            failed = {item_ids[error["index"]]: HTTPException(status_code=409, detail=f"Quantity change failed: {error.get('errmsg')}")
+                      for error in e.details["writeErrors"]}
+        applied = [item_id for item_id in batch if item_id not in failed]
+        items = {item["id"]: item async for item in db.food_items.find({"id": {"$in": applied}}, {"_id": 0})}
+
+        # One fix per item where needed: clamp at zero, keep consumed_at in step with
+        # the new quantity and refresh the derived fields. A newer write to the item
+        # (another version) brings its own.
+        fixes = []
+        for item in items.values():
+            fields, unset = {}, {}
+            if item["quantity"] < 0:
+                fields["quantity"] = item["quantity"] = 0
+            if item["quantity"] <= 0 and not item.get("consumed_at"):
+                fields["consumed_at"] = item["consumed_at"] = now
+            elif item["quantity"] > 0 and item.pop("consumed_at", None):
+                unset["consumed_at"] = ""
+            fields.update(stale_derived_fields(item))
+            item.update(fields)
+            update = {operator: values for operator, values in (("$set", fields), ("$unset", unset)) if values}
+            if update:
+                fixes.append(UpdateOne(versioned_filter(item["id"], item.get("version", 0)), update))
+        if fixes:
+            await db.food_items.bulk_write(fixes, ordered=False)
+    await bump_versions("food_items")
+    await record_food_events([event for item_id, item in items.items()
+                              for event in consumption_events(before.get(item_id, {}), item)])
+    return {**items, **failed}
+
+# Optional write-behind buffer for slider/tap quantity edits: changes to the same
+# item within QUANTITY_WRITE_BUFFER_MS are merged and flushed with one bulk write.
+# Requests wait for their flush, so a 200 means the change is stored. 0 disables it.
+QUANTITY_WRITE_BUFFER_MS = int(os.environ.get('QUANTITY_WRITE_BUFFER_MS', '0'))
+QUANTITY_WRITE_BUFFER_MAX_ITEMS = int(os.environ.get('QUANTITY_WRITE_BUFFER_MAX_ITEMS', '500'))
+quantity_buffer = QuantityWriteBuffer(
+    QUANTITY_WRITE_BUFFER_MS / 1000, QUANTITY_WRITE_BUFFER_MAX_ITEMS, flush_quantity_changes
+) if QUANTITY_WRITE_BUFFER_MS > 0 else None
+
+class QuantityAdjustment(BaseModel):
+    delta: float
+
+@app.post("/api/food-items/{item_id}/adjust", response_model=FoodItem)
+async def adjust_food_item_quantity(item_id: str, adjustment: QuantityAdjustment):
+    """Add to (or, with a negative delta, take from) a food item's quantity."""
+    if quantity_buffer is not None:
+        item = await quantity_buffer.add_quantity(item_id, adjustment.delta)
+    else:
+        change = PendingQuantity()
+        change.delta = adjustment.delta
+        item = (await flush_quantity_changes({item_id: change})).get(item_id)
+    if isinstance(item, Exception):
+        raise item
+    if item is None:
+        raise HTTPException(status_code=404, detail="Food item not found")
+    return item
+
+@app.put("/api/food-items/{item_id}", response_model=FoodItem)
+async def update_food_item(item_id: str, updates: dict, request: Request):
+    """Update a food item; send If-Match: <version> to only update the version you read."""
+    version = expected_version(request)
+    if quantity_buffer is not None and version is None and set(updates) == {"quantity"}:
+        item = await quantity_buffer.set_quantity(item_id, parse_quantity(updates["quantity"]))
+        if item is None:
+            raise HTTPException(status_code=404, detail="Food item not found")
+        return item
+
+    async with sync_sequence.reserve() as seq:
+        update_ops = build_item_update(updates, seq)
+        # The previous document gives the consumed amount; the updated one is derived from it
+        before = await db.food_items.find_one_and_update(
+            versioned_filter(item_id, version),
+            update_ops,
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            raise await write_conflict_or_missing(item_id)
+        item = {**before, **update_ops["$set"], "version": before.get("version", 0) + 1}
+        for field in update_ops.get("$unset", {}):
+            item.pop(field, None)
+        await sync_derived_fields([item])
+    events = consumption_events(before, item)
+    if 'expiration_date' in updates:
+        events += await reopen_expired_items([(before, item)])
+    await bump_versions("food_items")
+    await record_food_events(events)
     
-    # START: Handle re-calculating calendar events if expiration date changed
+    # Re-calculate calendar events if expiration date changed
     if 'expiration_date' in updates:
-        # Delete old events for this item
-        await db.calendar_events.delete_many({"food_item_id": item_id})
-        await db.notifications.delete_many({"food_item_id": item_id})
-        
-        # Create new events based on the new date
-        await create_calendar_events(item)
-    # END: Handle re-calculating events
+        await refresh_calendar_events(item)
     
-    item.pop('_id', None)
     return item
 
+# Inventory-level AI updates: the instruction is matched against item names and
+# categories, and only the matching items are listed in a single prompt
+BATCH_UPDATE_MAX_ITEMS = int(os.environ.get('BATCH_UPDATE_MAX_ITEMS', '40'))
+BATCH_UPDATE_FIELDS = {"name", "category", "quantity", "unit", "storage_condition", "expiration_date", "notes", "emoji"}
+CATEGORY_KEYWORDS = {
+    "produce": {"produce", "fruit", "fruits", "vegetable", "vegetables", "veggies", "veg"},
+    "dairy": {"dairy"},
+    "meat": {"meat", "meats"},
+    "packaged": {"packaged", "snacks", "canned"},
+    "frozen": {"frozen"},
+}
+INSTRUCTION_STOPWORDS = {
+    "the", "and", "all", "any", "some", "half", "used", "ate", "eaten", "have", "has", "had", "them",
+    "this", "that", "these", "those", "into", "from", "with", "for", "our", "my", "moved", "move",
+    "put", "freezer", "fridge", "pantry", "counter", "expires", "expired", "days", "day", "week",
+    "weeks", "more", "left", "rest", "just", "also", "then", "up", "out", "was", "were", "are",
+    "its", "it's", "everything", "finished", "tomorrow", "today", "yesterday", "rotten", "bad",
+}
+
+async def find_instruction_candidates(instruction: str) -> List[dict]:
+    """Pre-filter the inventory to items whose name or category the instruction mentions."""
+    words = set(re.findall(r"[a-z]+", instruction.lower()))
+    categories = [category for category, keywords in CATEGORY_KEYWORDS.items() if words & keywords]
+    terms = {word[:-1] if word.endswith("s") and len(word) > 3 else word
+             for word in words if len(word) >= 3 and word not in INSTRUCTION_STOPWORDS}
+    
+    clauses = [{"name": {"$regex": r"\b" + re.escape(term), "$options": "i"}} for term in sorted(terms)]
+    if categories:
+        clauses.append({"category": {"$in": categories}})
+    if not clauses:
+        return []
+    
+    projection = {"_id": 0, "id": 1, "name": 1, "category": 1, "quantity": 1, "unit": 1,
+                  "storage_condition": 1, "expiration_date": 1, "version": 1,
+                  "expired_recorded_at": 1, "expired_recorded_quantity": 1,
+                  "base_quantity": 1, "base_unit": 1, "base_grams": 1, "name_key": 1}
+    return await db.food_items.find({"$or": clauses}, projection).limit(BATCH_UPDATE_MAX_ITEMS).to_list(length=None)
+
+@app.post("/api/food-items/ai-update")
+async def ai_update_inventory(request: dict, http_request: Request):
+    """Use AI to update several food items from one natural language instruction.
+    
+    Returns per-item updated_fields; pass "apply": true to write them in a single bulk_write.
+    Each write only applies if the item is unchanged since it was read for the prompt;
+    items edited in the meantime are reported in "conflicts". Updates with values that
+    don't validate (e.g. a malformed expiration_date from the model) are left out and
+    reported in "invalid" with the reason.
+    """
+    try:
+        instruction = request.get("instruction", "")
+        if not instruction:
+            raise HTTPException(status_code=400, detail="Instruction is required")
+        apply_updates = bool(request.get("apply", False))
+        
+        candidates = await find_instruction_candidates(instruction)
+        if not candidates:
+            return {
+                "success": False,
+                "message": "No inventory items match this instruction",
+                "updates": []
+            }
+        
+        current_date_iso = datetime.utcnow().isoformat().split('T')[0]
+        prompt = prompts.batch_update_prompt(candidates, instruction, current_date_iso)
+        result = await run_until_disconnect(http_request, prompts.BATCH_UPDATE, complete_json(
+            prompts.BATCH_UPDATE, prompts.UPDATE_SYSTEM, prompt, temperature=0.3,
+            max_tokens=prompts.token_budget(prompts.BATCH_UPDATE, len(candidates))
+        ))
+        
+        # Keep only known items and editable fields
+        candidates_by_id = {item['id']: item for item in candidates}
+        candidate_names = {item['id']: item['name'] for item in candidates}
+        candidate_versions = {item['id']: item.get('version', 0) for item in candidates}
+        updates = []
+        update_ops = []
+        invalid = []
+        for update in result.get("updates", []):
+            item_id = update.get("id")
+            fields = {key: value for key, value in (update.get("fields") or {}).items() if key in BATCH_UPDATE_FIELDS}
+            if item_id in candidate_names and fields:
+                try:
+                    # seq is stamped once the batch has its sequence numbers
+                    ops = build_item_update(dict(fields), 0)
+                    # The write is conditional on the version read, so derived fields can go with it
+                    ops["$set"].update(stale_derived_fields({**candidates_by_id[item_id], **ops["$set"]}))
+                    update_ops.append(ops)
+                except HTTPException as e:
+                    invalid.append({"id": item_id, "name": candidate_names[item_id], "updated_fields": fields, "error": e.detail})
+                    continue
+                updates.append({"id": item_id, "name": candidate_names[item_id], "updated_fields": fields})
+        
+        conflicts = []
+        if apply_updates and updates:
+            async with sync_sequence.reserve(len(updates)) as first_seq:
+                operations = []
+                for offset, (update, ops) in enumerate(zip(updates, update_ops)):
+                    ops["$set"]["seq"] = first_seq + offset
+                    operations.append(UpdateOne(versioned_filter(update['id'], candidate_versions[update['id']]), ops))
+                result = await db.food_items.bulk_write(operations, ordered=False)
+                if result.matched_count < len(operations):
+                    # Each write stamps its own seq; items without it were changed or deleted concurrently
+                    current = {item['id']: item.get('seq') async for item in db.food_items.find(
+                        {"id": {"$in": [update['id'] for update in updates]}}, {"_id": 0, "id": 1, "seq": 1})}
+                    conflicts = [update['id'] for offset, update in enumerate(updates)
+                                 if current.get(update['id']) != first_seq + offset]
+                
+                updated_items = []
+                for update, ops in zip(updates, update_ops):
+                    if update['id'] in conflicts:
+                        continue
+                    item = {**candidates_by_id[update['id']], **ops["$set"], "version": candidate_versions[update['id']] + 1}
+                    for field in ops.get("$unset", {}):
+                        item.pop(field, None)
+                    updated_items.append(item)
+                events = [event for item in updated_items
+                          for event in consumption_events(candidates_by_id[item['id']], item)]
+                events += await reopen_expired_items([(candidates_by_id[item['id']], item) for item in updated_items])
+            await bump_versions("food_items")
+            await record_food_events(events)
+            
+            # Re-calculate calendar events for items whose expiration date changed
+            changed_ids = [update['id'] for update in updates
+                           if 'expiration_date' in update['updated_fields'] and update['id'] not in conflicts]
+            if changed_ids:
+                for item in await db.food_items.find({"id": {"$in": changed_ids}}, {"_id": 0}).to_list(length=None):
+                    await refresh_calendar_events(item)
+        
+        return {
+            "success": True,
+            "updates": updates,
+            "applied": apply_updates and bool(updates),
+            "conflicts": conflicts,
+            "invalid": invalid,
+            "matched_items": len(candidates),
+            "message": "AI analysis complete"
+        }
+        
+    except HTTPException:
+        raise
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=500, detail="Failed to parse AI response")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"AI batch update failed: {str(e)}")
+
 @app.post("/api/food-items/{item_id}/ai-update")
-async def ai_update_food_item(item_id: str, request: dict):
-    """Use AI to update food item based on natural language instruction."""
+async def ai_update_food_item(item_id: str, request: dict, http_request: Request):
+    """Use AI to update food item based on natural language instruction.
+    
+    The response's based_on_version is the item version the fields were computed from;
+    send it as If-Match when applying them so edits made in the meantime aren't overwritten.
+    """
     try:
-        # Get the current food item
-        item = await db.food_items.find_one({"id": item_id})
+        # Get the current food item (only the expected version when If-Match is sent)
+        item = await db.food_items.find_one(versioned_filter(item_id, expected_version(http_request)))
         if not item:
-            raise HTTPException(status_code=404, detail="Food item not found")
+            raise await write_conflict_or_missing(item_id)
         
         instruction = request.get("instruction", "")
         if not instruction:
             raise HTTPException(status_code=400, detail="Instruction is required")
         
+        if LOCAL_INSTRUCTION_PARSER:
+            local_fields = parse_instruction(instruction, item)
+            if local_fields is not None:
+                prompts.token_usage.record_local(prompts.ITEM_UPDATE)
+                return {
+                    "success": True,
+                    "updated_fields": local_fields,
+                    "based_on_version": item.get("version", 0),
+                    "message": "Instruction parsed locally",
+                    "source": "local"
+                }
+        
         # START: Get current date and format expiration date for AI
-        current_date = datetime.utcnow()
-        current_date_iso = current_date.isoformat().split('T')[0] # YYYY-MM-DD
+        current_date_iso = datetime.utcnow().isoformat().split('T')[0] # YYYY-MM-DD
         
         current_expiration_date_str = item.get("expiration_date", "")
         if current_expiration_date_str:
@@ -391,132 +1665,275 @@ async def ai_update_food_item(item_id: str, request: dict):
             "emoji": item.get("emoji", "")
         }
         
-        # START: Create dynamic example for "add 2 days"
-        try:
-            example_add_date = (datetime.fromisoformat(current_expiration_date_iso + 'T00:00:00') + timedelta(days=2)).isoformat().split('T')[0]
-        except ValueError:
-            example_add_date = (current_date + timedelta(days=2)).isoformat().split('T')[0] # Fallback
-        # END: Create dynamic example
-
-        # Create prompt for AI
-        prompt = f"""You are helping update a food item based on a user's instruction.
-
-Current Date: {current_date_iso}
-
-Current food item data:
-- Name: {current_data['name']}
-- Category: {current_data['category']}
-- Quantity: {current_data['quantity']}
-- Unit: {current_data['unit']}
-- Storage Condition: {current_data['storage_condition']}
-- Expiration Date: {current_data['expiration_date']}
-- Notes: {current_data['notes']}
-- Emoji: {current_data['emoji']}
-
-User instruction: "{instruction}"
-
-Based on this instruction, calculate and return ONLY the updated values that should change. Return a JSON object with the fields that need updating.
-**Important**: For `expiration_date`, always return the new, absolute date in **`YYYY-MM-DD`** format. Calculate it based on the **Current Date** ({current_date_iso}).
-
-Examples:
-- "I only ate half of this" → {{"quantity": {current_data['quantity'] / 2}}}
-- "Move this to the freezer" → {{"storage_condition": "frozen"}}
-- "Change name to leftover chicken" → {{"name": "leftover chicken"}}
-- "This expires in 3 days" → {{"expiration_date": "{(current_date + timedelta(days=3)).isoformat().split('T')[0]}"}}
-- "This expires tomorrow" → {{"expiration_date": "{(current_date + timedelta(days=1)).isoformat().split('T')[0]}"}}
-- "This is rotten" or "It expired yesterday" → {{"expiration_date": "{(current_date - timedelta(days=1)).isoformat().split('T')[0]}"}}
-- "Add 2 days to the expiration date" → {{"expiration_date": "{example_add_date}"}}
-
-Available categories: produce, dairy, meat, packaged, frozen, other
-Available storage conditions: pantry, refrigerated, frozen, room_temp
-Available units: each, lbs, oz, kg, g, gallon, liter
-
-Return ONLY a JSON object with the fields to update. Do not include fields that don't need to change."""
-
-        response = await deepseek_client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that interprets food-related instructions and returns JSON updates. Always respond with valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=500
+        prompt = prompts.item_update_prompt(current_data, instruction, current_date_iso)
+        updated_fields = await run_until_disconnect(
+            http_request, prompts.ITEM_UPDATE,
+            complete_json(prompts.ITEM_UPDATE, prompts.UPDATE_SYSTEM, prompt, temperature=0.3)
         )
         
-        content = response.choices[0].message.content.strip()
-        
-        # Extract JSON from response
-        if '```json' in content:
-            content = content.split('```json')[1].split('```')[0].strip()
-        elif '```' in content:
-            content = content.split('```')[1].split('```')[0].strip()
-        
-        updated_fields = json.loads(content)
-        
         # Return the updated fields (frontend will apply them)
         return {
             "success": True,
             "updated_fields": updated_fields,
-            "message": "AI analysis complete"
+            "based_on_version": item.get("version", 0),
+            "message": "AI analysis complete",
+            "source": "ai"
         }
         
+    except HTTPException:
+        raise
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail="Failed to parse AI response")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI update failed: {str(e)}")
 
 @app.delete("/api/food-items/{item_id}")
-async def delete_food_item(item_id: str):
-    """Delete a food item."""
-    result = await db.food_items.delete_one({"id": item_id})
+async def delete_food_item(item_id: str, request: Request):
+    """Delete a food item, keeping a compact copy in the archive. Honours If-Match: <version>."""
+    item = await db.food_items.find_one_and_delete(versioned_filter(item_id, expected_version(request)), {"_id": 0})
     
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Food item not found")
+    if not item:
+        raise await write_conflict_or_missing(item_id)
+    
+    await db.food_items_archive.insert_one(compact_archive_record(item, "deleted"))
+    
+    # Whatever is left of an expired item was wasted, unless the expiry job already counted it
+    events = []
+    try:
+        remaining = float(item.get('quantity') or 0)
+    except (TypeError, ValueError):
+        remaining = 0.0 # Unparseable quantities were never counted as stock
+    if remaining > 0 and not item.get('expired_recorded_at') and item.get('expiration_date', '') < datetime.utcnow().isoformat():
+        events.append(analytics.food_event(analytics.EXPIRED, item, remaining))
+    events.append(analytics.food_event(analytics.DELETED, item, max(remaining, 0)))
+    await record_food_events(events)
+    async with sync_sequence.reserve() as seq:
+        await db.tombstones.insert_one({"collection": "food_items", "id": item_id, "seq": seq, "deleted_at": datetime.utcnow()})
     
     # Also delete related calendar events and notifications
-    await db.calendar_events.delete_many({"food_item_id": item_id})
-    await db.notifications.delete_many({"food_item_id": item_id})
+    await delete_with_tombstones("calendar_events", {"food_item_id": item_id})
+    await delete_with_tombstones("notifications", {"food_item_id": item_id})
+    await bump_versions("food_items", "calendar_events", "notifications")
     
     return {"message": "Food item deleted successfully"}
 
+@app.get("/api/ai/routes")
+async def get_ai_routes():
+    """Get the AI model routes per task with their latency SLOs and call statistics."""
+    return model_router.describe()
+
+@app.get("/api/ai/usage")
+async def get_ai_usage():
+    """Get token usage per AI task since startup, with the configured max_tokens budgets and requests served locally."""
+    return prompts.token_usage.summary()
+
+@app.get("/api/ai/cache")
+async def get_ai_cache_stats():
+    """Get similarity cache hit/miss counts for shelf-life analyses."""
+    return {"enabled": SEMANTIC_CACHE_ENABLED, "threshold": SEMANTIC_CACHE_THRESHOLD, **analysis_cache.stats}
+
+@app.post("/api/maintenance/archive")
+async def run_archival():
+    """Archive fully consumed food items now instead of waiting for the periodic job."""
+    archived = await archive_consumed_items()
+    return {"archived_count": archived}
+
 @app.get("/api/notifications", response_model=List[NotificationItem])
-async def get_notifications():
+async def get_notifications(request: Request, response: Response):
     """Get all notifications."""
-    notifications = await db.notifications.find().sort("created_at", -1).to_list(length=None)
-    for notif in notifications:
-        notif.pop('_id', None)
-    return notifications
+    not_modified = etag_precondition(request, response, ["notifications"])
+    if not_modified:
+        return not_modified
+    
+    notifications = await db.notifications.find({}, NOTIFICATION_PROJECTION).sort("created_at", -1).to_list(length=None)
+    return db_response(notifications, response)
 
 @app.get("/api/notifications/unread")
-async def get_unread_count():
+async def get_unread_count(request: Request, response: Response):
     """Get count of unread notifications."""
+    not_modified = etag_precondition(request, response, ["notifications"])
+    if not_modified:
+        return not_modified
+    
     count = await db.notifications.count_documents({"is_read": False})
     return {"unread_count": count}
 
+@app.get("/api/notifications/outbox")
+async def get_notification_outbox_stats():
+    """Outbox entries per channel and delivery status, and this worker's delivery counters."""
+    rows = await db.notification_outbox.aggregate([
+        {"$group": {"_id": {"channel": "$channel", "status": "$status"}, "count": {"$sum": 1}}}
+    ]).to_list(length=None)
+    entries = {}
+    for row in rows:
+        entries.setdefault(row["_id"]["channel"], {})[row["_id"]["status"]] = row["count"]
+    return {
+        "enabled": outbox_workers is not None,
+        "channels": sorted(notification_targets()),
+        "entries": entries,
+        "workers": outbox_workers.stats if outbox_workers is not None else None,
+    }
+
 @app.put("/api/notifications/{notification_id}/read")
 async def mark_notification_read(notification_id: str):
     """Mark a notification as read."""
-    result = await db.notifications.update_one(
-        {"id": notification_id},
-        {"$set": {"is_read": True}}
-    )
+    async with sync_sequence.reserve() as seq:
+        result = await db.notifications.update_one(
+            {"id": notification_id},
+            {"$set": {
+                "is_read": True,
+                "read_at": datetime.utcnow(), # read_at drives the retention job
+                "seq": seq,
+                "updated_at": datetime.utcnow().isoformat()
+            }}
+        )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Notification not found")
+    await bump_versions("notifications")
     
     return {"message": "Notification marked as read"}
 
+def parse_calendar_window(from_date: Optional[str], to_date: Optional[str]) -> dict:
+    """Build an event_date range query from optional from/to bounds (inclusive)."""
+    window = {}
+    try:
+        if from_date:
+            window["$gte"] = datetime.fromisoformat(from_date).isoformat()
+        if to_date:
+            to_dt = datetime.fromisoformat(to_date)
+            # A bare YYYY-MM-DD upper bound covers the whole day
+            if len(to_date) == 10:
+                to_dt += timedelta(days=1)
+                window["$lt"] = to_dt.isoformat()
+            else:
+                window["$lte"] = to_dt.isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid from/to date format. Use YYYY-MM-DD.")
+    return {"event_date": window} if window else {}
+
 @app.get("/api/calendar-events", response_model=List[CalendarEvent])
-async def get_calendar_events():
-    """Get all calendar events."""
-    events = await db.calendar_events.find().sort("event_date", 1).to_list(length=None)
-    for event in events:
-        event.pop('_id', None)
-    return events
+async def get_calendar_events(
+    request: Request,
+    response: Response,
+    from_date: Optional[str] = Query(None, alias="from"),
+    to_date: Optional[str] = Query(None, alias="to")
+):
+    """Get calendar events, optionally limited to a from/to date window."""
+    query = parse_calendar_window(from_date, to_date)
+    not_modified = etag_precondition(request, response, ["calendar_events"])
+    if not_modified:
+        return not_modified
+    
+    events = await db.calendar_events.find(query, CALENDAR_EVENT_PROJECTION).sort("event_date", 1).to_list(length=None)
+    return db_response(events, response)
+
+def ics_escape(text: str) -> str:
+    """Escape a text value for use in an iCalendar property."""
+    return (text or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+def ics_fold(line: str) -> str:
+    """Fold a content line at 75 octets as required by RFC 5545."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    chunk = b""
+    for char in line:
+        char_bytes = char.encode("utf-8")
+        # Continuation lines start with a space, so they hold one octet less
+        if len(chunk) + len(char_bytes) > (75 if not parts else 74):
+            parts.append(chunk.decode("utf-8"))
+            chunk = b""
+        chunk += char_bytes
+    parts.append(chunk.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+def calendar_event_to_vevent(event: dict) -> str:
+    """Render a calendar event document as an all-day VEVENT block."""
+    event_dt = datetime.fromisoformat(event['event_date'])
+    try:
+        stamp_dt = datetime.fromisoformat(event.get('created_at', ''))
+    except ValueError:
+        stamp_dt = datetime.utcnow()
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{event['id']}@food-guard",
+        f"DTSTAMP:{stamp_dt.strftime('%Y%m%dT%H%M%SZ')}",
+        f"DTSTART;VALUE=DATE:{event_dt.strftime('%Y%m%d')}",
+        f"DTEND;VALUE=DATE:{(event_dt + timedelta(days=1)).strftime('%Y%m%d')}",
+        f"SUMMARY:{ics_escape(event.get('title', ''))}",
+        f"DESCRIPTION:{ics_escape(event.get('description', ''))}",
+        f"CATEGORIES:{ics_escape(event.get('event_type', ''))}",
+        "END:VEVENT",
+    ]
+    return "".join(ics_fold(line) for line in lines)
+
+@app.get("/api/calendar-events/export.ics")
+async def export_calendar_events(
+    from_date: Optional[str] = Query(None, alias="from"),
+    to_date: Optional[str] = Query(None, alias="to")
+):
+    """Stream calendar events as an iCalendar feed for external calendar sync."""
+    query = parse_calendar_window(from_date, to_date)
+
+    async def generate():
+        yield ics_fold("BEGIN:VCALENDAR") + ics_fold("VERSION:2.0") + ics_fold("PRODID:-//Food Guard//Expiration Calendar//EN") + ics_fold("CALSCALE:GREGORIAN")
+        cursor = db.calendar_events.find(query, CALENDAR_EVENT_PROJECTION).sort("event_date", 1).batch_size(500)
+        async for event in cursor:
+            try:
+                yield calendar_event_to_vevent(event)
+            except (KeyError, ValueError, TypeError):
+                print(f"Skipping malformed calendar event {event.get('id')} in iCalendar export.")
+        yield ics_fold("END:VCALENDAR")
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/calendar; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="food-guard.ics"'}
+    )
+
+@app.get("/api/sync")
+async def sync_changes(since: int = 0):
+    """Return food items, notifications and calendar events changed after the since cursor.
+    
+    Pass the returned cursor as `since` on the next call. since=0 returns everything,
+    including documents the archival job hasn't stamped with a seq yet.
+    Tombstones are kept for SYNC_TOMBSTONE_RETENTION_DAYS; clients that have been
+    offline longer should resync from 0. Changes at or after a sequence number whose
+    write is still in flight are left for the next call.
+    """
+    projections = {
+        "food_items": FOOD_ITEM_PROJECTION,
+        "notifications": NOTIFICATION_PROJECTION,
+        "calendar_events": CALENDAR_EVENT_PROJECTION
+    }
+    changes = {"cursor": since, "deleted": {name: [] for name in SYNC_COLLECTIONS}}
+    window = {"$gt": since, "$lt": await sync_sequence.horizon()}
+    
+    query = {"seq": window} if since else {"$or": [{"seq": window}, {"seq": {"$exists": False}}]}
+    
+    for name in SYNC_COLLECTIONS:
+        docs = await db[name].find(query, {**projections[name], "seq": 1}).sort("seq", 1).to_list(length=None)
+        for doc in docs:
+            changes["cursor"] = max(changes["cursor"], doc.pop("seq", 0))
+        changes[name] = docs
+    
+    tombstones = await db.tombstones.find({"seq": window}, {"_id": 0}).sort("seq", 1).to_list(length=None)
+    for tombstone in tombstones:
+        changes["cursor"] = max(changes["cursor"], tombstone["seq"])
+        if tombstone["collection"] in changes["deleted"]:
+            changes["deleted"][tombstone["collection"]].append(tombstone["id"])
+    
+    return changes
 
 @app.get("/api/dashboard/stats")
-async def get_dashboard_stats():
+async def get_dashboard_stats(request: Request, response: Response):
     """Get dashboard statistics."""
+    not_modified = etag_precondition(request, response, ["food_items"], time_dependent=True)
+    if not_modified:
+        return not_modified
+    
     total_items = await db.food_items.count_documents({})
     
     # Count expiring soon (within 3 days)
@@ -546,8 +1963,246 @@ async def get_dashboard_stats():
         "category_breakdown": category_breakdown
     }
 
+@app.get("/api/analytics/waste")
+async def get_waste_analytics(months: int = Query(12, ge=1, le=120)):
+    """Get consumed, expired (wasted) and deleted food per category and month, from the daily rollups."""
+    today = datetime.utcnow()
+    month_index = today.year * 12 + today.month - 1 - (months - 1)
+    first_day = f"{month_index // 12:04d}-{month_index % 12 + 1:02d}-01"
+    rows = await db.analytics_daily.aggregate(analytics.monthly_rollup_pipeline(first_day)).to_list(length=None)
+    return {"from": first_day, "months": months, **analytics.summarize_rollups(rows)}
+
+# Consumption forecasting: rates are fitted from the last FORECAST_HISTORY_DAYS of
+# consumed events, weighted with a FORECAST_HALF_LIFE_DAYS half-life
+FORECAST_HISTORY_DAYS = float(os.environ.get('FORECAST_HISTORY_DAYS', '90'))
+FORECAST_HALF_LIFE_DAYS = float(os.environ.get('FORECAST_HALF_LIFE_DAYS', '14'))
+FORECAST_PRIOR_DAYS = float(os.environ.get('FORECAST_PRIOR_DAYS', '7'))
+
+@app.get("/api/forecast")
+async def get_consumption_forecast(limit: int = Query(100, ge=1, le=100000), at_risk_only: bool = False):
+    """Predict when each item runs out and whether it expires before it is finished.
+    
+    Items are ordered by predicted run-out; at_risk_only keeps items expected to expire with some left.
+    """
+    now = datetime.utcnow()
+    items = await db.food_items.find(
+        {"quantity": {"$gt": 0}},
+        {"_id": 0, "id": 1, "name": 1, "category": 1, "quantity": 1, "unit": 1, "expiration_date": 1, "created_at": 1}
+    ).to_list(length=None)
+    if not items:
+        return {"generated_at": now.isoformat(), "item_count": 0, "at_risk_count": 0, "items": []}
+    # Ages are computed by Mongo so no datetimes need converting per event
+    events = await db.food_events.aggregate([
+        {"$match": {"type": analytics.CONSUMED, "at": {"$gte": now - timedelta(days=FORECAST_HISTORY_DAYS)}}},
+        {"$project": {"_id": 0, "item_id": 1, "category": 1, "unit": 1, "quantity": 1,
+                      "age_days": {"$divide": [{"$subtract": [now, "$at"]}, 86400000]}}}
+    ]).to_list(length=None)
+    
+    forecast = forecasting.forecast_inventory(items, events, now, FORECAST_HALF_LIFE_DAYS,
+                                              FORECAST_PRIOR_DAYS, FORECAST_HISTORY_DAYS)
+    selected = np.argsort(forecast["run_out_days"], kind="stable")
+    if at_risk_only:
+        selected = selected[forecast["expires_first"][selected]]
+    
+    results = []
+    for index in selected[:limit].tolist():
+        item = items[index]
+        run_out_days = forecast["run_out_days"][index]
+        results.append({
+            **item,
+            "daily_rate": round(float(forecast["daily_rate"][index]), 4),
+            "rate_source": "item" if forecast["has_history"][index] else "category",
+            "run_out_date": (now + timedelta(days=float(run_out_days))).date().isoformat() if np.isfinite(run_out_days) and run_out_days < 36500 else None,
+            "expires_before_finished": bool(forecast["expires_first"][index]),
+            "leftover_at_expiration": round(float(forecast["leftover_at_expiration"][index]), 3),
+        })
+    return {
+        "generated_at": now.isoformat(),
+        "item_count": len(items),
+        "at_risk_count": int(forecast["expires_first"].sum()),
+        "items": results
+    }
+
+@app.get("/api/inventory/totals")
+async def get_inventory_totals(
+    unit: str = "g",
+    name: Optional[str] = None,
+    category: Optional[str] = None,
+    group_by: Optional[str] = Query("category", pattern="^(category|name|none)$")
+):
+    """Total amount in stock in one unit, e.g. ?unit=g&name=cheese for the grams of cheese.
+    
+    Summed by a Mongo aggregation over the stored base quantities. Mass totals include
+    every item whose weight is known (volumes and pieces via density / piece weight
+    hints); volume and count totals include items measured in that dimension.
+    Items that can't be expressed in the unit are counted in unconverted_items.
+    """
+    target = units.normalize_unit(unit)
+    if target is None:
+        raise HTTPException(status_code=400, detail=f"Unknown unit: {unit}")
+    dimension = units.UNITS[target][0]
+    base_unit = units.BASE_UNITS[dimension]
+    if dimension == units.MASS:
+        amount, converted = "$base_grams", {"$ne": [{"$ifNull": ["$base_grams", None]}, None]}
+    else:
+        amount, converted = "$base_quantity", {"$eq": ["$base_unit", base_unit]}
+    
+    query = {"quantity": {"$gt": 0}}
+    if name:
+        query["name"] = {"$regex": re.escape(name), "$options": "i"}
+    if category:
+        query["category"] = category
+    rows = await db.food_items.aggregate([
+        {"$match": query},
+        {"$group": {
+            "_id": None if group_by == "none" else f"${group_by}",
+            "base_quantity": {"$sum": {"$cond": [converted, amount, 0]}},
+            "items": {"$sum": {"$cond": [converted, 1, 0]}},
+            "unconverted_items": {"$sum": {"$cond": [converted, 0, 1]}},
+        }},
+    ]).to_list(length=None)
+    
+    factor = units.CONVERSION_TABLE[(base_unit, target)]
+    totals = sorted((
+        {"key": row["_id"], "quantity": round(row["base_quantity"] * factor, 3),
+         "items": row["items"], "unconverted_items": row["unconverted_items"]}
+        for row in rows
+    ), key=lambda total: -total["quantity"])
+    return {
+        "unit": target,
+        "total": round(sum(total["quantity"] for total in totals), 3),
+        "totals": totals,
+    }
+
+def annotate_ingredient_stock(recipes: List[dict], available_items: List[dict]):
+    """Add the amount in stock, in the ingredient's own unit, to recipe ingredients taken from the inventory."""
+    items_by_id = {item['inventory_item_id']: item for item in available_items}
+    for recipe in recipes:
+        for ingredient in recipe.get("ingredients") or []:
+            item = items_by_id.get(ingredient.get("inventory_item_id")) if isinstance(ingredient, dict) else None
+            if item is None:
+                continue
+            in_stock = units.convert(item['quantity'], item['unit'], ingredient.get("unit"), item['name'])
+            ingredient["quantity_in_stock"] = round(in_stock, 3) if in_stock is not None else None
+            required = ingredient.get("quantity_required")
+            ingredient["enough_in_stock"] = (
+                in_stock >= required if in_stock is not None and isinstance(required, (int, float)) else None
+            )
+
+class LowStockThreshold(BaseModel):
+    name: Optional[str] = None
+    inventory_item_id: Optional[str] = None
+    quantity: float = Field(gt=0)
+    unit: str = "each"
+
+class ShoppingListRequest(BaseModel):
+    recipes: List[dict] = []
+    low_stock: List[LowStockThreshold] = []
+
+SHOPPING_LIST_ITEM_PROJECTION = {"_id": 0, "id": 1, "name": 1, "name_key": 1, "quantity": 1, "unit": 1, "expiration_date": 1}
+
+@app.post("/api/shopping-list")
+async def create_shopping_list(request: ShoppingListRequest):
+    """Merged list of what to buy for the given recipes (as returned by /api/meal-suggestions) and low-stock thresholds.
+    
+    Requirements for the same food (by inventory_item_id or normalized name) are summed,
+    converting units where possible, and what's in stock and not expired is subtracted.
+    A low-stock threshold is the amount to have left on top of what the recipes use.
+    """
+    for threshold in request.low_stock:
+        if not (threshold.name or threshold.inventory_item_id):
+            raise HTTPException(status_code=400, detail="Each low_stock threshold needs a name or an inventory_item_id")
+    
+    # Every referenced item and every food named, in one query on the id and name_key indexes
+    item_ids = {threshold.inventory_item_id for threshold in request.low_stock if threshold.inventory_item_id}
+    name_keys = {normalize_food_name(threshold.name) for threshold in request.low_stock if threshold.name}
+    for recipe in request.recipes:
+        for ingredient in recipe.get("ingredients") or []:
+            if isinstance(ingredient, dict):
+                if ingredient.get("inventory_item_id"):
+                    item_ids.add(ingredient["inventory_item_id"])
+                if ingredient.get("name"):
+                    name_keys.add(normalize_food_name(ingredient["name"]))
+    items = await db.food_items.find(
+        {"$or": [{"id": {"$in": list(item_ids)}}, {"name_key": {"$in": list(name_keys)}}]},
+        SHOPPING_LIST_ITEM_PROJECTION
+    ).to_list(length=None)
+    items_by_id = {item['id']: item for item in items}
+    # Linked items can be named differently from the ingredient ("milk" -> "Whole milk");
+    # other items of the same food count towards the stock too
+    linked_keys = {item.get('name_key') for item in items if item['id'] in item_ids} - name_keys - {None}
+    if linked_keys:
+        items += await db.food_items.find(
+            {"name_key": {"$in": list(linked_keys)}, "id": {"$nin": list(items_by_id)}},
+            SHOPPING_LIST_ITEM_PROJECTION
+        ).to_list(length=None)
+    
+    requirements = shopping_list.Requirements(items_by_id)
+    requirements.add_recipes(request.recipes)
+    for threshold in request.low_stock:
+        name = threshold.name or items_by_id.get(threshold.inventory_item_id, {}).get('name')
+        if name:
+            requirements.add(name, threshold.quantity, threshold.unit, shopping_list.LOW_STOCK, threshold.inventory_item_id)
+    
+    now = datetime.utcnow().isoformat()
+    usable = [item for item in items
+              if (item.get('quantity') or 0) > 0 and (item.get('expiration_date') or '') >= now]
+    entries = shopping_list.build_shopping_list(requirements.all(), usable)
+    return {"items": entries, "count": len(entries)}
+
+# Number of soonest-expiring ingredients included in the meal-suggestion prompt
+MEAL_SUGGESTION_ITEM_LIMIT = 15
+
+# "parallel" mode asks for one recipe per completion, each built around a
+# different soon-to-expire ingredient, and runs them concurrently
+MEAL_SUGGESTION_MODE = os.environ.get('MEAL_SUGGESTION_MODE', 'single')
+MEAL_SUGGESTION_RECIPE_COUNT = 3
+RECIPE_FANOUT_CONCURRENCY = int(os.environ.get('RECIPE_FANOUT_CONCURRENCY', '6'))
+recipe_fanout_semaphore = asyncio.Semaphore(RECIPE_FANOUT_CONCURRENCY)
+
+async def generate_focused_recipe(available_items: List[dict], focus_ingredient: str, meal_type: str, style: str, max_time, servings, additional_prefs: str) -> List[dict]:
+    """Generate a single recipe built around one ingredient."""
+    prompt = prompts.recipes_prompt(available_items, meal_type, style, max_time, servings, additional_prefs,
+                                    recipe_count=1, focus_ingredient=focus_ingredient)
+    async with recipe_fanout_semaphore:
+        result = await complete_json(prompts.RECIPE_FANOUT, prompts.RECIPES_SYSTEM, prompt, temperature=0.7)
+    return result.get("recipes", [])
+
+async def generate_recipes_parallel(available_items: List[dict], meal_type: str, style: str, max_time, servings, additional_prefs: str) -> List[dict]:
+    """Fan out one completion per focus ingredient and merge the de-duplicated results."""
+    focus_ingredients = []
+    for item in available_items:
+        if item['name'] not in focus_ingredients:
+            focus_ingredients.append(item['name'])
+        if len(focus_ingredients) == MEAL_SUGGESTION_RECIPE_COUNT:
+            break
+    
+    results = await asyncio.gather(*[
+        generate_focused_recipe(available_items, focus, meal_type, style, max_time, servings, additional_prefs)
+        for focus in focus_ingredients
+    ], return_exceptions=True)
+    
+    recipes = []
+    seen_names = set()
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Recipe fan-out completion failed: {result}")
+            continue
+        for recipe in result:
+            key = " ".join(str(recipe.get("name", "")).lower().split())
+            if key and key not in seen_names:
+                seen_names.add(key)
+                recipes.append(recipe)
+    
+    if not recipes:
+        # Nothing usable came back: surface the failure instead of an empty success
+        error = next((result for result in results if isinstance(result, Exception)), None)
+        if error is not None:
+            raise error
+    return recipes[:MEAL_SUGGESTION_RECIPE_COUNT]
+
 @app.post("/api/meal-suggestions")
-async def get_meal_suggestions(request: dict):
+async def get_meal_suggestions(request: dict, http_request: Request):
     """Generate meal suggestions based on available inventory and user preferences."""
     try:
         # Get user preferences
@@ -556,35 +2211,33 @@ async def get_meal_suggestions(request: dict):
         max_time = request.get("max_time", 60)
         servings = request.get("servings", 2)
         additional_prefs = request.get("additional_preferences", "")
+        mode = request.get("mode", MEAL_SUGGESTION_MODE)
         
-        # Fetch all food items
-        items = await db.food_items.find().to_list(length=None)
-        
-        # Filter out expired items and calculate days until expiration
+        # Fetch only the soonest-expiring usable items (indexed sort + limit).
+        # An item counts as available once it has at least one full day left.
         now = datetime.utcnow()
-        available_items = []
+        available_query = {
+            "expiration_date": {"$gte": (now + timedelta(days=1)).isoformat()},
+            "quantity": {"$gt": 0}
+        }
+        items = await db.food_items.find(
+            available_query,
+            {"_id": 0, "id": 1, "name": 1, "quantity": 1, "unit": 1, "expiration_date": 1}
+        ).sort("expiration_date", 1).limit(MEAL_SUGGESTION_ITEM_LIMIT).to_list(length=None)
         
+        available_items = []
         for item in items:
             try:
-                expiration_date = datetime.fromisoformat(item['expiration_date'])
-                days_left = (expiration_date - now).days
+                days_left = (datetime.fromisoformat(item['expiration_date']) - now).days
             except (ValueError, TypeError):
-                days_left = -1 # Treat invalid dates as expired
-            
-            # START: Modified to include 'inventory_item_id'
-            if days_left > 0 and item.get('quantity', 0) > 0:
-                available_items.append({
-                    'inventory_item_id': item['id'], # <-- CRITICAL ADDITION
-                    'name': item['name'],
-                    'quantity': item['quantity'],
-                    'unit': item['unit'],
-                    'category': item['category'],
-                    'days_left': days_left
-                })
-            # END: Modified
-        
-        # Sort by expiration date (items expiring soonest first)
-        available_items.sort(key=lambda x: x['days_left'])
+                continue # Skip malformed dates
+            available_items.append({
+                'inventory_item_id': item['id'],
+                'name': item['name'],
+                'quantity': item['quantity'],
+                'unit': item['unit'],
+                'days_left': days_left
+            })
         
         if not available_items:
             return {
@@ -593,102 +2246,45 @@ async def get_meal_suggestions(request: dict):
                 "recipes": []
             }
         
-        # START: Modified to include the new 'inventory_item_id' in the prompt
-        inventory_text = "\n".join([
-            f"- [id: {item['inventory_item_id']}] {item['name']} ({item['quantity']} {item['unit']}) - expires in {item['days_left']} days"
-            for item in available_items[:15]  # Limit to top 15 items
-        ])
-        # END: Modified
-        
-        # START: Updated AI prompt for full recipe details
-        prompt = f"""You are a creative chef assistant. Based on the available ingredients, suggest 3 delicious recipes.
-
-Available Ingredients (prioritized by expiration date):
-{inventory_text}
-
-User Preferences:
-- Meal Type: {meal_type if meal_type else "Any"}
-- Style/Cuisine: {style if style else "Any"}
-- Max Cooking Time: {max_time} minutes
-- Servings: {servings} people
-- Additional Preferences: {additional_prefs if additional_prefs else "None"}
-
-Requirements:
-1. Prioritize using ingredients that expire soonest from the "Available Ingredients" list.
-2. Each recipe should use at least 2-3 ingredients from the available list.
-3. Recipes must match the user's preferences and not exceed the "Max Cooking Time".
-4. Provide a *full* list of all ingredients required (both from inventory and new ones like oil, spices).
-5. Provide step-by-step cooking instructions.
-
-Return EXACTLY 3 recipe suggestions in this JSON format:
-{{
-  "recipes": [
-    {{
-      "name": "Recipe Name",
-      "servings": {servings},
-      "prep_time": <number in minutes>,
-      "cook_time": <number in minutes>,
-      "total_time": <prep_time + cook_time>,
-      "description": "Brief 1-sentence description",
-      "ingredients_used": ["name of ingredient1 from inventory", "name of ingredient2 from inventory"],
-      "ingredients": [
-        {{
-          "name": "Full ingredient name",
-          "quantity_required": <numeric amount>,
-          "unit": "e.g., g, ml, tbsp, each",
-          "inventory_item_id": "<The 'id' from the Available Ingredients list IF this item is from the inventory, otherwise null>"
-        }}
-      ],
-      "instructions": [
-        "Step 1 as a string.",
-        "Step 2 as a string.",
-        "..."
-      ]
-    }}
-  ]
-}}
-
-Example for 'ingredients' list:
-- If inventory has "[id: 123-abc] Chicken Breast", a recipe ingredient should be:
-  {{"name": "Chicken Breast", "quantity_required": 200, "unit": "g", "inventory_item_id": "123-abc"}}
-- If the recipe needs Olive Oil (which is not in the inventory list):
-  {{"name": "Olive Oil", "quantity_required": 1, "unit": "tbsp", "inventory_item_id": null}}
-
-Important: Total time must not exceed {max_time} minutes. Return ONLY valid JSON."""
-        # END: Updated AI prompt
-
-        response = await deepseek_client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "You are a creative chef that suggests recipes based on available ingredients. Always respond with valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=2500 # Increased max tokens to handle long instructions
-        )
-        
-        content = response.choices[0].message.content.strip()
-        
-        # Extract JSON from response
-        if '```json' in content:
-            content = content.split('```json')[1].split('```')[0].strip()
-        elif '```' in content:
-            content = content.split('```')[1].split('```')[0].strip()
+        available_items_count = await db.food_items.count_documents(available_query)
         
-        result = json.loads(content)
-        recipes = result.get("recipes", [])
+        if mode == "parallel":
+            recipes = await run_until_disconnect(
+                http_request, prompts.RECIPE_FANOUT,
+                generate_recipes_parallel(available_items, meal_type, style, max_time, servings, additional_prefs)
+            )
+        else:
+            prompt = prompts.recipes_prompt(available_items, meal_type, style, max_time, servings, additional_prefs)
+            result = await run_until_disconnect(
+                http_request, prompts.RECIPES,
+                complete_json(prompts.RECIPES, prompts.RECIPES_SYSTEM, prompt, temperature=0.7)
+            )
+            recipes = result.get("recipes", [])
+        annotate_ingredient_stock(recipes, available_items)
         
         return {
             "success": True,
             "recipes": recipes,
-            "available_items_count": len(available_items)
+            "available_items_count": available_items_count
         }
         
+    except HTTPException:
+        raise
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail="Failed to parse AI response")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Meal suggestion failed: {str(e)}")
 
+# Launcher. `python server.py` starts WEB_CONCURRENCY worker processes (default 1)
+# on HOST:PORT. With more than one worker, periodic jobs are coordinated through
+# the background-jobs lease and caches are kept in sync over the invalidation
+# channel; equivalently: WEB_CONCURRENCY=4 uvicorn server:app --workers 4
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    uvicorn.run(
+        "server:app" if WEB_CONCURRENCY > 1 else app,
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', '8001')),
+        workers=WEB_CONCURRENCY,
+        timeout_graceful_shutdown=SHUTDOWN_DRAIN_SECONDS
+    )
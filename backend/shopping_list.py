@@ -0,0 +1,138 @@
+from typing import Dict, Iterable, List, Optional
+
+import units
+from semantic_cache import normalize_food_name
+
+# Shopping list generation. Requirements (recipe ingredients and low-stock
+# thresholds) are merged per food, keyed by normalized name, and summed in the
+# unit of the first requirement wherever the units convert. What's in stock of
+# that food is allocated to its merged requirements in turn, so each amount is
+# counted once, and whatever is still missing goes on the list.
+
+LOW_STOCK = "low stock"
+
+class Need:
+    """Merged requirement for one food in one unit."""
+
+    def __init__(self, key: str, name: str, unit: Optional[str]):
+        self.key = key
+        self.name = name
+        self.unit = unit
+        self.quantity = 0.0
+        # Some requirement didn't say how much (any amount in stock covers it)
+        self.unspecified = False
+        self.sources: List[str] = []
+        self.inventory_item_ids: List[str] = []
+
+def convert_amount(quantity: float, from_unit: Optional[str], to_unit: Optional[str], food_name: str) -> Optional[float]:
+    """Like units.convert, but units that aren't known convert only to themselves."""
+    if (from_unit or "").strip().lower() == (to_unit or "").strip().lower():
+        return quantity
+    return units.convert(quantity, from_unit, to_unit, food_name)
+
+def as_amount(value) -> Optional[float]:
+    try:
+        return float(value) if value is not None and float(value) > 0 else None
+    except (TypeError, ValueError):
+        return None
+
+class Requirements:
+    """Collects requirements and merges those for the same food."""
+
+    def __init__(self, items_by_id: Dict[str, dict]):
+        self.items_by_id = items_by_id
+        self.needs: Dict[str, List[Need]] = {}
+
+    def key_for(self, name: str, inventory_item_id: Optional[str]) -> str:
+        # An ingredient linked to an inventory item is that item's food
+        item = self.items_by_id.get(inventory_item_id)
+        if item is not None and item.get("name_key"):
+            return item["name_key"]
+        return normalize_food_name(name)
+
+    def add(self, name: str, quantity, unit: Optional[str], source: str, inventory_item_id: Optional[str] = None):
+        key = self.key_for(name, inventory_item_id)
+        if not key:
+            return
+        amount = as_amount(quantity)
+        bucket = self.needs.setdefault(key, [])
+        need = None
+        for candidate in bucket:
+            if amount is None:
+                need = candidate
+                break
+            converted = convert_amount(amount, unit, candidate.unit, name)
+            if converted is not None:
+                need, amount = candidate, converted
+                break
+        if need is None:
+            need = Need(key, name, unit)
+            bucket.append(need)
+        if amount is None:
+            need.unspecified = True
+        else:
+            need.quantity += amount
+        if source not in need.sources:
+            need.sources.append(source)
+        if inventory_item_id in self.items_by_id and inventory_item_id not in need.inventory_item_ids:
+            need.inventory_item_ids.append(inventory_item_id)
+
+    def add_recipes(self, recipes: Iterable[dict]):
+        for recipe in recipes:
+            if not isinstance(recipe, dict):
+                continue
+            for ingredient in recipe.get("ingredients") or []:
+                if isinstance(ingredient, dict) and ingredient.get("name"):
+                    self.add(ingredient["name"], ingredient.get("quantity_required"), ingredient.get("unit"),
+                             recipe.get("name") or "recipe", ingredient.get("inventory_item_id"))
+
+    def all(self) -> List[Need]:
+        return [need for bucket in self.needs.values() for need in bucket]
+
+def allocate(need: Need, available: List[list]) -> float:
+    """Take up to need.quantity (in the need's unit) from unallocated stock entries [item, amount left]."""
+    taken = 0.0
+    for entry in available:
+        item, left = entry
+        if taken >= need.quantity - 1e-9:
+            break
+        if left <= 0:
+            continue
+        converted = convert_amount(left, item.get("unit"), need.unit, item.get("name") or need.name)
+        if not converted:
+            continue
+        used = min(converted, need.quantity - taken)
+        entry[1] = left * (1 - used / converted)
+        taken += used
+    return taken
+
+def build_shopping_list(needs: List[Need], stock: List[dict]) -> List[dict]:
+    """Missing amount of every need, given the usable items in stock (with name_key, name, quantity, unit)."""
+    stock_by_key: Dict[str, List[list]] = {}
+    for item in stock:
+        stock_by_key.setdefault(item.get("name_key"), []).append([item, as_amount(item.get("quantity")) or 0.0])
+
+    shopping_list = []
+    for need in needs:
+        available = stock_by_key.get(need.key, [])
+        in_stock = 0.0
+        if need.quantity > 0:
+            in_stock = allocate(need, available)
+            missing = need.quantity - in_stock
+            if missing <= 1e-9:
+                continue
+        elif not need.unspecified or any(item.get("quantity") for item, _ in available):
+            continue
+        else:
+            missing = None
+        shopping_list.append({
+            "name": need.name,
+            "name_key": need.key,
+            "quantity": round(missing, 3) if missing is not None else None,
+            "unit": need.unit,
+            "needed": round(need.quantity, 3) if need.quantity > 0 else None,
+            "in_stock": round(in_stock, 3),
+            "sources": need.sources,
+            "inventory_item_ids": need.inventory_item_ids,
+        })
+    return sorted(shopping_list, key=lambda entry: (entry["name_key"], entry["unit"] or ""))
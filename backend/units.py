@@ -0,0 +1,146 @@
+from functools import lru_cache
+from itertools import product
+from typing import Dict, Optional, Tuple
+
+from semantic_cache import normalize_food_name
+
+# Unit conversion for food quantities. Every known unit belongs to a dimension
+# (mass, volume or count) and is a fixed multiple of that dimension's base unit
+# (g, ml, each). Conversions between dimensions go through grams, using the
+# density (g/ml) or typical piece weight (g each) of the food when it is known.
+#
+# Food items store their quantity in its base unit (base_quantity/base_unit)
+# and, whenever it can be worked out, in grams (base_grams), so totals can be
+# summed by Mongo aggregations.
+
+MASS = "mass"
+VOLUME = "volume"
+COUNT = "count"
+BASE_UNITS = {MASS: "g", VOLUME: "ml", COUNT: "each"}
+
+# unit: (dimension, amount of the base unit); US customary volumes
+UNITS: Dict[str, Tuple[str, float]] = {
+    "mg": (MASS, 0.001),
+    "g": (MASS, 1.0),
+    "kg": (MASS, 1000.0),
+    "oz": (MASS, 28.349523125),
+    "lb": (MASS, 453.59237),
+    "ml": (VOLUME, 1.0),
+    "cl": (VOLUME, 10.0),
+    "dl": (VOLUME, 100.0),
+    "l": (VOLUME, 1000.0),
+    "tsp": (VOLUME, 4.92892159375),
+    "tbsp": (VOLUME, 14.78676478125),
+    "fl oz": (VOLUME, 29.5735295625),
+    "cup": (VOLUME, 236.5882365),
+    "pint": (VOLUME, 473.176473),
+    "quart": (VOLUME, 946.352946),
+    "gallon": (VOLUME, 3785.411784),
+    "each": (COUNT, 1.0),
+    "dozen": (COUNT, 12.0),
+}
+
+UNIT_ALIASES = {
+    "milligram": "mg", "gram": "g", "gr": "g", "grams": "g", "kilogram": "kg", "kilo": "kg", "kgs": "kg",
+    "ounce": "oz", "ounces": "oz", "lbs": "lb", "pound": "lb", "pounds": "lb",
+    "milliliter": "ml", "millilitre": "ml", "mls": "ml", "liter": "l", "litre": "l", "ltr": "l", "lt": "l",
+    "teaspoon": "tsp", "tsps": "tsp", "tablespoon": "tbsp", "tbs": "tbsp", "tbsps": "tbsp", "tblsp": "tbsp",
+    "floz": "fl oz", "fluid ounce": "fl oz", "fluid ounces": "fl oz",
+    "cups": "cup", "c": "cup", "pt": "pint", "qt": "quart", "gal": "gallon",
+    "ea": "each", "piece": "each", "pc": "each", "pcs": "each", "item": "each", "unit": "each", "whole": "each",
+    # Packages are counted like pieces
+    "can": "each", "bottle": "each", "jar": "each", "pack": "each", "package": "each", "bag": "each",
+    "box": "each", "carton": "each", "bunch": "each", "head": "each", "loaf": "each", "clove": "each",
+    "slice": "each", "stick": "each", "container": "each", "tub": "each",
+}
+
+# (from, to): factor, for every pair of units in the same dimension
+CONVERSION_TABLE: Dict[Tuple[str, str], float] = {
+    (source, target): UNITS[source][1] / UNITS[target][1]
+    for source, target in product(UNITS, UNITS)
+    if UNITS[source][0] == UNITS[target][0]
+}
+
+# Density in g/ml by food (normalized, singular words); most specific first
+DENSITY_HINTS = [
+    ("ice cream", 0.55), ("sour cream", 1.0), ("cream cheese", 1.0), ("peanut butter", 1.08),
+    ("olive oil", 0.91), ("brown sugar", 0.93), ("powdered sugar", 0.56), ("maple syrup", 1.33),
+    ("oil", 0.92), ("honey", 1.42), ("syrup", 1.33), ("molasses", 1.4), ("jam", 1.33),
+    ("milk", 1.03), ("buttermilk", 1.03), ("cream", 1.01), ("yogurt", 1.05), ("yoghurt", 1.05),
+    ("butter", 0.96), ("cheese", 0.45), ("flour", 0.53), ("sugar", 0.85), ("salt", 1.2),
+    ("rice", 0.85), ("oat", 0.41), ("cereal", 0.15), ("coffee", 0.4), ("cocoa", 0.42),
+    ("water", 1.0), ("juice", 1.04), ("broth", 1.0), ("stock", 1.0), ("soup", 1.0),
+    ("ketchup", 1.15), ("mayonnaise", 0.91), ("mustard", 1.05), ("sauce", 1.05), ("vinegar", 1.01),
+    ("wine", 0.99), ("beer", 1.01), ("soda", 1.04), ("egg", 1.03),
+]
+
+# Typical weight of one piece in grams; most specific first
+PIECE_WEIGHT_HINTS = [
+    ("chicken breast", 174.0), ("chicken thigh", 115.0), ("bell pepper", 120.0), ("sweet potato", 130.0),
+    ("garlic clove", 5.0), ("egg", 50.0), ("banana", 118.0), ("apple", 182.0), ("orange", 131.0),
+    ("lemon", 84.0), ("lime", 67.0), ("avocado", 200.0), ("peach", 150.0), ("pear", 178.0),
+    ("mango", 200.0), ("kiwi", 75.0), ("potato", 213.0), ("onion", 110.0), ("tomato", 123.0),
+    ("carrot", 61.0), ("cucumber", 300.0), ("zucchini", 200.0), ("garlic", 50.0), ("lettuce", 600.0),
+    ("cabbage", 900.0), ("broccoli", 350.0), ("cauliflower", 575.0), ("pepper", 120.0), ("bagel", 100.0),
+]
+
+def normalize_unit(unit: Optional[str]) -> Optional[str]:
+    """Canonical spelling of a unit ("Lbs." -> "lb", "liters" -> "l"), None if it isn't known."""
+    text = " ".join((unit or "").lower().replace(".", " ").split())
+    if text in UNITS:
+        return text
+    if text in UNIT_ALIASES:
+        return UNIT_ALIASES[text]
+    if text.endswith("es") and text[:-2] in UNIT_ALIASES:
+        return UNIT_ALIASES[text[:-2]]
+    if text.endswith("s") and (text[:-1] in UNITS or text[:-1] in UNIT_ALIASES):
+        return UNIT_ALIASES.get(text[:-1], text[:-1])
+    return None
+
+def dimension_of(unit: Optional[str]) -> Optional[str]:
+    unit = normalize_unit(unit)
+    return UNITS[unit][0] if unit else None
+
+@lru_cache(maxsize=4096)
+def food_hints(name: str) -> Tuple[Optional[float], Optional[float]]:
+    """(density in g/ml, grams per piece) for a food name, None where unknown."""
+    words = f" {normalize_food_name(name or '')} "
+    density = next((value for phrase, value in DENSITY_HINTS if f" {phrase} " in words), None)
+    piece_grams = next((value for phrase, value in PIECE_WEIGHT_HINTS if f" {phrase} " in words), None)
+    return density, piece_grams
+
+def grams_per_unit(unit: str, food_name: Optional[str]) -> Optional[float]:
+    """Grams in one of a (normalized) unit of the food, None if that needs a hint we don't have."""
+    dimension, amount = UNITS[unit]
+    if dimension == MASS:
+        return amount
+    density, piece_grams = food_hints(food_name or "")
+    if dimension == VOLUME:
+        return amount * density if density else None
+    return amount * piece_grams if piece_grams else None
+
+def convert(quantity: float, from_unit: str, to_unit: str, food_name: Optional[str] = None) -> Optional[float]:
+    """quantity in from_unit expressed in to_unit, or None if the units can't be converted for this food."""
+    source, target = normalize_unit(from_unit), normalize_unit(to_unit)
+    if source is None or target is None:
+        return None
+    factor = CONVERSION_TABLE.get((source, target))
+    if factor is not None:
+        return quantity * factor
+    source_grams, target_grams = grams_per_unit(source, food_name), grams_per_unit(target, food_name)
+    if source_grams is None or target_grams is None:
+        return None
+    return quantity * source_grams / target_grams
+
+def base_fields(quantity: float, unit: Optional[str], food_name: Optional[str]) -> Dict[str, Optional[float]]:
+    """base_quantity/base_unit/base_grams to store alongside an item's quantity (None for unknown units)."""
+    source = normalize_unit(unit)
+    if source is None:
+        return {"base_quantity": None, "base_unit": None, "base_grams": None}
+    dimension, amount = UNITS[source]
+    grams = grams_per_unit(source, food_name)
+    return {
+        "base_quantity": round(quantity * amount, 6),
+        "base_unit": BASE_UNITS[dimension],
+        "base_grams": round(quantity * grams, 6) if grams is not None else None,
+    }
@@ -0,0 +1,103 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# Write-behind buffer for quantity changes. Changes to the same item within a
+# short window are merged (an absolute set followed by increments collapses to
+# one set; increments add up) and all pending items are written together by a
+# single flush. Callers wait for the flush that contains their change, so an
+# acknowledged change is always durable and visible to the caller's next read.
+# The flush returns the updated items by id; an item whose write failed maps to
+# the exception its callers get, so one bad item doesn't fail the whole batch.
+
+class PendingQuantity:
+    """Merged quantity change for one item."""
+
+    def __init__(self):
+        self.absolute: Optional[float] = None
+        self.delta = 0.0
+        self.waiters: List[asyncio.Future] = []
+
+class QuantityWriteBuffer:
+    """Coalesces per-item quantity changes and flushes them in batches."""
+
+    def __init__(self, window_seconds: float, max_pending: int,
+                 flush: Callable[[Dict[str, PendingQuantity]], Awaitable[Dict[str, object]]]):
+        self.window_seconds = window_seconds
+        self.max_pending = max_pending
+        self.flush_changes = flush
+        self.pending: Dict[str, PendingQuantity] = {}
+        self.flush_task: Optional[asyncio.Task] = None
+        self.writes = set()
+        self.write_lock = asyncio.Lock()
+        self.stats = {"changes": 0, "flushes": 0, "items_written": 0}
+
+    async def set_quantity(self, item_id: str, quantity: float) -> Optional[dict]:
+        """Buffer an absolute quantity; returns the item after the flush (None if it doesn't exist)."""
+        change = self.pending.setdefault(item_id, PendingQuantity())
+        change.absolute, change.delta = quantity, 0.0
+        return await self.wait_for_flush(change)
+
+    async def add_quantity(self, item_id: str, delta: float) -> Optional[dict]:
+        """Buffer an increment (negative to consume); returns the item after the flush."""
+        change = self.pending.setdefault(item_id, PendingQuantity())
+        change.delta += delta
+        return await self.wait_for_flush(change)
+
+    async def wait_for_flush(self, change: PendingQuantity) -> Optional[dict]:
+        waiter = asyncio.get_running_loop().create_future()
+        change.waiters.append(waiter)
+        self.stats["changes"] += 1
+        if len(self.pending) >= self.max_pending:
+            self.track(asyncio.create_task(self.write(self.take_pending())))
+        elif self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_after_window())
+            self.track(self.flush_task)
+        # The flush must finish even if this request is abandoned
+        return await asyncio.shield(waiter)
+
+    def take_pending(self) -> Dict[str, PendingQuantity]:
+        batch, self.pending = self.pending, {}
+        return batch
+
+    def track(self, task: asyncio.Task):
+        self.writes.add(task)
+        task.add_done_callback(self.writes.discard)
+
+    async def flush_after_window(self):
+        await asyncio.sleep(self.window_seconds)
+        self.flush_task = None
+        await self.write(self.take_pending())
+
+    async def write(self, batch: Dict[str, PendingQuantity]):
+        if not batch:
+            return
+        # One flush at a time so batches for the same item are applied in order
+        async with self.write_lock:
+            try:
+                items = await self.flush_changes(batch)
+            except Exception as e:
+                for change in batch.values():
+                    for waiter in change.waiters:
+                        if not waiter.done():
+                            waiter.set_exception(e)
+                return
+        self.stats["flushes"] += 1
+        self.stats["items_written"] += len(batch)
+        for item_id, change in batch.items():
+            result = items.get(item_id)
+            for waiter in change.waiters:
+                if waiter.done():
+                    continue
+                if isinstance(result, Exception):
+                    waiter.set_exception(result)
+                else:
+                    waiter.set_result(result)
+
+    async def close(self):
+        """Flush everything still buffered (used on shutdown)."""
+        if self.flush_task is not None:
+            # Still sleeping out its window: flush now instead
+            self.flush_task.cancel()
+            self.flush_task = None
+        await asyncio.gather(*self.writes, return_exceptions=True)
+        await self.write(self.take_pending())
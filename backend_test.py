@@ -239,6 +239,57 @@ class FoodManagementTester:
         except Exception as e:
             self.log_test("Get Calendar Events", False, f"Request failed: {str(e)}")
     
+    def test_calendar_window_and_ics_export(self):
+        """Test GET /api/calendar-events?from=&to= and GET /api/calendar-events/export.ics"""
+        try:
+            today = datetime.utcnow().date()
+            window = {"from": today.isoformat(), "to": (today + timedelta(days=30)).isoformat()}
+            response = self.session.get(f"{API_BASE}/calendar-events", params=window)
+            if response.status_code != 200:
+                self.log_test("Calendar Window Query", False, f"Status {response.status_code}: {response.text}")
+                return
+            events = response.json()
+            outside = [e for e in events if not (window["from"] <= e["event_date"][:10] <= window["to"])]
+            if outside:
+                self.log_test("Calendar Window Query", False, f"{len(outside)} events outside requested window")
+            else:
+                self.log_test("Calendar Window Query", True, f"Retrieved {len(events)} events within window")
+            
+            bad_response = self.session.get(f"{API_BASE}/calendar-events", params={"from": "not-a-date"})
+            self.log_test("Calendar Window Validation", bad_response.status_code == 400,
+                        f"Invalid bound returned status {bad_response.status_code}")
+            
+            ics_response = self.session.get(f"{API_BASE}/calendar-events/export.ics", params=window)
+            body = ics_response.text
+            if ics_response.status_code == 200 and body.startswith("BEGIN:VCALENDAR") and body.rstrip().endswith("END:VCALENDAR"):
+                self.log_test("iCalendar Export", True, f"Exported {body.count('BEGIN:VEVENT')} VEVENTs")
+            else:
+                self.log_test("iCalendar Export", False, f"Status {ics_response.status_code}: {body[:200]}")
+        except Exception as e:
+            self.log_test("Calendar Window Query", False, f"Request failed: {str(e)}")
+    
+    def test_differential_sync(self):
+        """Test GET /api/sync?since=<cursor> returns only changes after the cursor"""
+        try:
+            response = self.session.get(f"{API_BASE}/sync")
+            if response.status_code != 200:
+                self.log_test("Differential Sync", False, f"Status {response.status_code}: {response.text}")
+                return
+            cursor = response.json()["cursor"]
+            
+            create_response = self.session.post(f"{API_BASE}/food-items", json={"name": "Sync Test Yogurt", "category": "dairy", "quantity": 1, "unit": "each", "storage_condition": "refrigerated"})
+            item_id = create_response.json()["id"]
+            self.session.delete(f"{API_BASE}/food-items/{item_id}")
+            
+            delta = self.session.get(f"{API_BASE}/sync", params={"since": cursor}).json()
+            deleted_ids = delta["deleted"]["food_items"]
+            if delta["cursor"] > cursor and item_id in deleted_ids:
+                self.log_test("Differential Sync", True, f"Cursor {cursor} -> {delta['cursor']}, tombstone recorded for deleted item")
+            else:
+                self.log_test("Differential Sync", False, f"Unexpected delta: {delta}")
+        except Exception as e:
+            self.log_test("Differential Sync", False, f"Request failed: {str(e)}")
+    
     def test_dashboard_stats(self):
         """Test GET /api/dashboard/stats"""
         try:
@@ -584,9 +635,15 @@ class FoodManagementTester:
         self.test_calendar_events()
         time.sleep(0.5)
         
+        self.test_calendar_window_and_ics_export()
+        time.sleep(0.5)
+        
         self.test_dashboard_stats()
         time.sleep(0.5)
         
+        self.test_differential_sync()
+        time.sleep(0.5)
+        
         self.test_delete_food_item()
         
         # Print summary
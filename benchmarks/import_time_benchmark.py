@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark for the backend
+Runs `python -X importtime -c "import server"` in fresh interpreters, reports
+the slowest top-level imports, and compares the median against the tracked
+baseline in import_time_baseline.json so cold-start regressions show up.
+
+Usage: python import_time_benchmark.py [--update-baseline]
+Exits non-zero if the import got more than TOLERANCE slower than the baseline
+or a module that should be imported lazily is imported at startup.
+"""
+
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_time_baseline.json")
+
+ROUNDS = 7
+TOLERANCE = 0.25
+TOP_MODULES = 10
+
+# Only needed once the app is serving (see the note in ai_router.py)
+LAZY_MODULES = ["openai", "httpx"]
+
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def profile_import() -> List[Tuple[str, int, int]]:
+    """(module, depth, cumulative µs) for every module imported by `import server`, in import order."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "DEEPSEEK_API_KEY": os.environ.get("DEEPSEEK_API_KEY", "benchmark")},
+        capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            modules.append((match.group(4), len(match.group(3)) // 2, int(match.group(2))))
+    return modules
+
+def direct_imports(modules: List[Tuple[str, int, int]]) -> Dict[str, float]:
+    """Cumulative ms of each module imported by server itself."""
+    # -X importtime lists a module after everything it imported, so server's
+    # own imports are the depth-1 entries right before it
+    position = next(index for index, (name, depth, _) in enumerate(modules) if name == "server" and depth == 0)
+    children = {}
+    for name, depth, cumulative in reversed(modules[:position]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children[name] = cumulative / 1000
+    return children
+
+def main():
+    update_baseline = "--update-baseline" in sys.argv[1:]
+    profile_import()  # Discarded: compiles .pyc files and warms the OS file cache
+
+    totals = []
+    per_module: Dict[str, List[float]] = {}
+    imported = set()
+    for _ in range(ROUNDS):
+        modules = profile_import()
+        imported.update(name.split(".")[0] for name, _, _ in modules)
+        totals.append(next(cumulative for name, _, cumulative in modules if name == "server") / 1000)
+        for name, ms in direct_imports(modules).items():
+            per_module.setdefault(name, []).append(ms)
+    total = statistics.median(totals)
+    medians = {name: statistics.median(values) for name, values in per_module.items()}
+
+    print(f"⏱️  import server: {total:.1f} ms median over {ROUNDS} fresh interpreters (min {min(totals):.1f}, max {max(totals):.1f})")
+    print("=" * 60)
+    for name, ms in sorted(medians.items(), key=lambda entry: -entry[1])[:TOP_MODULES]:
+        print(f"{name:<40} {ms:9.1f} ms")
+    print("=" * 60)
+
+    failures = []
+    eager = [name for name in LAZY_MODULES if name in imported]
+    if eager:
+        failures.append(f"imported at startup but should be lazy: {', '.join(eager)}")
+
+    if update_baseline:
+        with open(BASELINE_PATH, "w") as handle:
+            json.dump({"python": sys.version.split()[0], "import_ms": round(total, 1)}, handle, indent=2)
+            handle.write("\n")
+        print(f"📝 Baseline updated to {total:.1f} ms")
+    elif os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as handle:
+            baseline = json.load(handle)["import_ms"]
+        change = total / baseline - 1
+        print(f"📊 Baseline {baseline:.1f} ms, change {change:+.0%}")
+        if change > TOLERANCE:
+            failures.append(f"import is {change:.0%} slower than the baseline (tolerance {TOLERANCE:.0%})")
+    else:
+        print("No baseline yet; run with --update-baseline to record one")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ Import time within budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Prompt token measurement harness
+Runs every AI call site's prompt through complete_json against a stubbed
+DeepSeek client and reports prompt-token reduction versus the original
+verbose prompts. Run it on every prompt change.
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark")
+
+import prompts
+import server
+
+TODAY = datetime.utcnow()
+TODAY_ISO = TODAY.isoformat().split('T')[0]
+
+SAMPLE_ITEM = {
+    "id": "3f2b9c1e-6a0d-4a57-9b53-2f0e4e1d9a10",
+    "name": "Chicken Breast",
+    "category": "meat",
+    "quantity": 2.0,
+    "unit": "lbs",
+    "storage_condition": "refrigerated",
+    "expiration_date": (TODAY + timedelta(days=2)).isoformat().split('T')[0],
+    "notes": "Family pack",
+    "emoji": "🍗",
+}
+
+SAMPLE_INVENTORY = [
+    {"inventory_item_id": f"item-{i:02d}-{'x' * 28}", "name": name, "quantity": qty, "unit": unit, "days_left": i + 1}
+    for i, (name, qty, unit) in enumerate([
+        ("Chicken Breast", 2, "lbs"), ("Spinach", 1, "each"), ("Greek Yogurt", 32, "oz"),
+        ("Bell Peppers", 3, "each"), ("Cheddar Cheese", 8, "oz"), ("Eggs", 12, "each"),
+        ("Mushrooms", 0.5, "lbs"), ("Tortillas", 10, "each"), ("Milk", 1, "gallon"),
+        ("Carrots", 2, "lbs"), ("Ground Beef", 1, "lbs"), ("Rice", 2, "kg"),
+        ("Tomatoes", 4, "each"), ("Onions", 3, "each"), ("Basil", 1, "each"),
+    ])
+]
+
+BATCH_ITEMS = [
+    {"id": f"item-{i:02d}-{'x' * 28}", "name": name, "category": category, "quantity": 1, "unit": "each",
+     "storage_condition": "refrigerated", "expiration_date": SAMPLE_ITEM["expiration_date"]}
+    for i, (name, category) in enumerate([("Whole Milk", "dairy"), ("Greek Yogurt", "dairy"), ("Cheddar Cheese", "dairy"), ("Chicken Breast", "meat")])
+]
+BATCH_INSTRUCTION = "I used up all the dairy and moved the chicken to the freezer"
+
+# Original prompts, kept verbatim (minus whitespace) as the measurement baseline
+def legacy_shelf_life_prompt(food_name, category, storage_condition):
+    return f"""Analyze this food item based on its intended storage condition and provide structured information:
+Food: {food_name}
+Intended Storage: {storage_condition}
+{f"Suggested Category: {category}" if category else ""}
+
+Return a JSON object with:
+{{
+    "category": "produce|dairy|meat|packaged|frozen|other",
+    "shelf_life_days": <number of days, **specifically for the given 'Intended Storage'**>,
+    "storage_recommendation": "pantry|refrigerated|frozen|room_temp",
+    "emoji": "<single most appropriate emoji for this food>",
+    "tips": "brief storage tip"
+}}
+
+Example: If Food is "Chicken Breast" and Intended Storage is "frozen", shelf_life_days should be 90-365. If Intended Storage is "refrigerated", it should be 1-2.
+
+Be concise and accurate. The 'shelf_life_days' MUST match the 'Intended Storage' provided."""
+
+def legacy_item_update_prompt(item, instruction):
+    day = lambda delta: (TODAY + timedelta(days=delta)).isoformat().split('T')[0]
+    return f"""You are helping update a food item based on a user's instruction.
+
+Current Date: {TODAY_ISO}
+
+Current food item data:
+- Name: {item['name']}
+- Category: {item['category']}
+- Quantity: {item['quantity']}
+- Unit: {item['unit']}
+- Storage Condition: {item['storage_condition']}
+- Expiration Date: {item['expiration_date']}
+- Notes: {item['notes']}
+- Emoji: {item['emoji']}
+
+User instruction: "{instruction}"
+
+Based on this instruction, calculate and return ONLY the updated values that should change. Return a JSON object with the fields that need updating.
+**Important**: For `expiration_date`, always return the new, absolute date in **`YYYY-MM-DD`** format. Calculate it based on the **Current Date** ({TODAY_ISO}).
+
+Examples:
+- "I only ate half of this" → {{"quantity": {item['quantity'] / 2}}}
+- "Move this to the freezer" → {{"storage_condition": "frozen"}}
+- "Change name to leftover chicken" → {{"name": "leftover chicken"}}
+- "This expires in 3 days" → {{"expiration_date": "{day(3)}"}}
+- "This expires tomorrow" → {{"expiration_date": "{day(1)}"}}
+- "This is rotten" or "It expired yesterday" → {{"expiration_date": "{day(-1)}"}}
+- "Add 2 days to the expiration date" → {{"expiration_date": "{day(4)}"}}
+
+Available categories: produce, dairy, meat, packaged, frozen, other
+Available storage conditions: pantry, refrigerated, frozen, room_temp
+Available units: each, lbs, oz, kg, g, gallon, liter
+
+Return ONLY a JSON object with the fields to update. Do not include fields that don't need to change."""
+
+def legacy_batch_update_prompt(items, instruction):
+    inventory_text = "\n".join(
+        f"- {item['id']} | {item['name']} | {item['quantity']} {item['unit']} | {item['storage_condition']} | {item['expiration_date']}"
+        for item in items
+    )
+    return f"""Apply the user's instruction to the food inventory below.
+
+Current Date: {TODAY_ISO}
+
+Items (id | name | quantity unit | storage | expires):
+{inventory_text}
+
+User instruction: "{instruction}"
+
+Return a JSON object {{"updates": [{{"id": "<item id>", "fields": {{<only the fields that change>}}}}]}}.
+Only include items the instruction refers to. Quantities are absolute new values.
+`expiration_date` must be an absolute YYYY-MM-DD date calculated from the Current Date.
+Categories: produce, dairy, meat, packaged, frozen, other
+Storage conditions: pantry, refrigerated, frozen, room_temp
+Units: each, lbs, oz, kg, g, gallon, liter
+
+Return ONLY valid JSON."""
+
+def legacy_recipes_prompt(items, meal_type, style, max_time, servings, additional_prefs):
+    inventory_text = "\n".join([
+        f"- [id: {item['inventory_item_id']}] {item['name']} ({item['quantity']} {item['unit']}) - expires in {item['days_left']} days"
+        for item in items
+    ])
+    return f"""You are a creative chef assistant. Based on the available ingredients, suggest 3 delicious recipes.
+
+Available Ingredients (prioritized by expiration date):
+{inventory_text}
+
+User Preferences:
+- Meal Type: {meal_type if meal_type else "Any"}
+- Style/Cuisine: {style if style else "Any"}
+- Max Cooking Time: {max_time} minutes
+- Servings: {servings} people
+- Additional Preferences: {additional_prefs if additional_prefs else "None"}
+
+Requirements:
+1. Prioritize using ingredients that expire soonest from the "Available Ingredients" list.
+2. Each recipe should use at least 2-3 ingredients from the available list.
+3. Recipes must match the user's preferences and not exceed the "Max Cooking Time".
+4. Provide a *full* list of all ingredients required (both from inventory and new ones like oil, spices).
+5. Provide step-by-step cooking instructions.
+
+Return EXACTLY 3 recipe suggestions in this JSON format:
+{{
+  "recipes": [
+    {{
+      "name": "Recipe Name",
+      "servings": {servings},
+      "prep_time": <number in minutes>,
+      "cook_time": <number in minutes>,
+      "total_time": <prep_time + cook_time>,
+      "description": "Brief 1-sentence description",
+      "ingredients_used": ["name of ingredient1 from inventory", "name of ingredient2 from inventory"],
+      "ingredients": [
+        {{
+          "name": "Full ingredient name",
+          "quantity_required": <numeric amount>,
+          "unit": "e.g., g, ml, tbsp, each",
+          "inventory_item_id": "<The 'id' from the Available Ingredients list IF this item is from the inventory, otherwise null>"
+        }}
+      ],
+      "instructions": [
+        "Step 1 as a string.",
+        "Step 2 as a string.",
+        "..."
+      ]
+    }}
+  ]
+}}
+
+Example for 'ingredients' list:
+- If inventory has "[id: 123-abc] Chicken Breast", a recipe ingredient should be:
+  {{"name": "Chicken Breast", "quantity_required": 200, "unit": "g", "inventory_item_id": "123-abc"}}
+- If the recipe needs Olive Oil (which is not in the inventory list):
+  {{"name": "Olive Oil", "quantity_required": 1, "unit": "tbsp", "inventory_item_id": null}}
+
+Important: Total time must not exceed {max_time} minutes. Return ONLY valid JSON."""
+
+LEGACY_SYSTEM_PROMPTS = {
+    prompts.SHELF_LIFE: "You are a food safety and storage expert. Provide accurate, concise information in JSON format only.",
+    prompts.ITEM_UPDATE: "You are a helpful assistant that interprets food-related instructions and returns JSON updates. Always respond with valid JSON only.",
+    prompts.BATCH_UPDATE: "You are a helpful assistant that interprets food-related instructions and returns JSON updates. Always respond with valid JSON only.",
+    prompts.RECIPES: "You are a creative chef that suggests recipes based on available ingredients. Always respond with valid JSON only.",
+}
+LEGACY_MAX_TOKENS = {prompts.SHELF_LIFE: 500, prompts.ITEM_UPDATE: 500, prompts.BATCH_UPDATE: 1000, prompts.RECIPES: 2500}
+
+STUB_REPLIES = {
+    prompts.SHELF_LIFE: '{"category": "meat", "shelf_life_days": 2, "storage_recommendation": "refrigerated", "emoji": "🍗", "tips": "Keep sealed"}',
+    prompts.ITEM_UPDATE: '{"quantity": 1.0}',
+    prompts.BATCH_UPDATE: '{"updates": []}',
+    prompts.RECIPES: '{"recipes": []}',
+}
+
+class StubCompletions:
+    """Stands in for the OpenAI client's chat.completions and reports estimated usage."""
+
+    def __init__(self):
+        self.reply = ""
+
+    async def create(self, model, messages, temperature, max_tokens):
+        prompt_text = "".join(message["content"] for message in messages)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.reply), finish_reason="stop")],
+            usage=SimpleNamespace(prompt_tokens=prompts.estimate_tokens(prompt_text), completion_tokens=prompts.estimate_tokens(self.reply)),
+        )
+
+async def main():
+    stub = StubCompletions()
+    server.model_router.use_client(SimpleNamespace(chat=SimpleNamespace(completions=stub)))
+    prompts.token_usage.reset()
+    
+    cases = [
+        (prompts.SHELF_LIFE, prompts.SHELF_LIFE_SYSTEM,
+         prompts.shelf_life_prompt("Chicken Breast", None, "refrigerated"),
+         legacy_shelf_life_prompt("Chicken Breast", None, "refrigerated"), None),
+        (prompts.ITEM_UPDATE, prompts.UPDATE_SYSTEM,
+         prompts.item_update_prompt(SAMPLE_ITEM, "I only ate half of this", TODAY_ISO),
+         legacy_item_update_prompt(SAMPLE_ITEM, "I only ate half of this"), None),
+        (prompts.BATCH_UPDATE, prompts.UPDATE_SYSTEM,
+         prompts.batch_update_prompt(BATCH_ITEMS, BATCH_INSTRUCTION, TODAY_ISO),
+         legacy_batch_update_prompt(BATCH_ITEMS, BATCH_INSTRUCTION), len(BATCH_ITEMS)),
+        (prompts.RECIPES, prompts.RECIPES_SYSTEM,
+         prompts.recipes_prompt(SAMPLE_INVENTORY, "dinner", "Mexican", 45, 2, ""),
+         legacy_recipes_prompt(SAMPLE_INVENTORY, "dinner", "Mexican", 45, 2, ""), None),
+    ]
+    
+    print("📏 Prompt tokens per AI call (estimated, ~4 chars/token)")
+    print("=" * 78)
+    print(f"{'task':<14}{'legacy prompt':>15}{'current prompt':>16}{'reduction':>11}{'max_tokens':>22}")
+    for task, system_prompt, prompt, legacy_prompt, item_count in cases:
+        stub.reply = STUB_REPLIES[task]
+        await server.complete_json(task, system_prompt, prompt, temperature=0.3,
+                                   max_tokens=prompts.token_budget(task, item_count))
+        current = prompts.token_usage.usage[task]["prompt_tokens"]
+        legacy = prompts.estimate_tokens(LEGACY_SYSTEM_PROMPTS[task] + legacy_prompt)
+        budget = f"{LEGACY_MAX_TOKENS[task]} -> {prompts.token_budget(task, item_count)}"
+        print(f"{task:<14}{legacy:>15}{current:>16}{(1 - current / legacy) * 100:>10.1f}%{budget:>22}")
+    print("=" * 78)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for list endpoint serialization
+Compares per-request CPU time of the default response_model path against the
+FAST_JSON_RESPONSES (orjson) path for a large inventory
+"""
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark")
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from server import FoodItem
+
+ITEM_COUNT = 10_000
+ROUNDS = 20
+
+def make_documents(count: int) -> List[dict]:
+    """Build projected food item documents shaped like the food_items collection."""
+    now = datetime.utcnow()
+    categories = ["produce", "dairy", "meat", "packaged", "frozen", "other"]
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"Food item {i}",
+            "category": categories[i % len(categories)],
+            "quantity": float(i % 7 + 1),
+            "unit": "each",
+            "storage_condition": "refrigerated",
+            "purchase_date": now.isoformat(),
+            "expiration_date": (now + timedelta(days=i % 30)).isoformat(),
+            "current_state": "raw",
+            "notes": "Benchmark item",
+            "emoji": "🥕",
+            "storage_tips": "Keep cold",
+            "created_at": now.isoformat(),
+        }
+        for i in range(count)
+    ]
+
+async def default_path(field, documents: List[dict]) -> bytes:
+    """response_model validation + jsonable_encoder + json.dumps, as FastAPI does."""
+    content = await serialize_response(field=field, response_content=documents)
+    return JSONResponse(content).body
+
+async def fast_path(field, documents: List[dict]) -> bytes:
+    """Direct orjson serialization of the trusted documents."""
+    return ORJSONResponse(documents).body
+
+async def measure(name: str, serializer, field, documents: List[dict]) -> float:
+    await serializer(field, documents)  # warm up
+    start = time.process_time()
+    for _ in range(ROUNDS):
+        body = await serializer(field, documents)
+    per_request_ms = (time.process_time() - start) / ROUNDS * 1000
+    print(f"{name:<28} {per_request_ms:8.2f} ms CPU/request  ({len(body) / 1024:.0f} KiB)")
+    return per_request_ms
+
+async def main():
+    documents = make_documents(ITEM_COUNT)
+    field = create_response_field(name="response", type_=List[FoodItem])
+    
+    print(f"📊 Serializing {ITEM_COUNT} food items, {ROUNDS} rounds")
+    print("=" * 60)
+    baseline = await measure("response_model (default)", default_path, field, documents)
+    fast = await measure("ORJSONResponse (fast path)", fast_path, field, documents)
+    print("=" * 60)
+    print(f"⚡ Speed-up: {baseline / fast:.1f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Local SMTP debugging server and HTTP sink for notification delivery
+Receives the emails and webhook calls sent by the notification outbox workers,
+prints them, and lists everything received at GET /received on the HTTP port.
+Webhook failures can be simulated to exercise retry and backoff.
+
+Example - deliver to both, with the first two webhook calls failing:
+    python notification_sink_server.py --smtp-port 8025 --http-port 9200 --fail-webhooks 2
+    NOTIFICATION_EMAIL_TO=me@example.com SMTP_HOST=127.0.0.1 SMTP_PORT=8025 \
+    NOTIFICATION_WEBHOOK_URLS=http://127.0.0.1:9200/webhook NOTIFICATION_RETRY_BASE_SECONDS=2 \
+    uvicorn server:app --port 8001
+    curl localhost:9200/received
+"""
+
+import argparse
+import json
+import socketserver
+import threading
+from email import message_from_bytes, policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+received = {"emails": [], "webhooks": []}
+received_lock = threading.Lock()
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages from smtplib (no auth, no TLS)."""
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 food-guard sink ESMTP")
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+            if verb == "EHLO":
+                self.reply("250-food-guard sink")
+                self.reply("250 8BITMIME")
+            elif verb == "HELO":
+                self.reply("250 food-guard sink")
+            elif verb == "MAIL":
+                sender, recipients = command.split(":", 1)[1].strip(), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command.split(":", 1)[1].strip().strip("<>"))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                self.receive_message(sender, recipients)
+                self.reply("250 OK: queued")
+            elif verb == "RSET":
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif verb == "NOOP":
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def receive_message(self, sender, recipients):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b".\r\n", b".\n"):
+                break
+            lines.append(line[1:] if line.startswith(b"..") else line)
+        message = message_from_bytes(b"".join(lines), policy=policy.default)
+        email = {"from": sender, "to": recipients, "subject": message["Subject"], "body": message.get_content()}
+        with received_lock:
+            received["emails"].append(email)
+        print(f"📧 email to {', '.join(recipients)}: {email['subject']}\n{email['body']}")
+
+class SinkHandler(BaseHTTPRequestHandler):
+    failures_left = 0
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/received":
+            with received_lock:
+                self.send_json(200, received)
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with received_lock:
+            if SinkHandler.failures_left > 0:
+                SinkHandler.failures_left -= 1
+                self.send_json(503, {"error": "simulated failure"})
+                return
+            received["webhooks"].append({"path": self.path, "body": body})
+        print(f"🪝 webhook {self.path}: {len(body.get('notifications', []))} notification(s)")
+        self.send_json(200, {"ok": True})
+
+    def do_DELETE(self):
+        if self.path.rstrip("/") == "/received":
+            with received_lock:
+                received["emails"].clear()
+                received["webhooks"].clear()
+            self.send_json(200, {"ok": True})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def log_message(self, format, *args):
+        print(f"🪝 sink {self.command} {self.path} - {format % args}")
+
+class ThreadingSmtpServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+def main():
+    parser = argparse.ArgumentParser(description="SMTP debugging server and HTTP sink for notification delivery")
+    parser.add_argument("--smtp-port", type=int, default=8025)
+    parser.add_argument("--http-port", type=int, default=9200)
+    parser.add_argument("--fail-webhooks", type=int, default=0, metavar="N",
+                        help="Answer 503 to the first N webhook calls")
+    args = parser.parse_args()
+
+    SinkHandler.failures_left = args.fail_webhooks
+    smtp_server = ThreadingSmtpServer(("127.0.0.1", args.smtp_port), SmtpHandler)
+    threading.Thread(target=smtp_server.serve_forever, daemon=True).start()
+    print(f"📮 SMTP sink listening on 127.0.0.1:{args.smtp_port}")
+    print(f"🚀 HTTP sink listening on http://127.0.0.1:{args.http_port} (GET /received)")
+    ThreadingHTTPServer(("127.0.0.1", args.http_port), SinkHandler).serve_forever()
+
+if __name__ == "__main__":
+    main()
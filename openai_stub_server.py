@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stub server for exercising AI model routing
+Serves canned JSON replies for every AI task, with optional per-model delays
+and failures so timeouts and route fallback can be tested without DeepSeek.
+
+Example - slow fast tier, so shelf-life calls fall back to the large tier:
+    python openai_stub_server.py --port 9100 --delay fast-model=30
+    AI_FAST_MODEL=fast-model AI_FAST_BASE_URL=http://127.0.0.1:9100/v1 AI_FAST_TIMEOUT_SECONDS=2 \
+    AI_LARGE_MODEL=large-model AI_LARGE_BASE_URL=http://127.0.0.1:9100/v1 \
+    DEEPSEEK_API_KEY=stub uvicorn server:app --port 8001
+    curl localhost:8001/api/ai/routes
+"""
+
+import argparse
+import json
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SHELF_LIFE_REPLY = {"category": "produce", "shelf_life_days": 5, "storage_recommendation": "refrigerated", "emoji": "🥬", "tips": "Keep dry and cold"}
+ITEM_UPDATE_REPLY = {"notes": "Updated by stub"}
+BATCH_UPDATE_REPLY = {"updates": []}
+RECIPES_REPLY = {"recipes": [{
+    "name": "Stub Stir Fry",
+    "servings": 2,
+    "prep_time": 10,
+    "cook_time": 15,
+    "total_time": 25,
+    "description": "A quick stir fry from the stub server.",
+    "ingredients_used": [],
+    "ingredients": [{"name": "Olive Oil", "quantity_required": 1, "unit": "tbsp", "inventory_item_id": None}],
+    "instructions": ["Heat the oil.", "Cook everything."]
+}]}
+
+def pick_reply(messages):
+    """Choose a canned reply from the prompt shape."""
+    system = messages[0]["content"].lower() if messages else ""
+    user = messages[-1]["content"] if messages else ""
+    if "storage expert" in system:
+        return SHELF_LIFE_REPLY
+    if "chef" in system:
+        return RECIPES_REPLY
+    if "Items (id|" in user:
+        return BATCH_UPDATE_REPLY
+    return ITEM_UPDATE_REPLY
+
+class StubHandler(BaseHTTPRequestHandler):
+    delays = {}
+    failing_models = set()
+    
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]})
+        else:
+            self.send_json(404, {"error": {"message": "not found"}})
+    
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": "not found"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = request.get("model", "")
+        time.sleep(self.delays.get(model, 0.0))
+        if model in self.failing_models:
+            self.send_json(503, {"error": {"message": f"{model} unavailable (stub)"}})
+            return
+        
+        content = json.dumps(pick_reply(request.get("messages", [])))
+        prompt_chars = sum(len(message.get("content", "")) for message in request.get("messages", []))
+        self.send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(content) // 4, "total_tokens": (prompt_chars + len(content)) // 4}
+        })
+    
+    def log_message(self, format, *args):
+        print(f"🤖 stub {self.command} {self.path} - {format % args}")
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--delay", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="Delay replies for a model (repeatable)")
+    parser.add_argument("--fail", action="append", default=[], metavar="MODEL",
+                        help="Answer 503 for a model (repeatable)")
+    args = parser.parse_args()
+    
+    StubHandler.delays = {model: float(seconds) for model, seconds in (entry.split("=", 1) for entry in args.delay)}
+    StubHandler.failing_models = set(args.fail)
+    
+    print(f"🚀 OpenAI stub listening on http://127.0.0.1:{args.port}/v1")
+    ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler).serve_forever()
+
+if __name__ == "__main__":
+    main()
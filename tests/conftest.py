@@ -0,0 +1,20 @@
+import os
+import sys
+
+# The backend modules import each other as top-level modules (see backend/server.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import pytest
+
+@pytest.fixture
+def server(monkeypatch):
+    """The server module with its database pointed at an in-memory Mongo."""
+    from mongomock_motor import AsyncMongoMockClient
+
+    import server
+    from coordination import SequenceCounter
+
+    db = AsyncMongoMockClient().food_management
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "sync_sequence", SequenceCounter(db.counters, "sync_seq", server.SYNC_RESERVATION_TIMEOUT_SECONDS))
+    return server
@@ -0,0 +1,179 @@
+import asyncio
+
+import pytest
+from mongomock.collection import Collection
+from pymongo.errors import BulkWriteError
+
+from write_buffer import PendingQuantity
+
+@pytest.fixture
+def write_errors(monkeypatch):
+    """Make unordered bulk writes behave like Mongo: apply what they can, then report the rest."""
+    bulk_write = Collection.bulk_write
+
+    def bulk_write_with_write_errors(self, requests, ordered=True, **kwargs):
+        errors = []
+        for index, request in enumerate(requests):
+            try:
+                bulk_write(self, [request], ordered=ordered, **kwargs)
+            except TypeError as e:
+                errors.append({"index": index, "code": 14, "errmsg": str(e)})
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": []})
+
+    monkeypatch.setattr(Collection, "bulk_write", bulk_write_with_write_errors)
+
+def change(delta):
+    pending = PendingQuantity()
+    pending.delta = delta
+    return pending
+
+def test_quantity_flush_reports_failed_items_and_keeps_the_rest(server, write_errors):
+    async def scenario():
+        await server.db.food_items.insert_many([
+            {"id": "milk", "name": "Milk", "category": "dairy", "quantity": 1.0, "unit": "l", "version": 0},
+            {"id": "eggs", "name": "Eggs", "category": "dairy", "quantity": "6", "unit": "each", "version": 0},
+        ])
+        versions = dict(server.collection_versions)
+
+        items = await server.flush_quantity_changes({"milk": change(-1), "eggs": change(-1)})
+
+        assert items["milk"]["quantity"] == 0 and items["milk"]["consumed_at"]
+        assert isinstance(items["eggs"], server.HTTPException) and items["eggs"].status_code == 409
+        assert (await server.db.food_items.find_one({"id": "eggs"}))["quantity"] == "6"
+        # The applied write still invalidates cached lists and is counted as consumed
+        assert server.collection_versions["food_items"] == versions["food_items"] + 1
+        events = await server.db.food_events.find({}, {"_id": 0, "type": 1, "item_id": 1, "quantity": 1}).to_list(None)
+        assert events == [{"type": "consumed", "item_id": "milk", "quantity": 1.0}]
+
+    asyncio.run(scenario())
+
+def test_archival_keeps_items_restocked_before_the_delete(server, monkeypatch):
+    async def scenario():
+        consumed_at = "2020-01-01T00:00:00"
+        await server.db.food_items.insert_many([
+            {"id": "milk", "name": "Milk", "quantity": 0, "consumed_at": consumed_at},
+            {"id": "eggs", "name": "Eggs", "quantity": 0, "consumed_at": consumed_at},
+        ])
+        await server.db.calendar_events.insert_many([{"id": "milk-event", "food_item_id": "milk"},
+                                                     {"id": "eggs-event", "food_item_id": "eggs"}])
+
+        # Eggs are restocked between the archival job's find and its delete
+        delete_many = Collection.delete_many
+
+        def restock_then_delete(self, *args, **kwargs):
+            if self.name == "food_items":
+                self.update_one({"id": "eggs"}, {"$set": {"quantity": 6}, "$unset": {"consumed_at": ""}})
+            return delete_many(self, *args, **kwargs)
+
+        monkeypatch.setattr(Collection, "delete_many", restock_then_delete)
+        assert await server.archive_consumed_items() == 1
+
+        assert [item["id"] async for item in server.db.food_items.find()] == ["eggs"]
+        assert [record["id"] async for record in server.db.food_items_archive.find()] == ["milk"]
+        assert [event["id"] async for event in server.db.calendar_events.find()] == ["eggs-event"]
+        tombstones = {(tombstone["collection"], tombstone["id"]) async for tombstone in server.db.tombstones.find()}
+        assert tombstones == {("food_items", "milk"), ("calendar_events", "milk-event")}
+
+    asyncio.run(scenario())
+
+def test_batch_ai_update_reports_invalid_model_values_and_applies_the_rest(server, monkeypatch):
+    async def scenario():
+        await server.db.food_items.insert_many([
+            {"id": "milk", "name": "Milk", "category": "dairy", "quantity": 2.0, "unit": "l", "storage_condition": "refrigerated", "version": 0,
+             "expiration_date": "2026-03-10T00:00:00"},
+            {"id": "eggs", "name": "Eggs", "category": "dairy", "quantity": 6.0, "unit": "each", "storage_condition": "refrigerated", "version": 0,
+             "expiration_date": "2026-03-20T00:00:00"},
+        ])
+
+        async def complete_json(*args, **kwargs):
+            return {"updates": [{"id": "milk", "fields": {"quantity": 1}},
+                                {"id": "eggs", "fields": {"expiration_date": "next friday"}}]}
+
+        async def run_until_disconnect(http_request, task, awaitable):
+            return await awaitable
+
+        monkeypatch.setattr(server, "complete_json", complete_json)
+        monkeypatch.setattr(server, "run_until_disconnect", run_until_disconnect)
+        response = await server.ai_update_inventory({"instruction": "used some milk, eggs last till next friday", "apply": True}, None)
+
+        assert response["applied"] and response["conflicts"] == []
+        assert [update["id"] for update in response["updates"]] == ["milk"]
+        assert response["invalid"] == [{"id": "eggs", "name": "Eggs", "updated_fields": {"expiration_date": "next friday"},
+                                        "error": "Invalid expiration_date format. Use YYYY-MM-DD."}]
+        milk = await server.db.food_items.find_one({"id": "milk"})
+        assert (milk["quantity"], milk["base_quantity"], milk["base_unit"]) == (1, 1000, "ml")
+        assert (await server.db.food_items.find_one({"id": "eggs"}))["expiration_date"] == "2026-03-20T00:00:00"
+
+    asyncio.run(scenario())
+
+def put_request():
+    from fastapi import Request
+    return Request({"type": "http", "method": "PUT", "path": "/api/food-items/milk", "query_string": b"", "headers": []})
+
+async def rollup_totals(server):
+    totals = {}
+    async for bucket in server.db.analytics_daily.find():
+        events, quantity = totals.get(bucket["type"], (0, 0.0))
+        totals[bucket["type"]] = (events + bucket["events"], quantity + bucket["quantity"])
+    return totals
+
+def test_moving_the_expiry_of_an_expired_item_takes_its_waste_back(server):
+    async def scenario():
+        await server.db.food_items.insert_one({
+            "id": "milk", "name": "Milk", "category": "dairy", "quantity": 3.0, "unit": "l",
+            "storage_condition": "refrigerated", "expiration_date": "2020-01-01T00:00:00", "version": 0,
+        })
+        assert await server.record_expired_items() == 1
+        assert await rollup_totals(server) == {"expired": (1, 3.0)}
+
+        # Saving the edit form with the same date keeps the record
+        await server.update_food_item("milk", {"notes": "top shelf", "expiration_date": "2020-01-01"}, put_request())
+        assert await server.record_expired_items() == 0
+        assert await rollup_totals(server) == {"expired": (1, 3.0)}
+
+        # Extended, then eaten: consumed only
+        item = await server.update_food_item("milk", {"expiration_date": "2099-01-01"}, put_request())
+        assert "expired_recorded_at" not in item
+        await server.update_food_item("milk", {"quantity": 1}, put_request())
+        assert await rollup_totals(server) == {"expired": (0, 0.0), "consumed": (1, 2.0)}
+
+        # Expires again: recorded again with what is left
+        await server.update_food_item("milk", {"expiration_date": "2020-06-01"}, put_request())
+        assert await server.record_expired_items() == 1
+        assert await rollup_totals(server) == {"expired": (1, 1.0), "consumed": (1, 2.0)}
+
+    asyncio.run(scenario())
+
+def test_derived_fields_are_written_with_the_update(server, monkeypatch):
+    async def scenario():
+        await server.db.food_items.insert_one({
+            "id": "milk", "name": "Milk", "category": "dairy", "quantity": 1.0, "unit": "l",
+            "storage_condition": "refrigerated", "expiration_date": "2099-01-01T00:00:00", "version": 0,
+            **server.item_derived_fields({"name": "Milk", "quantity": 1.0, "unit": "l"}),
+        })
+        bulk_writes = []
+        bulk_write = Collection.bulk_write
+
+        def counting_bulk_write(self, requests, *args, **kwargs):
+            if self.name == "food_items":
+                bulk_writes.append(len(requests))
+            return bulk_write(self, requests, *args, **kwargs)
+
+        monkeypatch.setattr(Collection, "bulk_write", counting_bulk_write)
+
+        # The edit form sends name, quantity and unit: no follow-up write
+        await server.update_food_item("milk", {"name": "Oat milk", "quantity": 500, "unit": "ml"}, put_request())
+        stored = await server.db.food_items.find_one({"id": "milk"}, {"_id": 0})
+        assert bulk_writes == []
+        assert {field: stored[field] for field in ("base_quantity", "base_unit", "name_key")} == \
+            {"base_quantity": 500, "base_unit": "ml", "name_key": server.normalize_food_name("Oat milk")}
+
+        # Going below zero: clamp, consumed_at and derived fields in one follow-up write
+        items = await server.flush_quantity_changes({"milk": change(-800)})
+        stored = await server.db.food_items.find_one({"id": "milk"}, {"_id": 0})
+        assert bulk_writes == [1, 1]
+        assert stored["quantity"] == 0 and stored["base_quantity"] == 0 and stored["consumed_at"]
+        assert items["milk"]["base_quantity"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,60 @@
+import asyncio
+
+from fastapi import Request, Response
+
+from coordination import InvalidationChannel
+
+def list_etag(server, if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    request = Request({"type": "http", "method": "GET", "path": "/api/food-items", "query_string": b"", "headers": headers})
+    response = Response()
+    not_modified = server.etag_precondition(request, response, ["food_items"])
+    return response.headers["ETag"], not_modified
+
+def start_worker(server, monkeypatch, origin):
+    """Reset the module to a freshly booted worker's state."""
+    monkeypatch.setattr(server, "invalidation_channel", InvalidationChannel(server.db, "cache_invalidations", 1024, origin=origin))
+    monkeypatch.setattr(server, "collection_versions", {"food_items": 0, "notifications": 0, "calendar_events": 0})
+    monkeypatch.setattr(server, "etag_scope", server.ETAG_BOOT_ID)
+
+def test_workers_build_the_same_etag_from_shared_versions(server, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(server, "CACHE_INVALIDATION_ENABLED", True)
+
+        start_worker(server, monkeypatch, "worker-a")
+        await server.load_collection_versions()
+        await server.bump_versions("food_items")
+        await server.bump_versions("food_items", "notifications")
+        etag_a, _ = list_etag(server)
+
+        # A worker starting later picks the versions up from Mongo
+        start_worker(server, monkeypatch, "worker-b")
+        boot_etag, _ = list_etag(server)
+        assert boot_etag != etag_a
+        await server.load_collection_versions()
+        etag_b, not_modified = list_etag(server, if_none_match=etag_a)
+        assert etag_b == etag_a and not_modified.status_code == 304
+        assert server.collection_versions == {"food_items": 2, "notifications": 1, "calendar_events": 0}
+
+        # ...and later bumps from the invalidation events
+        await server.apply_invalidation({"type": "collections_changed", "collections": ["food_items"], "versions": {"food_items": 3}})
+        assert list_etag(server, if_none_match=etag_a)[1] is None
+        # A late, older event doesn't move a version back
+        await server.apply_invalidation({"type": "collections_changed", "collections": ["food_items"], "versions": {"food_items": 2}})
+        assert server.collection_versions["food_items"] == 3
+
+    asyncio.run(scenario())
+
+def test_events_without_versions_fall_back_to_per_boot_etags(server, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(server, "CACHE_INVALIDATION_ENABLED", True)
+        start_worker(server, monkeypatch, "worker-a")
+        await server.load_collection_versions()
+        shared_etag, _ = list_etag(server)
+
+        await server.apply_invalidation({"type": "collections_changed", "collections": ["food_items"]})
+        assert server.etag_scope == server.ETAG_BOOT_ID
+        assert server.collection_versions["food_items"] == 1
+        assert list_etag(server, if_none_match=shared_etag)[1] is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,41 @@
+from datetime import date
+
+import pytest
+
+from instruction_parser import parse_instruction
+
+TODAY = date(2026, 3, 1)
+ITEM = {"name": "Bananas", "quantity": 4, "unit": "each", "expiration_date": "2026-03-10T00:00:00"}
+
+@pytest.mark.parametrize("instruction, expected", [
+    # Renames
+    ("rename to leftover chili", {"name": "leftover chili"}),
+    ("Please change the name to 'Banana bread'", {"name": "Banana bread"}),
+    ("call it smoothie mix.", {"name": "smoothie mix"}),
+    ("rename to leftover chili and move it to the freezer", None),
+    ("Change name to soup, expires in 2 days", None),
+    ("rename it to soup; then freeze it", None),
+    ("call it a day", None),
+    ("call it quits", None),
+    # Quantity
+    ("I ate half", {"quantity": 2.0}),
+    ("ate 2 bananas", {"quantity": 2.0}),
+    ("ate 2 cups", None),
+    ("used them all", {"quantity": 0.0}),
+    ("only 1 left", {"quantity": 1.0}),
+    ("bought 3 more", {"quantity": 7.0}),
+    # Expiration
+    ("expires in 3 days", {"expiration_date": "2026-03-04"}),
+    ("add 2 days to the expiration date", {"expiration_date": "2026-03-12"}),
+    ("it's rotten", {"expiration_date": "2026-02-28"}),
+    # Storage
+    ("move it to the freezer", {"storage_condition": "frozen"}),
+    # Several clauses
+    ("ate half and moved it to the fridge", {"quantity": 2.0, "storage_condition": "refrigerated"}),
+    ("ate 2, then ate 1", None),
+    # Not understood
+    ("make it spicy", None),
+    ("", None),
+])
+def test_parse_instruction(instruction, expected):
+    assert parse_instruction(instruction, ITEM, today=TODAY) == expected
@@ -0,0 +1,88 @@
+import asyncio
+
+from coordination import InvalidationChannel
+
+class FakeCollection:
+    """An in-memory collection; every find returns what is stored now, like a tailable cursor that then dies."""
+
+    def __init__(self):
+        self.documents = []
+
+    def matches(self, document, query):
+        for field, condition in query.items():
+            if "$exists" in condition and (field in document) != condition["$exists"]:
+                return False
+            if "$gt" in condition and not (field in document and document[field] > condition["$gt"]):
+                return False
+        return True
+
+    async def insert_one(self, document):
+        self.documents.append(dict(document))
+
+    async def find_one(self, query, sort=None):
+        found = [document for document in self.documents if self.matches(document, query)]
+        return found[-1] if found else None
+
+    def find(self, query, projection=None, cursor_type=None):
+        async def cursor():
+            for document in [document for document in self.documents if self.matches(document, query)]:
+                yield document
+        return cursor()
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        document = next((document for document in self.documents if document["_id"] == query["_id"]), None)
+        if document is None:
+            document = {"_id": query["_id"], "value": 0}
+            self.documents.append(document)
+        document["value"] += update["$inc"]["value"]
+        return dict(document)
+
+class FakeDb:
+    def __init__(self):
+        self.collections = {"counters": FakeCollection()}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+    @property
+    def counters(self):
+        return self.collections["counters"]
+
+async def wait_for(condition):
+    for _ in range(200):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+def test_resume_delivers_events_inserted_out_of_order_once():
+    async def scenario():
+        db = FakeDb()
+        publisher = InvalidationChannel(db, "cache_invalidations", 1024, origin="publisher")
+        listener = InvalidationChannel(db, "cache_invalidations", 1024, origin="listener")
+        await publisher.publish("collections_changed", collections=["food_items"])
+
+        handled = []
+
+        async def handler(event):
+            handled.append(event["seq"])
+
+        task = asyncio.create_task(listener.listen(handler, retry_seconds=0.01))
+        await asyncio.sleep(0.01)
+        await publisher.publish("collections_changed", collections=["food_items"])
+        await wait_for(lambda: handled == [2])
+
+        # Seq 3 is published by a slow worker and only lands after seq 4
+        await db.counters.find_one_and_update({"_id": "cache_invalidations"}, {"$inc": {"value": 2}})
+        await db["cache_invalidations"].insert_one({"type": "collections_changed", "origin": "other", "seq": 4})
+        await db["cache_invalidations"].insert_one({"type": "collections_changed", "origin": "other", "seq": 3})
+        await listener.publish("collections_changed", collections=["notifications"])
+        await wait_for(lambda: handled == [2, 4, 3])
+
+        # Later cursors re-read the overlap window without delivering anything twice
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert handled == [2, 4, 3]
+
+    asyncio.run(scenario())
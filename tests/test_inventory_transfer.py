@@ -0,0 +1,61 @@
+import asyncio
+
+import inventory_transfer
+from inventory_transfer import CSV, NDJSON, LineTooLong, parse_records, read_lines
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+def collect(iterator):
+    async def run():
+        return [value async for value in iterator]
+    return asyncio.run(run())
+
+def records(body: bytes, format: str, max_line_bytes: int = 1024, chunk_size: int = 7):
+    parts = [body[start:start + chunk_size] for start in range(0, len(body), chunk_size)]
+    return collect(parse_records(read_lines(chunks(*parts), max_line_bytes), format))
+
+def test_read_lines_splits_chunks_and_strips_line_endings():
+    lines = collect(read_lines(chunks(b"\xef\xbb\xbfmilk\r\neg", b"gs\n\nbread"), 100))
+    assert lines == ["milk", "eggs", "", "bread"]
+
+def test_read_lines_skips_oversized_lines():
+    body = b"short\n" + b"x" * 50 + b"\nok\n"
+    for chunk_size in (1, 8, 1000):
+        parts = [body[start:start + chunk_size] for start in range(0, len(body), chunk_size)]
+        lines = collect(read_lines(chunks(*parts), 10))
+        assert lines[0] == "short" and lines[2] == "ok" and len(lines) == 3
+        assert isinstance(lines[1], LineTooLong)
+
+def test_oversized_line_is_reported_with_its_line_number():
+    body = b'{"name": "Milk"}\n{"name": "' + b"x" * 100 + b'"}\n{"name": "Eggs"}\n'
+    results = records(body, NDJSON, max_line_bytes=40)
+    assert [(number, type(record)) for number, record in results] == [(1, dict), (2, LineTooLong), (3, dict)]
+
+def test_ndjson_reports_invalid_lines():
+    results = records(b'{"name": "Milk"}\nnot json\n[1, 2]\n\n{"name": "Eggs"}\n', NDJSON)
+    assert results[0] == (1, {"name": "Milk"})
+    assert [number for number, record in results if isinstance(record, ValueError)] == [2, 3]
+    assert results[-1] == (5, {"name": "Eggs"})
+
+def test_csv_record_spanning_several_lines():
+    body = b'name,notes,quantity\nMilk,"first line\nsecond, with comma\n""quoted""",2\nEggs,,12\n'
+    results = records(body, CSV)
+    assert results == [
+        (2, {"name": "Milk", "notes": 'first line\nsecond, with comma\n"quoted"', "quantity": "2"}),
+        (5, {"name": "Eggs", "quantity": "12"}),
+    ]
+
+def test_csv_errors():
+    results = records(b'name,quantity\nMilk,1,extra\nEggs,"12\n', CSV)
+    assert [(number, str(record)) for number, record in results] == [
+        (2, "Expected 2 columns, got 3"),
+        (3, "Unterminated quoted field"),
+    ]
+
+def test_csv_export_round_trips():
+    items = [{"name": "Milk", "notes": "line one\nline two", "quantity": 2.0}]
+    body = (inventory_transfer.csv_chunk([], ["name", "notes", "quantity"], header=True)
+            + inventory_transfer.csv_chunk(items, ["name", "notes", "quantity"])).encode()
+    assert records(body, CSV) == [(2, {"name": "Milk", "notes": "line one\nline two", "quantity": "2.0"})]
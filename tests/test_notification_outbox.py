@@ -0,0 +1,195 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from notification_outbox import FAILED, PENDING, SENDING, SENT, WEBHOOK, OutboxWorkerPool
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, field, direction):
+        self.documents.sort(key=lambda document: document[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length=None):
+        # Yield to the loop like a real round trip, so concurrent claims interleave
+        await asyncio.sleep(0)
+        return self.documents
+
+class FakeOutbox:
+    """An in-memory outbox collection supporting the queries the worker pool makes."""
+
+    def __init__(self, entries):
+        self.documents = [dict(entry) for entry in entries]
+
+    def matches(self, document, query):
+        for field, condition in query.items():
+            if field == "$or":
+                if not any(self.matches(document, branch) for branch in condition):
+                    return False
+            elif isinstance(condition, dict):
+                value = document.get(field)
+                if "$in" in condition and value not in condition["$in"]:
+                    return False
+                if "$lte" in condition and not (value is not None and value <= condition["$lte"]):
+                    return False
+                if "$lt" in condition and not (value is not None and value < condition["$lt"]):
+                    return False
+            elif document.get(field) != condition:
+                return False
+        return True
+
+    def apply(self, document, update):
+        document.update(update.get("$set", {}))
+        for field in update.get("$unset", {}):
+            document.pop(field, None)
+
+    def find(self, query, projection=None):
+        return FakeCursor([dict(document) for document in self.documents if self.matches(document, query)])
+
+    async def update_many(self, query, update):
+        for document in self.documents:
+            if self.matches(document, query):
+                self.apply(document, update)
+
+    async def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            document = next((document for document in self.documents if self.matches(document, operation._filter)), None)
+            if document is not None:
+                self.apply(document, operation._doc)
+
+    def get(self, entry_id):
+        return next(document for document in self.documents if document["_id"] == entry_id)
+
+class FakeSender:
+    """Records what it was asked to deliver and fails the targets in failing."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.deliveries = []
+
+    async def deliver(self, batches):
+        self.deliveries.append(batches)
+        return {target: RuntimeError("HTTP 503") if target in self.failing else None for target in batches}
+
+def entry(entry_id, target="https://hooks.example/a", status=PENDING, attempts=0, **fields):
+    return {"_id": entry_id, "notification_id": f"n-{entry_id}", "channel": WEBHOOK, "target": target,
+            "payload": {"id": f"n-{entry_id}"}, "status": status, "attempts": attempts,
+            "next_attempt_at": datetime.utcnow() - timedelta(seconds=1), **fields}
+
+def pool(collection, sender=None, batch_size=10, max_attempts=5):
+    return OutboxWorkerPool(collection, {WEBHOOK: sender or FakeSender()}, workers=1, batch_size=batch_size,
+                            max_attempts=max_attempts, retry_base_seconds=10, retry_max_seconds=60,
+                            poll_seconds=1, claim_seconds=30)
+
+def test_concurrent_claims_take_each_entry_once():
+    async def scenario():
+        outbox = FakeOutbox([entry(str(number)) for number in range(6)])
+        first, second = pool(outbox), pool(outbox)
+        # Both workers see the same due candidates; only the first update takes them
+        claimed = await asyncio.gather(first.claim(), second.claim(), first.claim())
+        ids = [[claimed_entry["_id"] for claimed_entry in entries] for entries in claimed]
+        assert sorted(ids[0] + ids[1] + ids[2]) == [str(number) for number in range(6)]
+        assert len(set(ids[0]) | set(ids[1]) | set(ids[2])) == 6
+        assert all(document["status"] == SENDING for document in outbox.documents)
+
+    asyncio.run(scenario())
+
+def test_claim_takes_expired_claims_and_skips_live_ones():
+    async def scenario():
+        now = datetime.utcnow()
+        outbox = FakeOutbox([
+            entry("expired", status=SENDING, claim="dead-worker", claimed_until=now - timedelta(seconds=1)),
+            entry("live", status=SENDING, claim="busy-worker", claimed_until=now + timedelta(seconds=30)),
+            entry("backing-off", next_attempt_at=now + timedelta(seconds=30)),
+            entry("sent", status=SENT),
+        ])
+        claimed = await pool(outbox).claim()
+        assert [claimed_entry["_id"] for claimed_entry in claimed] == ["expired"]
+        assert claimed[0]["claim"] != "dead-worker"
+        assert outbox.get("live")["claim"] == "busy-worker"
+
+    asyncio.run(scenario())
+
+def test_claim_respects_batch_size_oldest_first():
+    async def scenario():
+        now = datetime.utcnow()
+        outbox = FakeOutbox([entry(str(number), next_attempt_at=now - timedelta(seconds=number)) for number in range(5)])
+        claimed = await pool(outbox, batch_size=2).claim()
+        assert sorted(claimed_entry["_id"] for claimed_entry in claimed) == ["3", "4"]
+
+    asyncio.run(scenario())
+
+def test_failed_delivery_is_rescheduled_with_backoff():
+    async def scenario():
+        sender = FakeSender(failing={"https://hooks.example/down"})
+        outbox = FakeOutbox([
+            entry("ok-1"), entry("ok-2"),
+            entry("retry", target="https://hooks.example/down", attempts=2),
+            entry("capped", target="https://hooks.example/down", attempts=3),
+        ])
+        workers = pool(outbox, sender)
+        before = datetime.utcnow()
+        await workers.deliver(await workers.claim())
+        after = datetime.utcnow()
+
+        # One call per target, covering all of its entries
+        assert sorted((target, len(payloads)) for target, payloads in sender.deliveries[0].items()) == [
+            ("https://hooks.example/a", 2), ("https://hooks.example/down", 2)]
+        for entry_id in ("ok-1", "ok-2"):
+            assert outbox.get(entry_id)["status"] == SENT
+            assert outbox.get(entry_id)["attempts"] == 1
+            assert "claim" not in outbox.get(entry_id)
+
+        retry = outbox.get("retry")
+        assert retry["status"] == PENDING and retry["attempts"] == 3 and retry["last_error"] == "HTTP 503"
+        assert "claim" not in retry and "claimed_until" not in retry
+        # Third attempt: 10s * 2**2 = 40s, jittered down to no less than half
+        assert before + timedelta(seconds=20) <= retry["next_attempt_at"] <= after + timedelta(seconds=40)
+        # Fourth attempt would be 80s, capped at retry_max_seconds
+        capped = outbox.get("capped")
+        assert before + timedelta(seconds=30) <= capped["next_attempt_at"] <= after + timedelta(seconds=60)
+        assert workers.stats == {"batches": 1, "sent": 2, "retried": 2, "failed": 0}
+
+        # Rescheduled entries aren't due again until their backoff has passed
+        assert await workers.claim() == []
+
+    asyncio.run(scenario())
+
+def test_delivery_gives_up_after_max_attempts():
+    async def scenario():
+        sender = FakeSender(failing={"https://hooks.example/a"})
+        outbox = FakeOutbox([entry("last-try", attempts=2)])
+        workers = pool(outbox, sender, max_attempts=3)
+        await workers.deliver(await workers.claim())
+
+        document = outbox.get("last-try")
+        assert document["status"] == FAILED and document["attempts"] == 3
+        assert document["last_error"] == "HTTP 503" and "claim" not in document
+        assert workers.stats["failed"] == 1
+        assert await workers.claim() == []
+
+    asyncio.run(scenario())
+
+def test_outcome_of_an_expired_claim_does_not_overwrite_the_new_claim():
+    async def scenario():
+        outbox = FakeOutbox([entry("slow")])
+        slow_worker, other_worker = pool(outbox, FakeSender(failing={"https://hooks.example/a"})), pool(outbox)
+        stale = await slow_worker.claim()
+        # The slow worker's claim runs out before it reports, and another worker takes the entry over
+        outbox.get("slow")["claimed_until"] = datetime.utcnow() - timedelta(seconds=1)
+        reclaimed = await other_worker.claim()
+        assert [claimed_entry["_id"] for claimed_entry in reclaimed] == ["slow"]
+
+        await slow_worker.deliver(stale)
+        assert outbox.get("slow")["status"] == SENDING
+        assert outbox.get("slow")["claim"] == reclaimed[0]["claim"]
+
+        await other_worker.deliver(reclaimed)
+        assert outbox.get("slow")["status"] == SENT
+
+    asyncio.run(scenario())
@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+ITEMS = [{"name": "Spinach"}, {"name": "Eggs"}, {"name": "Feta"}]
+
+def fake_completions(monkeypatch, server, outcomes):
+    async def generate_focused_recipe(available_items, focus, *args):
+        outcome = outcomes[focus]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    monkeypatch.setattr(server, "generate_focused_recipe", generate_focused_recipe)
+
+def test_fanout_raises_when_every_recipe_failed_or_was_empty(server, monkeypatch):
+    error = RuntimeError("model unavailable")
+    fake_completions(monkeypatch, server, {"Spinach": [], "Eggs": error, "Feta": RuntimeError("timeout")})
+    with pytest.raises(RuntimeError) as raised:
+        asyncio.run(server.generate_recipes_parallel(ITEMS, "", "", 30, 2, ""))
+    assert raised.value is error
+
+def test_fanout_returns_the_recipes_that_succeeded(server, monkeypatch):
+    fake_completions(monkeypatch, server, {"Spinach": [{"name": "Spinach omelette"}],
+                                           "Eggs": [{"name": "spinach  Omelette"}],
+                                           "Feta": RuntimeError("timeout")})
+    recipes = asyncio.run(server.generate_recipes_parallel(ITEMS, "", "", 30, 2, ""))
+    assert recipes == [{"name": "Spinach omelette"}]
+
+def test_fanout_returns_no_recipes_without_errors(server, monkeypatch):
+    fake_completions(monkeypatch, server, {"Spinach": [], "Eggs": [], "Feta": []})
+    assert asyncio.run(server.generate_recipes_parallel(ITEMS, "", "", 30, 2, "")) == []
@@ -0,0 +1,34 @@
+from itertools import product
+from string import ascii_lowercase
+
+from semantic_cache import GROWTH_BLOCK_ROWS, SemanticCache, embed
+
+def test_matrix_grows_in_blocks_and_keeps_entries():
+    cache = SemanticCache(threshold=0.99, max_entries=10 * GROWTH_BLOCK_ROWS)
+    names = ["".join(letters) for letters in product(ascii_lowercase, repeat=3)][:GROWTH_BLOCK_ROWS + 1]
+    for index, name in enumerate(names):
+        cache.add("fridge", name, {"index": index})
+
+    partition = cache.partitions["fridge"]
+    assert partition.size == len(names)
+    assert partition.matrix.shape[0] == 2 * GROWTH_BLOCK_ROWS
+    assert cache.lookup("fridge", names[0])[0] == {"index": 0}
+    assert cache.lookup("fridge", names[-1])[0] == {"index": len(names) - 1}
+
+def test_add_stops_at_max_entries():
+    cache = SemanticCache(threshold=0.9, max_entries=2)
+    for name in ("milk", "eggs", "bread"):
+        cache.add("fridge", name, {"name": name})
+    assert cache.stats["entries"] == 2
+    assert cache.lookup("fridge", "bread") is None
+
+def test_load_rebuilds_partitions():
+    documents = [
+        {"partition": partition, "text": name, "vector": embed(name).tobytes(), "analysis": {"name": name}}
+        for partition, name in (("fridge", "milk"), ("pantry", "rice"), ("fridge", "egg"))
+    ]
+    cache = SemanticCache(threshold=0.9, max_entries=100)
+    cache.load(documents)
+    assert cache.stats["entries"] == 3
+    assert cache.lookup("fridge", "eggs")[0] == {"name": "egg"}
+    assert cache.lookup("pantry", "milk") is None
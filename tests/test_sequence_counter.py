@@ -0,0 +1,105 @@
+import asyncio
+import copy
+
+from pymongo import ReturnDocument
+
+from coordination import SequenceCounter
+
+class FakeCounters:
+    """Just the counter-document operations SequenceCounter uses."""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def find_one(self, query):
+        document = self.documents.get(query["_id"])
+        return copy.deepcopy(document) if document else None
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=ReturnDocument.BEFORE):
+        assert upsert and return_document == ReturnDocument.AFTER
+        document = self.documents.setdefault(query["_id"], {"_id": query["_id"]})
+        for field, amount in update.get("$inc", {}).items():
+            document[field] = document.get(field, 0) + amount
+        for field, value in update.get("$push", {}).items():
+            document.setdefault(field, []).append(value)
+        return copy.deepcopy(document)
+
+    async def update_one(self, query, update):
+        document = self.documents[query["_id"]]
+        for field, condition in update["$pull"].items():
+            if "token" in condition:
+                document[field] = [entry for entry in document[field] if entry["token"] != condition["token"]]
+            else:
+                document[field] = [entry for entry in document[field] if not entry["at"] < condition["at"]["$lt"]]
+
+def make_sync(sequence, written):
+    async def sync(since):
+        """Like /api/sync: documents after since and below the horizon, and the new cursor."""
+        horizon = await sequence.horizon()
+        changes = sorted(document for document in written if since < document[0] < horizon)
+        return max([since] + [seq for seq, _ in changes]), [name for _, name in changes]
+    return sync
+
+def test_sync_waits_for_earlier_write_in_flight():
+    async def scenario():
+        sequence = SequenceCounter(FakeCounters(), "sync_seq", reservation_timeout_seconds=60)
+        written = []
+        sync = make_sync(sequence, written)
+        reserved, finish = asyncio.Event(), asyncio.Event()
+
+        async def slow_write():
+            async with sequence.reserve() as seq:
+                reserved.set()
+                await finish.wait()
+                written.append((seq, "slow"))
+
+        task = asyncio.create_task(slow_write())
+        await reserved.wait()
+        async with sequence.reserve() as seq:
+            written.append((seq, "fast"))
+
+        # The later write is stored, but the cursor must not pass the earlier one
+        assert await sync(0) == (0, [])
+
+        finish.set()
+        await task
+        assert await sync(0) == (2, ["slow", "fast"])
+        assert await sync(2) == (2, [])
+
+    asyncio.run(scenario())
+
+def test_batch_reservation_holds_back_later_writes():
+    async def scenario():
+        sequence = SequenceCounter(FakeCounters(), "sync_seq", reservation_timeout_seconds=60)
+        written = []
+        sync = make_sync(sequence, written)
+
+        async with sequence.reserve() as seq:
+            written.append((seq, "first"))
+        async with sequence.reserve(3) as first_seq:
+            written.append((first_seq, "batch 1"))
+            async with sequence.reserve() as seq:
+                written.append((seq, "after batch"))
+            assert await sync(0) == (1, ["first"])
+            written += [(first_seq + 1, "batch 2"), (first_seq + 2, "batch 3")]
+        assert await sync(1) == (5, ["batch 1", "batch 2", "batch 3", "after batch"])
+
+    asyncio.run(scenario())
+
+def test_abandoned_reservation_stops_holding_back_the_cursor():
+    async def scenario():
+        counters = FakeCounters()
+        sequence = SequenceCounter(counters, "sync_seq", reservation_timeout_seconds=0)
+        written = []
+        sync = make_sync(sequence, written)
+
+        # A worker that died mid-write never releases its reservation
+        abandoned = sequence.reserve()
+        await abandoned.__aenter__()
+        async with sequence.reserve() as seq:
+            written.append((seq, "later"))
+
+        assert await sync(0) == (2, ["later"])
+        assert counters.documents["sync_seq"]["pending"] == []
+
+    asyncio.run(scenario())
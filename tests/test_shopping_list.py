@@ -0,0 +1,66 @@
+import pytest
+
+from shopping_list import LOW_STOCK, Requirements, build_shopping_list
+
+def stock_item(name, name_key, quantity, unit):
+    return {"id": name.lower(), "name": name, "name_key": name_key, "quantity": quantity, "unit": unit}
+
+def test_requirements_in_convertible_units_are_merged():
+    requirements = Requirements({})
+    requirements.add("milk", 1, "cup", "Pancakes")
+    requirements.add("Milk", 250, "ml", "Smoothie")
+    requirements.add("milk", None, None, "Porridge")
+
+    [need] = requirements.all()
+    assert (need.key, need.unit, need.unspecified) == ("milk", "cup", True)
+    assert need.quantity == pytest.approx(1 + 250 / 236.5882365)
+    assert need.sources == ["Pancakes", "Smoothie", "Porridge"]
+
+def test_requirements_in_other_dimensions_stay_separate():
+    requirements = Requirements({})
+    requirements.add("cheese", 2, "slices", "Sandwich")
+    requirements.add("cheese", 100, "g", "Pasta")
+    assert [(need.unit, need.quantity) for need in requirements.all()] == [("slices", 2), ("g", 100)]
+
+def test_stock_in_another_unit_is_subtracted():
+    requirements = Requirements({})
+    requirements.add("flour", 1, "kg", "Bread")
+    entries = build_shopping_list(requirements.all(), [stock_item("Flour", "flour", 500, "g")])
+    assert [(entry["quantity"], entry["unit"], entry["in_stock"]) for entry in entries] == [(0.5, "kg", 0.5)]
+
+def test_stock_is_not_counted_twice_across_needs_of_one_food():
+    eggs = stock_item("Eggs", "egg", 5, "each")
+    requirements = Requirements({"eggs": eggs})
+    requirements.add("egg", 200, "g", "Omelette")
+    # Linked to the eggs, but "yolks" has no piece weight, so 2 each can't merge with grams
+    requirements.add("yolks", 2, "each", "Custard", "eggs")
+    assert len(requirements.all()) == 2
+
+    # 200 g takes 4 of the 5 eggs, leaving 1 of the 2 yolks' eggs
+    entries = build_shopping_list(requirements.all(), [eggs])
+    assert entries == [{
+        "name": "yolks", "name_key": "egg", "quantity": 1.0, "unit": "each", "needed": 2.0,
+        "in_stock": 1.0, "sources": ["Custard"], "inventory_item_ids": ["eggs"],
+    }]
+
+def test_unspecified_amount_is_covered_by_any_stock():
+    requirements = Requirements({})
+    requirements.add("salt", None, None, "Soup")
+    requirements.add("pepper", "", "", "Soup")
+    entries = build_shopping_list(requirements.all(), [stock_item("Sea salt", "salt", 500, "g")])
+    assert [(entry["name"], entry["quantity"], entry["needed"]) for entry in entries] == [("pepper", None, None)]
+
+def test_recipes_and_low_stock_thresholds():
+    requirements = Requirements({})
+    requirements.add_recipes([
+        {"name": "Pancakes", "ingredients": [{"name": "eggs", "quantity_required": 2, "unit": "each"},
+                                             {"name": "milk", "quantity_required": 300, "unit": "ml"},
+                                             "not an ingredient", {"quantity_required": 1}]},
+        "not a recipe",
+    ])
+    requirements.add("Eggs", 6, "each", LOW_STOCK)
+    entries = build_shopping_list(requirements.all(), [stock_item("Eggs", "egg", 4, "each"),
+                                                       stock_item("Milk", "milk", 1, "l")])
+    assert [(entry["name_key"], entry["quantity"], entry["needed"], entry["sources"]) for entry in entries] == [
+        ("egg", 4.0, 8.0, ["Pancakes", LOW_STOCK]),
+    ]
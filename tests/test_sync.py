@@ -0,0 +1,27 @@
+import asyncio
+
+def test_since_zero_includes_documents_stored_before_sync(server):
+    async def scenario():
+        # Stored by a version without differential sync: no seq
+        await server.db.food_items.insert_one({"id": "old-milk", "name": "Milk"})
+        await server.db.notifications.insert_one({"id": "old-note", "food_item_id": "old-milk"})
+        await server.db.calendar_events.insert_one({"id": "old-event", "food_item_id": "old-milk"})
+        new_item = {"id": "new-eggs", "name": "Eggs"}
+        async with server.stamp_sync_fields(new_item):
+            await server.db.food_items.insert_one(new_item)
+
+        changes = await server.sync_changes(0)
+        assert sorted(item["id"] for item in changes["food_items"]) == ["new-eggs", "old-milk"]
+        assert [event["id"] for event in changes["calendar_events"]] == ["old-event"]
+        assert changes["cursor"] == 1
+
+        assert await server.backfill_sync_fields(batch_size=1) == 3
+        assert await server.backfill_sync_fields() == 0
+        # Numbered after the cursor, so clients that synced before see them once more
+        changes = await server.sync_changes(1)
+        assert sorted(item["id"] for item in changes["food_items"]) == ["old-milk"]
+        assert [note["id"] for note in changes["notifications"]] == ["old-note"]
+        assert changes["cursor"] == 4
+        assert (await server.sync_changes(changes["cursor"]))["food_items"] == []
+
+    asyncio.run(scenario())
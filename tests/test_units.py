@@ -0,0 +1,51 @@
+import pytest
+
+from units import base_fields, convert, normalize_unit
+
+@pytest.mark.parametrize("unit, expected", [
+    ("g", "g"),
+    ("Lbs.", "lb"),
+    ("liters", "l"),
+    ("Tablespoons", "tbsp"),
+    ("fl. oz", "fl oz"),
+    ("fluid ounces", "fl oz"),
+    ("boxes", "each"),
+    ("cans", "each"),
+    ("c", "cup"),
+    ("dozen", "dozen"),
+    ("handful", None),
+    ("", None),
+    (None, None),
+])
+def test_normalize_unit(unit, expected):
+    assert normalize_unit(unit) == expected
+
+@pytest.mark.parametrize("quantity, from_unit, to_unit, food, expected", [
+    # Same dimension: fixed factors, no food needed
+    (1, "kg", "g", None, 1000),
+    (16, "oz", "lb", None, 1),
+    (3, "tsp", "tbsp", None, 1),
+    (2, "dozen", "each", None, 24),
+    # Across dimensions through the food's density or piece weight
+    (1, "l", "g", "whole milk", 1030),
+    (1, "cup", "g", "flour", 236.5882365 * 0.53),
+    (2, "each", "g", "Bananas", 236),
+    (100, "g", "each", "eggs", 2),
+])
+def test_convert(quantity, from_unit, to_unit, food, expected):
+    assert convert(quantity, from_unit, to_unit, food) == pytest.approx(expected)
+
+@pytest.mark.parametrize("from_unit, to_unit, food", [
+    ("cup", "g", "mystery mix"),   # no density
+    ("each", "g", "cheese"),       # no piece weight
+    ("g", "handful", "spinach"),   # unknown unit
+])
+def test_convert_returns_none_when_not_convertible(from_unit, to_unit, food):
+    assert convert(1, from_unit, to_unit, food) is None
+
+def test_base_fields():
+    assert base_fields(2, "kg", "rice") == {"base_quantity": 2000.0, "base_unit": "g", "base_grams": 2000.0}
+    assert base_fields(0.5, "l", "milk") == {"base_quantity": 500.0, "base_unit": "ml", "base_grams": 515.0}
+    assert base_fields(6, "each", "eggs") == {"base_quantity": 6.0, "base_unit": "each", "base_grams": 300.0}
+    assert base_fields(3, "each", "cheese") == {"base_quantity": 3.0, "base_unit": "each", "base_grams": None}
+    assert base_fields(1, "handful", "spinach") == {"base_quantity": None, "base_unit": None, "base_grams": None}
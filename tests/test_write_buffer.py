@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from write_buffer import QuantityWriteBuffer
+
+class FakeStore:
+    """A flush over an in-memory inventory that records the batches it was given."""
+
+    def __init__(self, quantities, fail=None):
+        self.quantities = dict(quantities)
+        self.fail = fail or {}
+        self.batches = []
+
+    async def flush(self, batch):
+        self.batches.append({item_id: (change.absolute, change.delta) for item_id, change in batch.items()})
+        items = {}
+        for item_id, change in batch.items():
+            if item_id in self.fail:
+                items[item_id] = self.fail[item_id]
+            elif item_id in self.quantities:
+                base = change.absolute if change.absolute is not None else self.quantities[item_id]
+                self.quantities[item_id] = base + change.delta
+                items[item_id] = {"id": item_id, "quantity": self.quantities[item_id]}
+        return items
+
+def test_changes_within_the_window_are_merged_in_order():
+    async def scenario():
+        store = FakeStore({"milk": 1.0, "eggs": 6.0, "rice": 2.0})
+        buffer = QuantityWriteBuffer(0.01, 100, store.flush)
+        results = await asyncio.gather(
+            buffer.set_quantity("milk", 5), buffer.add_quantity("milk", -2),
+            buffer.add_quantity("eggs", -1), buffer.add_quantity("eggs", -2),
+            buffer.add_quantity("rice", 3), buffer.set_quantity("rice", 4),
+            buffer.add_quantity("bread", 1),
+        )
+        # One flush: a set absorbs the increments before it, increments after it add up
+        assert store.batches == [{"milk": (5, -2), "eggs": (None, -3), "rice": (4, 0.0), "bread": (None, 1)}]
+        assert [result and result["quantity"] for result in results] == [3, 3, 3, 3, 4, 4, None]
+        assert buffer.stats == {"changes": 7, "flushes": 1, "items_written": 4}
+
+    asyncio.run(scenario())
+
+def test_max_pending_flushes_without_waiting_for_the_window():
+    async def scenario():
+        store = FakeStore({"milk": 1.0, "eggs": 6.0})
+        buffer = QuantityWriteBuffer(60, 2, store.flush)
+        milk = asyncio.create_task(buffer.add_quantity("milk", 1))
+        await asyncio.sleep(0)
+        assert store.batches == []
+        eggs = await asyncio.wait_for(buffer.add_quantity("eggs", -1), timeout=1)
+        assert eggs["quantity"] == 5
+        assert (await milk)["quantity"] == 2
+        assert store.batches == [{"milk": (None, 1), "eggs": (None, -1)}]
+        await buffer.close()
+
+    asyncio.run(scenario())
+
+def test_close_flushes_changes_still_in_their_window():
+    async def scenario():
+        store = FakeStore({"milk": 1.0})
+        buffer = QuantityWriteBuffer(60, 100, store.flush)
+        milk = asyncio.create_task(buffer.set_quantity("milk", 0))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(buffer.close(), timeout=1)
+        assert (await milk)["quantity"] == 0
+        assert store.quantities == {"milk": 0}
+        assert buffer.flush_task is None and buffer.pending == {}
+
+    asyncio.run(scenario())
+
+def test_failed_flush_fails_every_change_in_the_batch():
+    async def scenario():
+        async def flush(batch):
+            raise ConnectionError("mongo unreachable")
+
+        buffer = QuantityWriteBuffer(0.01, 100, flush)
+        results = await asyncio.gather(buffer.add_quantity("milk", 1), buffer.add_quantity("eggs", 1), return_exceptions=True)
+        assert [type(result) for result in results] == [ConnectionError, ConnectionError]
+        assert buffer.stats["flushes"] == 0
+
+    asyncio.run(scenario())
+
+def test_failed_item_only_fails_its_own_changes():
+    async def scenario():
+        store = FakeStore({"milk": 1.0, "eggs": 6.0}, fail={"eggs": ValueError("quantity is a string")})
+        buffer = QuantityWriteBuffer(0.01, 100, store.flush)
+        milk, eggs, more_eggs = await asyncio.gather(
+            buffer.add_quantity("milk", 1), buffer.add_quantity("eggs", 1), buffer.add_quantity("eggs", 1),
+            return_exceptions=True
+        )
+        assert milk == {"id": "milk", "quantity": 2}
+        assert isinstance(eggs, ValueError) and more_eggs is eggs
+        with pytest.raises(ValueError):
+            await buffer.add_quantity("eggs", 1)
+        assert (await buffer.add_quantity("milk", 1))["quantity"] == 3
+
+    asyncio.run(scenario())